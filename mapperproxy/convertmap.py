@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import argparse
+import sys
+
+from mapper.roomdata.database import BINARY_MAP_FILE_PATH, MAP_FILE_PATH, convertMap
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Convert a JSON map of the Mume mapper to the binary format, or a binary map to JSON."
+	)
+	parser.add_argument(
+		"source",
+		nargs="?",
+		help=f"The map to convert. Default is '{MAP_FILE_PATH}'.",
+		default=MAP_FILE_PATH
+	)
+	parser.add_argument(
+		"destination",
+		nargs="?",
+		help=(
+			f"The converted map. Default is '{BINARY_MAP_FILE_PATH}' when converting to the binary format, "
+			+ f"or '{MAP_FILE_PATH}' when converting to JSON."
+		)
+	)
+	args = parser.parse_args()
+	errors = convertMap(args.source, args.destination)
+	if errors:
+		sys.exit(errors)
+	print("Map converted.")
@@ -0,0 +1,66 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import logging
+import struct
+import threading
+import time
+
+
+CAPTURE_MAGIC = b"MPCAP\x01"
+# Each record is a header, followed by the data received. The header contains the time in seconds
+# since the start of the capture, the direction the data was received from, and the length of the data.
+RECORD_HEADER = struct.Struct("<dBI")
+FROM_SERVER = 0
+FROM_CLIENT = 1
+
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureError(Exception):
+	pass
+
+
+class SessionRecorder(object):
+	"""Records every chunk received from MUME and from the client, with the time it was received."""
+
+	def __init__(self, fileName):
+		self._lock = threading.Lock()
+		self._fileObj = open(fileName, "wb")
+		self._fileObj.write(CAPTURE_MAGIC)
+		self._startTime = time.monotonic()
+
+	def record(self, direction, data):
+		header = RECORD_HEADER.pack(time.monotonic() - self._startTime, direction, len(data))
+		with self._lock:
+			if not self._fileObj.closed:
+				self._fileObj.write(header)
+				self._fileObj.write(data)
+
+	def close(self):
+		with self._lock:
+			self._fileObj.close()
+
+
+def readCapture(fileName):
+	"""Yield a tuple of (timestamp, direction, data) for each record in a capture."""
+	with open(fileName, "rb") as fileObj:
+		if fileObj.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+			raise CaptureError(f"'{fileName}' is not a session capture.")
+		while True:
+			header = fileObj.read(RECORD_HEADER.size)
+			if not header:
+				break
+			elif len(header) < RECORD_HEADER.size:
+				logger.warning(f"Capture '{fileName}' ends with a truncated record.")
+				break
+			timestamp, direction, length = RECORD_HEADER.unpack(header)
+			data = fileObj.read(length)
+			if len(data) < length:
+				logger.warning(f"Capture '{fileName}' ends with a truncated record.")
+				break
+			yield timestamp, direction, data
@@ -0,0 +1,168 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import codecs
+from collections import deque
+import logging
+import os
+import threading
+from timeit import default_timer
+
+
+# The log which the messages of each channel are written to, named like the logs of the tintin scripts.
+CHANNEL_LOGS = {
+	"tell": "tells",
+	"narrate": "narrates",
+	"pray": "prays",
+	"say": "says",
+	"emote": "says"
+}
+FLUSH_INTERVAL = 1.0  # The number of seconds between writes of the waiting messages.
+FSYNC_INTERVAL = 10.0  # The number of seconds between forcing written messages to disk.
+MAX_BATCH_SIZE = 256  # The number of waiting messages which wakes the writer before the flush interval.
+MAX_LOG_SIZE = 1024 * 1024  # The size in bytes beyond which a log is rotated.
+BACKUP_COUNT = 5  # The number of rotated logs which are kept for each channel.
+TAIL_LENGTH = 100  # The number of recent messages of each log which are kept in memory.
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelLog(threading.Thread):
+	"""
+	Writes messages from communication channels to a log file for each channel.
+	Messages are written in batches by this thread, so that logging never waits on the disk,
+	and the most recent messages of each log are kept in memory, so that they can be reviewed without reading it.
+	"""
+
+	def __init__(
+			self,
+			directory,
+			flushInterval=FLUSH_INTERVAL,
+			fsyncInterval=FSYNC_INTERVAL,
+			maxBytes=MAX_LOG_SIZE,
+			backupCount=BACKUP_COUNT,
+			tailLength=TAIL_LENGTH
+	):
+		threading.Thread.__init__(self)
+		self.name = "ChannelLog"
+		self.daemon = True
+		self.directory = directory
+		self.flushInterval = flushInterval
+		self.fsyncInterval = fsyncInterval
+		self.maxBytes = maxBytes
+		self.backupCount = backupCount
+		self.tailLength = tailLength
+		self._condition = threading.Condition()
+		self._pending = []
+		self._files = {}
+		self._unsynced = set()  # The names of logs which were written since they were last synced.
+		self._lastSync = default_timer()
+		self.finished = False
+		self.written = 0
+		self.batches = 0
+		os.makedirs(directory, exist_ok=True)
+		# The tails start with the end of the existing logs, which are read once, here.
+		self._tails = {}
+		for name in set(CHANNEL_LOGS.values()):
+			self._tails[name] = deque(maxlen=tailLength)
+			try:
+				with codecs.open(self.path(name), "rb", encoding="utf-8", errors="replace") as fileObj:
+					self._tails[name].extend(line.rstrip("\r\n") for line in fileObj)
+			except IOError:
+				pass
+
+	def path(self, name, backup=0):
+		if backup:
+			return os.path.join(self.directory, "{}.{}.txt".format(name, backup))
+		return os.path.join(self.directory, "{}.txt".format(name))
+
+	def log(self, channel, text):
+		"""Queue a message to be written to the log of a channel."""
+		name = CHANNEL_LOGS.get(channel, channel)
+		with self._condition:
+			if self.finished:
+				return
+			if name not in self._tails:
+				self._tails[name] = deque(maxlen=self.tailLength)
+			self._tails[name].append(text)
+			self._pending.append((name, text))
+			if len(self._pending) >= MAX_BATCH_SIZE:
+				self._condition.notify()
+
+	def tail(self, name, count=None):
+		"""Return up to count of the most recent messages in a log, or all of those kept in memory."""
+		with self._condition:
+			lines = list(self._tails.get(name, ()))
+		return lines if count is None else lines[-count:] if count > 0 else []
+
+	def _open(self, name):
+		if name not in self._files:
+			self._files[name] = codecs.open(self.path(name), "ab", encoding="utf-8")
+		return self._files[name]
+
+	def _rotate(self, name):
+		fileObj = self._files.pop(name)
+		os.fsync(fileObj.fileno())
+		fileObj.close()
+		self._unsynced.discard(name)
+		for backup in range(self.backupCount - 1, 0, -1):
+			if os.path.exists(self.path(name, backup)):
+				os.replace(self.path(name, backup), self.path(name, backup + 1))
+		if self.backupCount > 0:
+			os.replace(self.path(name), self.path(name, 1))
+		else:
+			os.remove(self.path(name))
+
+	def _write(self, batch):
+		grouped = {}
+		for name, text in batch:
+			grouped.setdefault(name, []).append(text + "\n")
+		for name, lines in grouped.items():
+			fileObj = self._open(name)
+			fileObj.write("".join(lines))
+			fileObj.flush()
+			self._unsynced.add(name)
+			if fileObj.tell() >= self.maxBytes:
+				self._rotate(name)
+		self.written += len(batch)
+		self.batches += 1
+
+	def _sync(self):
+		for name in self._unsynced:
+			os.fsync(self._files[name].fileno())
+		self._unsynced.clear()
+		self._lastSync = default_timer()
+
+	def run(self):
+		while True:
+			with self._condition:
+				self._condition.wait_for(
+					lambda: self.finished or len(self._pending) >= MAX_BATCH_SIZE, self.flushInterval
+				)
+				batch = self._pending
+				self._pending = []
+				finished = self.finished
+			try:
+				if batch:
+					self._write(batch)
+				if finished or default_timer() - self._lastSync >= self.fsyncInterval:
+					self._sync()
+			except EnvironmentError as e:
+				logger.warning("Unable to write channel logs: {}".format(e))
+			if finished:
+				break
+		for fileObj in self._files.values():
+			fileObj.close()
+		self._files.clear()
+
+	def close(self):
+		"""Write the waiting messages and stop the thread."""
+		with self._condition:
+			self.finished = True
+			self._condition.notify()
+		if self.is_alive():
+			self.join()
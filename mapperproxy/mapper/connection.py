@@ -0,0 +1,159 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import logging
+import socket
+import threading
+
+
+# The delay in seconds before the second reconnection attempt. The delay is doubled after each failed attempt.
+RECONNECT_INITIAL_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+RECONNECT_ATTEMPTS = 10
+
+
+logger = logging.getLogger(__name__)
+
+
+class ServerConnection(object):
+	"""
+	Manages the connection to MUME, exposing the socket methods used by the proxy.
+	The connection can be started in the background, and replaced if it drops.
+	If an SSL context is given, the connection is encrypted, and TLS sessions are resumed when reconnecting.
+	"""
+
+	def __init__(self, host, port, sslContext=None, serverHostname="mume.org", timeout=None):
+		self.host = host
+		self.port = port
+		self._sslContext = sslContext
+		self._serverHostname = serverHostname
+		self._timeout = timeout
+		self._socket = None
+		self._tlsSession = None
+		self._lock = threading.Lock()
+		self._closed = threading.Event()
+		self._connected = threading.Event()
+		self._connectThread = None
+		self.error = None  # The error from the last failed connection attempt.
+		self.connectionCount = 0
+		self.sessionReused = False
+
+	@property
+	def currentSocket(self):
+		return self._socket
+
+	def _connect(self):
+		sock = socket.create_connection((self.host, self.port), timeout=self._timeout)
+		try:
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+			if self._sslContext is not None:
+				sock = self._sslContext.wrap_socket(
+					sock,
+					server_hostname=self._serverHostname,
+					session=self._tlsSession
+				)
+				self.sessionReused = sock.session_reused
+			sock.settimeout(None)
+		except Exception:
+			sock.close()
+			raise
+		with self._lock:
+			if self._closed.is_set():
+				sock.close()
+				raise ConnectionAbortedError("The connection was closed while connecting.")
+			self._socket = sock
+		self.connectionCount += 1
+		logger.info(
+			f"Connected to {self.host}:{self.port}"
+			+ (" (TLS session resumed)." if self.sessionReused else ".")
+		)
+
+	def _connectInBackground(self):
+		try:
+			self._connect()
+			self.error = None
+		except EnvironmentError as e:
+			logger.error(f"Unable to connect to {self.host}:{self.port}: {e}")
+			self.error = e
+		self._connected.set()
+
+	def startConnecting(self):
+		"""Start connecting in the background, so that the connection is ready by the time it is needed."""
+		self._connected.clear()
+		self._connectThread = threading.Thread(target=self._connectInBackground, name="ServerConnection")
+		self._connectThread.daemon = True
+		self._connectThread.start()
+
+	def waitConnected(self, timeout=None):
+		"""Wait for a background connection attempt to finish, returning True if it succeeded."""
+		if self._connectThread is None:
+			self.startConnecting()
+		self._connected.wait(timeout)
+		return self._connected.is_set() and self._socket is not None
+
+	def reconnect(
+			self,
+			attempts=RECONNECT_ATTEMPTS,
+			initialDelay=RECONNECT_INITIAL_DELAY,
+			maxDelay=RECONNECT_MAX_DELAY
+	):
+		"""
+		Replace a dropped connection, waiting longer after each failed attempt.
+		Returns True if the connection was replaced, or False if all attempts failed or the connection was closed.
+		"""
+		self._closeSocket()
+		delay = initialDelay
+		for attempt in range(attempts):
+			if self._closed.wait(delay if attempt else 0):
+				break
+			try:
+				self._connect()
+				return True
+			except EnvironmentError as e:
+				logger.warning(f"Reconnection attempt {attempt + 1} to {self.host}:{self.port} failed: {e}")
+				self.error = e
+			if attempt:
+				delay = min(delay * 2, maxDelay)
+		return False
+
+	def _closeSocket(self):
+		with self._lock:
+			sock, self._socket = self._socket, None
+		if sock is not None:
+			if self._sslContext is not None and sock.session is not None:
+				# Under TLS 1.3, the session ticket is only received after the handshake,
+				# so the session is taken from the connection when it ends, rather than when it starts.
+				self._tlsSession = sock.session
+			try:
+				sock.shutdown(socket.SHUT_RDWR)
+			except EnvironmentError:
+				pass
+			sock.close()
+
+	def sendall(self, data):
+		sock = self._socket
+		if sock is not None:
+			sock.sendall(data)
+		elif self._closed.is_set():
+			raise ConnectionError("The connection is closed.")
+		else:
+			logger.debug("Dropping data sent while reconnecting.")
+
+	def recv_into(self, buffer):
+		sock = self._socket
+		if sock is None:
+			raise ConnectionError("Not connected.")
+		return sock.recv_into(buffer)
+
+	def shutdown(self, how):
+		sock = self._socket
+		if sock is not None:
+			sock.shutdown(how)
+
+	def close(self):
+		self._closed.set()
+		self._closeSocket()
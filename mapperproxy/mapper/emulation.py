@@ -329,8 +329,7 @@ class Emulator(threading.Thread):
 		wld.saveConfig()
 		wld.output("Good bye.")
 		if self._interface != "text":
-			with wld._gui_queue_lock:
-				wld._gui_queue.put(None)
+			wld._gui_updates.close()
 
 
 def main(interface, findFormat):
@@ -0,0 +1,136 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from collections import deque
+import itertools
+from queue import Empty
+import threading
+from timeit import default_timer
+
+# Local Modules:
+from .latency import LatencyHistogram
+
+
+# The lanes of the queue, in order of priority.
+LANES = (
+	("user", "Commands from the user"),
+	("event", "Room, prompt, and other events from MUME, and the request to exit"),
+	("line", "Lines of text from MUME")
+)
+USER_LANE, EVENT_LANE, LINE_LANE = range(len(LANES))
+# The number of line events which may be waiting behind a line before it is dropped if it is not needed.
+LINE_LANE_LIMIT = 1000
+
+
+class EventQueue(object):
+	"""
+	The queue of items for the mapper thread, with the same put and get methods as queue.Queue.
+	Items from the user are always handled first, so that commands such as 'stop' are not delayed by floods.
+	Items from MUME are handled in the order they were received, whichever lane they are in.
+	If the line lane is full, lines for which isLineNeeded returns False are dropped when they are taken.
+	The drop is decided by the thread which calls get, so that isLineNeeded may read the state of the mapper
+	without the threads receiving data racing with it.
+	"""
+
+	def __init__(self, isLineNeeded=None, lineLimit=LINE_LANE_LIMIT):
+		self.isLineNeeded = isLineNeeded
+		self.lineLimit = lineLimit
+		self._condition = threading.Condition()
+		self._lanes = tuple(deque() for lane in LANES)
+		self._sequence = itertools.count()
+		self.waitTimes = tuple(LatencyHistogram() for lane in LANES)
+		self.reset()
+
+	def reset(self):
+		with self._condition:
+			self.queued = [0] * len(LANES)
+			self.dropped = [0] * len(LANES)
+			self.maxDepth = [len(lane) for lane in self._lanes]
+			for histogram in self.waitTimes:
+				histogram.reset()
+
+	@staticmethod
+	def laneOf(item):
+		dataType, data = item
+		if data is None:
+			# The request to exit is handled after the items which were queued before it.
+			return EVENT_LANE
+		elif not isinstance(data, tuple):
+			return USER_LANE
+		# Data from MUME is an (event, data) tuple.
+		return LINE_LANE if data[0] == "line" else EVENT_LANE
+
+	def put(self, item, block=True, timeout=None):
+		"""Queue an item. Never blocks, so that the threads receiving data are not held up by the mapper."""
+		lane = self.laneOf(item)
+		with self._condition:
+			queue = self._lanes[lane]
+			queue.append((next(self._sequence), default_timer(), item))
+			self.queued[lane] += 1
+			self.maxDepth[lane] = max(self.maxDepth[lane], len(queue))
+			self._condition.notify()
+
+	def put_nowait(self, item):
+		self.put(item)
+
+	def _pop(self):
+		lanes = self._lanes
+		if lanes[USER_LANE]:
+			lane = USER_LANE
+		elif lanes[EVENT_LANE] and (not lanes[LINE_LANE] or lanes[EVENT_LANE][0][0] < lanes[LINE_LANE][0][0]):
+			lane = EVENT_LANE
+		else:
+			lane = LINE_LANE
+		sequence, queuedTime, item = lanes[lane].popleft()
+		self.waitTimes[lane].record(default_timer() - queuedTime)
+		return lane, item, len(lanes[lane])
+
+	def get(self, block=True, timeout=None):
+		if not block:
+			timeout = 0
+		deadline = None if timeout is None else default_timer() + timeout
+		while True:
+			with self._condition:
+				if not self._condition.wait_for(
+					self.qsize, None if deadline is None else max(deadline - default_timer(), 0)
+				):
+					raise Empty
+				lane, item, waiting = self._pop()
+			if (
+				lane != LINE_LANE
+				or waiting < self.lineLimit
+				or self.isLineNeeded is None
+				or self.isLineNeeded(item[1][1])
+			):
+				return item
+			with self._condition:
+				self.dropped[lane] += 1
+
+	def get_nowait(self):
+		return self.get(block=False)
+
+	def qsize(self):
+		return sum(len(lane) for lane in self._lanes)
+
+	def empty(self):
+		return not self.qsize()
+
+	def report(self):
+		lines = [
+			f"{'Lane':<8}{'Depth':>7}{'Max':>7}{'Queued':>9}{'Dropped':>9}"
+			+ f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Max ms':>10}"
+		]
+		with self._condition:
+			for lane, (name, description) in enumerate(LANES):
+				histogram = self.waitTimes[lane]
+				lines.append(
+					f"{name:<8}{len(self._lanes[lane]):>7}{self.maxDepth[lane]:>7}"
+					+ f"{self.queued[lane]:>9}{self.dropped[lane]:>9}"
+					+ "".join(f"{histogram.percentile(percent) * 1000:>10.3f}" for percent in (50, 95, 99))
+					+ f"{histogram.maximum / 1000:>10.3f}"
+				)
+		lines.extend(f"{name}: {description}." for name, description in LANES)
+		return "\n".join(lines)
@@ -9,10 +9,7 @@ from collections import namedtuple
 from itertools import chain
 import logging
 import math
-try:
-	from Queue import Empty as QueueEmpty
-except ImportError:
-	from queue import Empty as QueueEmpty
+from timeit import default_timer
 
 import pyglet
 from pyglet.window import key
@@ -123,8 +120,8 @@ class Blinker(object):
 class Window(pyglet.window.Window):
 	def __init__(self, world):
 		self.world = world
-		self._gui_queue = world._gui_queue
-		self._gui_queue_lock = world._gui_queue_lock
+		self._gui_updates = world._gui_updates
+		self._last_gui_update = 0.0
 		if Speech is not None:
 			self._speech = Speech()
 			self.say = self._speech.say
@@ -163,7 +160,7 @@ class Window(pyglet.window.Window):
 		self.current_room = None
 		super(Window, self).__init__(caption="MPM", resizable=True, vsync=False, fullscreen=self._cfg["fullscreen"])
 		logger.info("Created window {}".format(self))
-		pyglet.clock.schedule_interval_soft(self.queue_observer, 1.0 / FPS)
+		self._gui_updates.setWaker(self.wake)
 		if self.blink:
 			# If blinking was enabled in the cconfig file, resetting self.blink
 			# to True will trigger the initial scheduling of the blinker in the clock.
@@ -326,16 +323,31 @@ class Window(pyglet.window.Window):
 		self.say(text)
 		self.world.output(text)
 
-	def queue_observer(self, dt):
-		with self._gui_queue_lock:
-			while not self._gui_queue.empty():
-				try:
-					event = self._gui_queue.get_nowait()
-					if event is None:
-						event = ("on_close",)
-					self.dispatch_event(event[0], *event[1:])
-				except QueueEmpty:
-					break
+	def wake(self):
+		"""Called from the mapper thread when updates for the GUI are pending."""
+		pyglet.app.platform_event_loop.post_event(self, "on_gui_update")
+
+	def on_gui_update(self):
+		# Updates are applied at most once per frame.
+		# Any which arrive in the mean time are merged into the pending update.
+		delay = self._last_gui_update + 1.0 / FPS - default_timer()
+		pyglet.clock.schedule_once(self.apply_gui_update, max(0.0, delay))
+
+	def apply_gui_update(self, dt):
+		self._last_gui_update = default_timer()
+		update = self._gui_updates.take()
+		if update is None:
+			return
+		elif update.close:
+			self.dispatch_event("on_close")
+		elif update.synced and update.refresh:
+			# Refreshing redraws around the current room, so there is no need to redraw for the sync as well.
+			self.current_room = update.room
+			self.dispatch_event("on_gui_refresh")
+		elif update.synced:
+			self.dispatch_event("on_map_sync", update.room)
+		elif update.refresh:
+			self.dispatch_event("on_gui_refresh")
 
 	def blinker(self, dt):
 		for _, marker in self.blinkers.items():
@@ -961,3 +973,4 @@ class Window(pyglet.window.Window):
 
 Window.register_event_type("on_map_sync")
 Window.register_event_type("on_gui_refresh")
+Window.register_event_type("on_gui_update")
@@ -8,10 +8,7 @@
 import logging
 import os.path
 from re import search
-try:
-	from Queue import Empty as QueueEmpty
-except ImportError:
-	from queue import Empty as QueueEmpty
+from timeit import default_timer
 
 import pyglet
 
@@ -98,8 +95,8 @@ class Window(pyglet.window.Window):
 			caption="MPM", resizable=True
 		)
 		logger.info("Creating window {}".format(self))
-		self._gui_queue = world._gui_queue
-		self._gui_queue_lock = world._gui_queue_lock
+		self._gui_updates = world._gui_updates
+		self._last_gui_update = 0.0
 		# Sprites
 		# The list of sprites
 		self.sprites = []
@@ -111,19 +108,31 @@ class Window(pyglet.window.Window):
 		self.layer.append(pyglet.graphics.OrderedGroup(1))
 		self.layer.append(pyglet.graphics.OrderedGroup(2))
 		self.layer.append(pyglet.graphics.OrderedGroup(3))
-		# Define FPS
-		pyglet.clock.schedule_interval_soft(self.queue_observer, 1.0 / FPS)
-
-	def queue_observer(self, dt):
-		with self._gui_queue_lock:
-			while not self._gui_queue.empty():
-				try:
-					event = self._gui_queue.get_nowait()
-					if event is None:
-						event = ("on_close",)
-					self.dispatch_event(event[0], *event[1:])
-				except QueueEmpty:
-					break
+		# Wake the GUI when the mapper has updates for it.
+		self._gui_updates.setWaker(self.wake)
+
+	def wake(self):
+		"""Called from the mapper thread when updates for the GUI are pending."""
+		pyglet.app.platform_event_loop.post_event(self, "on_gui_update")
+
+	def on_gui_update(self):
+		# Updates are applied at most once per frame (FPS).
+		# Any which arrive in the mean time are merged into the pending update.
+		delay = self._last_gui_update + 1.0 / FPS - default_timer()
+		pyglet.clock.schedule_once(self.apply_gui_update, max(0.0, delay))
+
+	def apply_gui_update(self, dt):
+		self._last_gui_update = default_timer()
+		update = self._gui_updates.take()
+		if update is None:
+			return
+		elif update.close:
+			self.dispatch_event("on_close")
+		elif update.synced:
+			# Syncing redraws the whole map, so a pending refresh is covered by it.
+			self.dispatch_event("on_map_sync", update.room)
+		elif update.refresh:
+			self.dispatch_event("on_gui_refresh")
 
 	def on_close(self):
 		logger.debug("Closing window {}".format(self))
@@ -253,3 +262,4 @@ class Window(pyglet.window.Window):
 
 Window.register_event_type('on_map_sync')
 Window.register_event_type('on_gui_refresh')
+Window.register_event_type('on_gui_update')
@@ -0,0 +1,79 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from collections import namedtuple
+import threading
+
+
+# The pending state taken by the GUI.
+# synced is True if the map was synced, in which case room is the latest room it was synced to.
+GUIUpdate = namedtuple("GUIUpdate", ("synced", "room", "refresh", "close"))
+
+
+class GUIUpdateChannel(object):
+	"""
+	Carries updates from the mapper to the GUI thread.
+	Only the latest map sync is kept, and refresh requests are merged into a single flag,
+	so that any number of updates between two frames cost the GUI a single redraw.
+	The waker is called when the channel goes from clean to dirty, and never while the GUI has an update pending.
+	"""
+
+	def __init__(self, waker=None):
+		self._lock = threading.Lock()
+		self._waker = waker
+		self._clear()
+		self.posted = 0
+		self.coalesced = 0
+
+	def _clear(self):
+		self._dirty = False
+		self._synced = False
+		self._room = None
+		self._refresh = False
+		self._close = False
+
+	def _post(self, **changes):
+		with self._lock:
+			wasDirty = self._dirty
+			for name, value in changes.items():
+				setattr(self, name, value)
+			self._dirty = True
+			self.posted += 1
+			if wasDirty:
+				self.coalesced += 1
+			waker = self._waker
+		if not wasDirty and waker is not None:
+			waker()
+
+	@property
+	def dirty(self):
+		return self._dirty
+
+	def setWaker(self, waker):
+		"""Set the function which wakes the GUI, calling it if updates were posted before it was set."""
+		with self._lock:
+			self._waker = waker
+			dirty = self._dirty
+		if dirty and waker is not None:
+			waker()
+
+	def sync(self, room):
+		self._post(_synced=True, _room=room)
+
+	def refresh(self):
+		self._post(_refresh=True)
+
+	def close(self):
+		self._post(_close=True)
+
+	def take(self):
+		"""Return the pending update and mark the channel clean, or return None if nothing changed."""
+		with self._lock:
+			if not self._dirty:
+				return None
+			update = GUIUpdate(self._synced, self._room, self._refresh, self._close)
+			self._clear()
+		return update
@@ -0,0 +1,123 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from collections import deque
+import math
+import threading
+from timeit import default_timer
+
+
+# The stages which are measured, in the order they occur.
+STAGES = (
+	("parse", "Parsing a chunk received from MUME"),
+	("enqueue", "Receiving a chunk until its prompt event is queued"),
+	("queue", "Waiting in the mapper queue"),
+	("handler", "Handling the prompt event in the mapper"),
+	("send", "Sending the parsed chunk to the client"),
+	("total", "Receiving a chunk until its prompt event is handled")
+)
+
+
+class LatencyHistogram(object):
+	"""
+	A histogram of latencies in microseconds, with buckets which grow exponentially in size.
+	Like an HDR histogram, values are recorded with a fixed relative precision, regardless of their magnitude.
+	"""
+
+	def __init__(self, subBucketBits=7):
+		# Values are tracked to within 1 part in 2 ** (subBucketBits - 1).
+		self._subBucketBits = subBucketBits
+		self._counts = {}
+		self.reset()
+
+	def reset(self):
+		self._counts.clear()
+		self.count = 0
+		self.maximum = 0
+
+	def _index(self, value):
+		shift = max(0, value.bit_length() - self._subBucketBits)
+		return (shift << self._subBucketBits) + (value >> shift)
+
+	def _highestEquivalentValue(self, index):
+		shift = index >> self._subBucketBits
+		subBucket = index & ((1 << self._subBucketBits) - 1)
+		return ((subBucket + 1) << shift) - 1
+
+	def record(self, seconds):
+		value = max(0, int(seconds * 1000000))
+		index = self._index(value)
+		self._counts[index] = self._counts.get(index, 0) + 1
+		self.count += 1
+		self.maximum = max(self.maximum, value)
+
+	def percentile(self, percent):
+		"""Return the latency in seconds, below which percent percent of the recorded values fall."""
+		if not self.count:
+			return 0.0
+		target = max(1, math.ceil(self.count * percent / 100))
+		total = 0
+		for index in sorted(self._counts):
+			total += self._counts[index]
+			if total >= target:
+				return min(self._highestEquivalentValue(index), self.maximum) / 1000000
+		return self.maximum / 1000000
+
+
+class LatencyTracker(object):
+	"""Tracks the latency of each stage, from receiving data from MUME to handling the prompt in the mapper."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.histograms = {stage: LatencyHistogram() for stage, description in STAGES}
+		# Prompts which have been queued for the mapper, but not yet handled.
+		# Both the queue and the mapper handle prompts in order, so the oldest is always handled first.
+		self._pendingPrompts = deque()
+
+	def record(self, stage, seconds):
+		with self._lock:
+			self.histograms[stage].record(seconds)
+
+	def promptQueued(self, receivedTime):
+		queuedTime = default_timer()
+		with self._lock:
+			self.histograms["enqueue"].record(queuedTime - receivedTime)
+			self._pendingPrompts.append((receivedTime, queuedTime))
+
+	def promptDequeued(self):
+		"""Return a token to be passed to promptHandled, or None if the prompt was queued by something else."""
+		dequeuedTime = default_timer()
+		with self._lock:
+			if not self._pendingPrompts:
+				return None
+			receivedTime, queuedTime = self._pendingPrompts.popleft()
+			self.histograms["queue"].record(dequeuedTime - queuedTime)
+		return receivedTime, dequeuedTime
+
+	def promptHandled(self, token):
+		handledTime = default_timer()
+		receivedTime, dequeuedTime = token
+		with self._lock:
+			self.histograms["handler"].record(handledTime - dequeuedTime)
+			self.histograms["total"].record(handledTime - receivedTime)
+
+	def reset(self):
+		with self._lock:
+			for histogram in self.histograms.values():
+				histogram.reset()
+
+	def report(self):
+		lines = [f"{'Stage':<10}{'Count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Max ms':>10}"]
+		with self._lock:
+			for stage, description in STAGES:
+				histogram = self.histograms[stage]
+				lines.append(
+					f"{stage:<10}{histogram.count:>8}"
+					+ "".join(f"{histogram.percentile(percent) * 1000:>10.3f}" for percent in (50, 95, 99))
+					+ f"{histogram.maximum / 1000:>10.3f}"
+				)
+		lines.extend(f"{stage}: {description}." for stage, description in STAGES)
+		return "\n".join(lines)
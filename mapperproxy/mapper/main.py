@@ -4,8 +4,11 @@
 
 
 # Built-in Modules:
+import asyncio
+from collections import deque
 import logging
 import os
+from queue import Empty
 import socket
 try:
 	import certifi
@@ -14,30 +17,194 @@ except ImportError:
 	ssl = None
 from telnetlib import DO, GA, IAC, NAWS, TTYPE
 import threading
+from timeit import default_timer
 
 # Local Modules:
+from .capture import FROM_CLIENT, FROM_SERVER, SessionRecorder
+from .channellog import ChannelLog
+from .connection import ServerConnection
 from .protocols import ProtocolHandler
 from .protocols.telnetfilter import TelnetFilter
 from .protocols.mpi import MPI_INIT
 from .mapper import USER_DATA, Mapper
+from .substitutions import loadSubstitutions
 from .utils import getDirectoryPath, removeFile, touch
 
 
 LISTENING_STATUS_FILE = os.path.join(getDirectoryPath("."), "mapper_ready.ignore")
+RECEIVE_BUFFER_SIZE = 4096
+# The maximum number of bytes which may be waiting to be sent to a client.
+# Output to the primary client waits for it to catch up when it falls further behind than this,
+# and other clients are disconnected, so that they can't stall the session.
+CLIENT_BUFFER_LIMIT = 1024 * 1024
+# The maximum number of buffered fragments which are combined into a single write.
+MAX_COALESCED_FRAGMENTS = 64
+# The number of seconds to wait for the connection to MUME, including the TLS handshake.
+SERVER_CONNECT_TIMEOUT = 30.0
 
 
 logger = logging.getLogger(__name__)
 
 
+class ClientWriter(threading.Thread):
+	"""
+	Owns the sending side of a client connection.
+	Data is sent from a bounded buffer, so that a slow client doesn't block the sender until the buffer is full,
+	and fragments which accumulate while a write is in progress are combined into the next one.
+	Once the buffer is full, a blocking writer makes the sender wait,
+	and any other writer disconnects the client.
+	"""
+
+	def __init__(self, connection, bufferLimit=CLIENT_BUFFER_LIMIT, blocking=False):
+		threading.Thread.__init__(self)
+		self.name = "ClientWriter"
+		self.daemon = True
+		self._connection = connection
+		self._bufferLimit = bufferLimit
+		self._blocking = blocking
+		self._buffer = deque()
+		self._bufferSize = 0
+		self._condition = threading.Condition()
+		self.closed = False
+
+	def write(self, data):
+		"""Buffer data for sending, returning False if the client is closed or too far behind."""
+		with self._condition:
+			while not self.closed and self._bufferSize and self._bufferSize + len(data) > self._bufferLimit:
+				if not self._blocking:
+					logger.warning(f"Client {self._connection!r} fell too far behind, disconnecting it.")
+					self._close(flush=False)
+					return False
+				# Wait for the client to catch up, rather than end the session because it is paused.
+				self._condition.wait()
+			if self.closed:
+				return False
+			self._buffer.append(data)
+			self._bufferSize += len(data)
+			# Both the writer thread and blocked senders wait on the condition.
+			self._condition.notify_all()
+		return True
+
+	def _close(self, flush):
+		self.closed = True
+		if not flush:
+			self._buffer.clear()
+			self._bufferSize = 0
+		self._condition.notify_all()
+
+	def close(self, flush=True):
+		with self._condition:
+			self._close(flush)
+
+	def _send(self, fragments):
+		if not hasattr(self._connection, "sendmsg"):
+			# Sendmsg is not available on all platforms.
+			self._connection.sendall(b"".join(fragments))
+			return
+		fragments = deque(memoryview(fragment) for fragment in fragments)
+		while fragments:
+			sent = self._connection.sendmsg(fragments)
+			# Discard the bytes which were sent, in case the write was partial.
+			while sent and sent >= len(fragments[0]):
+				sent -= len(fragments.popleft())
+			if sent:
+				fragments[0] = fragments[0][sent:]
+
+	def run(self):
+		while True:
+			with self._condition:
+				while not self._buffer and not self.closed:
+					self._condition.wait()
+				if not self._buffer:
+					break
+				fragments = []
+				while self._buffer and len(fragments) < MAX_COALESCED_FRAGMENTS:
+					fragments.append(self._buffer.popleft())
+				self._bufferSize -= sum(len(fragment) for fragment in fragments)
+				self._condition.notify_all()
+			try:
+				self._send(fragments)
+			except EnvironmentError:
+				self.close(flush=False)
+
+
+class ClientGroup(object):
+	"""Sends the same output to every connected client, exposing the sendall method of a socket."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		# Output from the Server and Mapper threads is buffered for every client while holding this lock,
+		# so that all clients receive it in the same order.
+		self._sendLock = threading.Lock()
+		self._writers = []
+		self._primary = None
+
+	def __len__(self):
+		with self._lock:
+			return len(self._writers)
+
+	def add(self, writer, primary=False):
+		with self._lock:
+			self._writers.append(writer)
+			if primary:
+				self._primary = writer
+		writer.start()
+
+	def remove(self, writer):
+		with self._lock:
+			if writer in self._writers:
+				self._writers.remove(writer)
+		writer.close(flush=False)
+
+	def sendall(self, data):
+		if isinstance(data, memoryview):
+			data = bytes(data)
+		with self._sendLock:
+			with self._lock:
+				writers = list(self._writers)
+			for writer in writers:
+				if not writer.write(data):
+					self.remove(writer)
+		if self._primary is not None and self._primary.closed:
+			raise ConnectionError("The primary client is disconnected.")
+
+	def close(self):
+		with self._lock:
+			writers = list(self._writers)
+			self._writers.clear()
+		for writer in writers:
+			writer.close()
+		for writer in writers:
+			writer.join()
+
+
 class Proxy(threading.Thread):
-	def __init__(self, client, server, mapper, isEmulatingOffline):
+	def __init__(
+			self,
+			client,
+			server,
+			mapper,
+			isEmulatingOffline,
+			isReadOnly=False,
+			recorder=None,
+			reconnect=False
+	):
 		threading.Thread.__init__(self)
 		self.name = "Proxy"
 		self._client = client
 		self._server = server
 		self._mapper = mapper
 		self.isEmulatingOffline = isEmulatingOffline
+		self.isReadOnly = isReadOnly
+		# If True, the Server thread replaces a dropped connection to MUME, so errors sending to it are not fatal.
+		self.reconnect = reconnect
+		self._recorder = recorder
 		self._handler = TelnetFilter()
+		self._buffer = bytearray(RECEIVE_BUFFER_SIZE)
+		self._userCommands = frozenset(
+			func[len("user_command_"):].encode("us-ascii", "ignore") for func in dir(self._mapper)
+			if func.startswith("user_command_")
+		)
 		self.finished = threading.Event()
 
 	def close(self):
@@ -47,20 +214,37 @@ class Proxy(threading.Thread):
 		try:
 			self._server.sendall(data)
 			return True
-		except EnvironmentError:
-			self.close()
+		except EnvironmentError as e:
+			if self.reconnect:
+				logger.debug(f"Dropping data sent to MUME while the connection is lost: {e}")
+			else:
+				self.close()
 			return False
 
+	def handleClientData(self, data):
+		"""Send data from the client to the mapper if it is a mapper command, or to MUME otherwise."""
+		if self.isReadOnly:
+			return
+		if self._recorder is not None:
+			self._recorder.record(FROM_CLIENT, data)
+		negotiations, text = self._handler.parse(data)
+		if self.isUserCommand(text):
+			self._mapper.queue.put((USER_DATA, text))
+			if negotiations:
+				self.write(negotiations)
+		else:
+			self.write(data)
+
+	def isUserCommand(self, text):
+		"""Determine whether text from the client is meant for the mapper."""
+		words = text.split(None, 1)
+		return bool(words) and (self.isEmulatingOffline or words[0] in self._userCommands)
+
 	def run(self):
-		handler = self._handler
-		userCommands = [
-			func[len("user_command_"):].encode("us-ascii", "ignore") for func in dir(self._mapper)
-			if func.startswith("user_command_")
-		]
+		view = memoryview(self._buffer)
 		while not self.finished.isSet():
 			try:
-				data = self._client.recv(4096)
-				negotiations, text = handler.parse(data)
+				data = view[:self._client.recv_into(self._buffer)]
 			except socket.timeout:
 				continue
 			except EnvironmentError:
@@ -68,16 +252,22 @@ class Proxy(threading.Thread):
 				continue
 			if not data:
 				self.close()
-			elif text.strip() and (self.isEmulatingOffline or text.strip().split()[0] in userCommands):
-				self._mapper.queue.put((USER_DATA, text))
-				if negotiations:
-					self.write(negotiations)
 			else:
-				self.write(data)
+				self.handleClientData(data)
 
 
 class Server(threading.Thread):
-	def __init__(self, client, server, mapper, outputFormat, interface, promptTerminator):
+	def __init__(
+			self,
+			client,
+			server,
+			mapper,
+			outputFormat,
+			interface,
+			promptTerminator,
+			recorder=None,
+			reconnect=False
+	):
 		threading.Thread.__init__(self)
 		self.name = "Server"
 		self._client = client
@@ -86,6 +276,7 @@ class Server(threading.Thread):
 		self._outputFormat = outputFormat
 		self._interface = interface
 		self._promptTerminator = promptTerminator
+		self.reconnect = reconnect
 		self.finished = threading.Event()
 		# The initial output of MUME. Used by the server thread to detect connection success.
 		self.initialOutput = IAC + DO + TTYPE + IAC + DO + NAWS
@@ -99,44 +290,194 @@ class Server(threading.Thread):
 			# Tell the Mume server to put IAC-GA at end of prompts.
 			MPI_INIT + b"P2\nG\n"
 		]
-		self._handler = ProtocolHandler(
+		# Substitutions and gags only apply to output formats which send text, not to raw XML or events.
+		self._substitutions = None
+		if outputFormat in ("normal", "tintin"):
+			errors, self._substitutions = loadSubstitutions()
+			if errors is not None:
+				logger.warning(errors)
+		self._handler = self._createHandler()
+		# Data from MUME is received into this buffer, which is reused for every read.
+		# The handler stages receive memoryview slices of it, and only copy the bytes they keep.
+		self._buffer = bytearray(RECEIVE_BUFFER_SIZE)
+		self._encounteredInitialOutput = False
+		self._recorder = recorder
+		self._receivedTime = None  # When the data currently being parsed was received.
+
+	def close(self):
+		self.finished.set()
+
+	def _createHandler(self):
+		return ProtocolHandler(
 			remoteSender=self._server.sendall,
-			eventSender=self._mapper.queue.put,
+			eventSender=self._queueEvent,
 			outputFormat=self._outputFormat,
-			promptTerminator=self._promptTerminator
+			promptTerminator=self._promptTerminator,
+			substitutions=self._substitutions
 		)
 
-	def close(self):
-		self.finished.set()
+	def handleReconnect(self):
+		"""Reset the protocol state, so that the initial configuration is sent again on the new connection."""
+		# Open editing and viewing sessions are left to finish, without holding up the new connection.
+		self._handler.close()
+		self._handler = self._createHandler()
+		self._encounteredInitialOutput = False
+
+	def _reconnect(self):
+		"""Try to replace a dropped connection to MUME, returning True if successful."""
+		if not self.reconnect or self.finished.isSet():
+			return False
+		try:
+			self._client.sendall(b"\r\nLost the connection to MUME. Reconnecting.\r\n")
+			if not self._server.reconnect():
+				self._client.sendall(b"\r\nError: unable to reconnect to MUME.\r\n")
+				return False
+		except EnvironmentError:
+			return False
+		self.handleReconnect()
+		return True
+
+	def _queueEvent(self, item):
+		dataType, (event, data) = item
+		if event == "prompt":
+			self._mapper.latency.promptQueued(self._receivedTime)
+		self._mapper.queue.put(item)
+
+	def sendToClient(self, data):
+		startTime = default_timer()
+		self._client.sendall(data)
+		self._mapper.latency.record("send", default_timer() - startTime)
+
+	def handleServerData(self, data):
+		"""Parse data from MUME, returning the output for the client."""
+		self._receivedTime = default_timer()
+		if self._recorder is not None:
+			self._recorder.record(FROM_SERVER, data)
+		if not self._encounteredInitialOutput and data[:len(self.initialOutput)] == self.initialOutput:
+			# The connection to Mume has been established, and the game has just responded with the login screen.
+			for item in self.initialConfiguration:
+				self._server.sendall(item)
+			self._handler._telnet.charset("us-ascii")
+			self._handler._telnet.compress()
+			self._handler._telnet.negotiateGMCP()
+			self._encounteredInitialOutput = True
+		result = self._handler.parse(data)
+		self._mapper.latency.record("parse", default_timer() - self._receivedTime)
+		return result
+
+	def cleanUp(self):
+		if self._interface != "text":
+			# Shutdown the gui
+			self._mapper._gui_updates.close()
+		self._handler.close()
 
 	def run(self):
-		handler = self._handler
-		encounteredInitialOutput = False
+		view = memoryview(self._buffer)
 		while not self.finished.isSet():
 			try:
-				data = self._server.recv(4096)
+				data = view[:self._server.recv_into(self._buffer)]
 			except EnvironmentError:
-				self.close()
+				# The connection was lost, as opposed to MUME closing it after the player quit.
+				if not self._reconnect():
+					self.close()
 				continue
 			if not data:
 				self.close()
 				continue
-			elif not encounteredInitialOutput and data.startswith(self.initialOutput):
-				# The connection to Mume has been established, and the game has just responded with the login screen.
-				for item in self.initialConfiguration:
-					self._server.sendall(item)
-				handler._telnet.charset("us-ascii")
-				encounteredInitialOutput = True
 			try:
-				self._client.sendall(handler.parse(data))
+				self.sendToClient(self.handleServerData(data))
 			except EnvironmentError:
 				self.close()
 				continue
-		if self._interface != "text":
-			# Shutdown the gui
-			with self._mapper._gui_queue_lock:
-				self._mapper._gui_queue.put(None)
-		handler.close()
+		self.cleanUp()
+
+
+class ClientListener(threading.Thread):
+	"""Accepts additional clients, which share the session of the first client."""
+
+	def __init__(
+			self,
+			proxySocket,
+			clients,
+			server,
+			mapper,
+			isEmulatingOffline,
+			maxClients,
+			isReadOnly,
+			recorder=None,
+			reconnect=False
+	):
+		threading.Thread.__init__(self)
+		self.name = "ClientListener"
+		self._proxySocket = proxySocket
+		self._clients = clients
+		self._server = server
+		self._mapper = mapper
+		self.isEmulatingOffline = isEmulatingOffline
+		self.maxClients = maxClients
+		self.isReadOnly = isReadOnly
+		self._recorder = recorder
+		self.reconnect = reconnect
+		self._connections = []  # Tuples of (connection, proxy, writer) for each additional client.
+		self.finished = threading.Event()
+
+	def close(self):
+		self.finished.set()
+
+	def _removeFinished(self):
+		for item in list(self._connections):
+			connection, proxy, writer = item
+			if proxy.finished.isSet() or writer.closed:
+				self._disconnect(*item)
+				self._connections.remove(item)
+
+	def _disconnect(self, connection, proxy, writer):
+		self._clients.remove(writer)
+		proxy.close()
+		try:
+			connection.shutdown(socket.SHUT_RDWR)
+		except EnvironmentError:
+			pass
+		proxy.join()
+		writer.join()
+		connection.close()
+
+	def run(self):
+		self._proxySocket.settimeout(1.0)
+		while not self.finished.isSet():
+			self._removeFinished()
+			try:
+				connection, address = self._proxySocket.accept()
+			except socket.timeout:
+				continue
+			except EnvironmentError:
+				break
+			if len(self._clients) >= self.maxClients:
+				try:
+					connection.sendall(b"\r\nError: the maximum number of clients are already connected.\r\n")
+					connection.shutdown(socket.SHUT_RDWR)
+				except EnvironmentError:
+					pass
+				connection.close()
+				continue
+			logger.info(f"Additional client connected from {address}.")
+			connection.settimeout(1.0)
+			writer = ClientWriter(connection)
+			proxy = Proxy(
+				client=connection,
+				server=self._server,
+				mapper=self._mapper,
+				isEmulatingOffline=self.isEmulatingOffline,
+				isReadOnly=self.isReadOnly,
+				recorder=self._recorder,
+				reconnect=self.reconnect
+			)
+			self._clients.add(writer)
+			proxy.start()
+			self._connections.append((connection, proxy, writer))
+		for item in self._connections:
+			self._disconnect(*item)
+		self._connections.clear()
 
 
 class MockedSocket(object):
@@ -156,77 +497,219 @@ class MockedSocket(object):
 		pass
 
 
-def main(
+class TransportSocket(object):
+	"""Exposes the sendall method of a socket on top of an asyncio transport."""
+
+	def __init__(self, loop):
+		self._loop = loop
+		self.transport = None
+
+	def _write(self, data):
+		if self.transport is not None and not self.transport.is_closing():
+			self.transport.write(data)
+
+	def sendall(self, data):
+		if self.transport is None or self.transport.is_closing():
+			raise ConnectionError("Transport is closed.")
+		# Memoryview slices of a receive buffer must be copied before the buffer is reused.
+		data = bytes(data)
+		try:
+			isLoopThread = asyncio.get_running_loop() is self._loop
+		except RuntimeError:
+			isLoopThread = False
+		if isLoopThread:
+			self._write(data)
+		else:
+			# Called from another thread, such as an MPI editing session.
+			self._loop.call_soon_threadsafe(self._write, data)
+
+
+class BufferedReceiver(asyncio.BufferedProtocol):
+	"""Receives data into a reusable buffer, passing memoryview slices of it to a callback."""
+
+	def __init__(self, onData, onClose):
+		self._onData = onData
+		self._onClose = onClose
+		self._buffer = bytearray(RECEIVE_BUFFER_SIZE)
+		self._view = memoryview(self._buffer)
+
+	def get_buffer(self, sizeHint):
+		return self._buffer
+
+	def buffer_updated(self, nbytes):
+		self._onData(self._view[:nbytes])
+
+	def eof_received(self):
+		self._onClose()
+
+	def connection_lost(self, exc):
+		self._onClose()
+
+
+async def runAsync(
+		clientConnection,
+		serverConnection,
+		clientSocket,
+		serverSocket,
+		mapper,
+		proxy,
+		server,
+		useSsl
+):
+	"""
+	Drive the client connection, the MUME connection, and the mapper from a single event loop.
+	The ProtocolHandler and user command dispatch are the same ones used by the threaded engine.
+	"""
+	loop = asyncio.get_running_loop()
+	finished = loop.create_future()
+
+	def close():
+		if not finished.done():
+			finished.set_result(None)
+
+	def drainMapperQueue():
+		while not finished.done():
+			try:
+				dataType, data = mapper.queue.get_nowait()
+			except Empty:
+				break
+			if data is None:
+				close()
+			else:
+				mapper.handleQueueItem(dataType, data)
+
+	def onClientData(data):
+		proxy.handleClientData(data)
+		drainMapperQueue()
+
+	def onServerData(data):
+		try:
+			server.sendToClient(server.handleServerData(data))
+		except EnvironmentError:
+			close()
+		drainMapperQueue()
+
+	clientConnection.setblocking(False)
+	clientSocket.transport, _ = await loop.connect_accepted_socket(
+		lambda: BufferedReceiver(onClientData, close),
+		sock=clientConnection
+	)
+	if serverSocket is not None:
+		serverConnection.setblocking(False)
+		if useSsl:
+			sslContext = ssl.create_default_context(cafile=certifi.where())
+			serverSocket.transport, _ = await loop.create_connection(
+				lambda: BufferedReceiver(onServerData, close),
+				sock=serverConnection,
+				ssl=sslContext,
+				server_hostname="mume.org"
+			)
+		else:
+			serverSocket.transport, _ = await loop.create_connection(
+				lambda: BufferedReceiver(onServerData, close),
+				sock=serverConnection
+			)
+	await finished
+	mapper.clientSend("Exiting mapper thread.")
+	if serverSocket is not None:
+		serverSocket.transport.close()
+		server.cleanUp()
+	clientSocket.transport.write(b"\r\n")
+	clientSocket.transport.close()
+
+
+def runAsyncEngine(
+		clientConnection,
+		serverConnection,
 		outputFormat,
 		interface,
-		isEmulatingOffline,
 		promptTerminator,
 		gagPrompts,
 		findFormat,
-		localHost,
-		localPort,
-		remoteHost,
-		remotePort,
-		noSsl
+		isEmulatingOffline,
+		useSsl,
+		recorder=None,
+		channelLog=None
 ):
-	outputFormat = outputFormat.strip().lower()
-	interface = interface.strip().lower()
-	if not promptTerminator:
-		promptTerminator = IAC + GA
-	if not gagPrompts:
-		gagPrompts = False
-	if interface != "text":
-		try:
-			import pyglet
-		except ImportError:
-			print("Unable to find pyglet. Disabling the GUI")
-			interface = "text"
-	# initialise client connection
-	proxySocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-	proxySocket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-	proxySocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-	proxySocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-	proxySocket.bind((localHost, localPort))
-	proxySocket.listen(1)
-	touch(LISTENING_STATUS_FILE)
-	clientConnection, proxyAddress = proxySocket.accept()
-	clientConnection.settimeout(1.0)
-	# initialise server connection
-	if isEmulatingOffline:
-		serverConnection = MockedSocket()
-	else:
-		serverConnection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		serverConnection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-		serverConnection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-		if not noSsl and ssl is not None:
-			serverConnection = ssl.wrap_socket(
-				serverConnection,
-				cert_reqs=ssl.CERT_REQUIRED,
-				ca_certs=certifi.where(),
-				ssl_version=ssl.PROTOCOL_TLS
-			)
+	"""Run the proxy on a single asyncio event loop instead of the Proxy, Server, and Mapper threads."""
+	loop = asyncio.new_event_loop()
+	clientSocket = TransportSocket(loop)
+	serverSocket = serverConnection if isEmulatingOffline else TransportSocket(loop)
+	mapper = Mapper(
+		client=clientSocket,
+		server=serverSocket,
+		outputFormat=outputFormat,
+		interface=interface,
+		promptTerminator=promptTerminator,
+		gagPrompts=gagPrompts,
+		findFormat=findFormat,
+		isEmulatingOffline=isEmulatingOffline,
+		channelLog=channelLog
+	)
+	proxy = Proxy(
+		client=clientSocket,
+		server=serverSocket,
+		mapper=mapper,
+		isEmulatingOffline=isEmulatingOffline,
+		recorder=recorder
+	)
+	server = Server(
+		client=clientSocket,
+		server=serverSocket,
+		mapper=mapper,
+		outputFormat=outputFormat,
+		interface=interface,
+		promptTerminator=promptTerminator,
+		recorder=recorder
+	)
+	coroutine = runAsync(
+		clientConnection,
+		serverConnection,
+		clientSocket,
+		None if isEmulatingOffline else serverSocket,
+		mapper,
+		proxy,
+		server,
+		useSsl
+	)
 	try:
-		serverConnection.connect((remoteHost, remotePort))
-	except TimeoutError:
-		try:
-			clientConnection.sendall(b"\r\nError: server connection timed out!\r\n")
-			clientConnection.sendall(b"\r\n")
-			clientConnection.shutdown(socket.SHUT_RDWR)
-		except EnvironmentError:
-			pass
+		if interface != "text":
+			# Pyglet must run in the main thread, so the event loop is given its own.
+			import pyglet
+			loopThread = threading.Thread(target=loop.run_until_complete, args=(coroutine,), name="AsyncProxy")
+			loopThread.start()
+			pyglet.app.run()
+			loopThread.join()
+		else:
+			loop.run_until_complete(coroutine)
+	finally:
+		loop.close()
+		serverConnection.close()
 		clientConnection.close()
-		removeFile(LISTENING_STATUS_FILE)
-		return
-	if not noSsl and ssl is not None:
-		# Validating server identity with ssl module
-		# See https://wiki.python.org/moin/SSL
-		for field in serverConnection.getpeercert()["subject"]:
-			if field[0][0] == "commonName":
-				certhost = field[0][1]
-				if certhost != "mume.org":
-					raise ssl.SSLError("Host name 'mume.org' doesn't match certificate host '{}'".format(certhost))
+
+
+def runThreadedEngine(
+		clientConnection,
+		serverConnection,
+		proxySocket,
+		outputFormat,
+		interface,
+		promptTerminator,
+		gagPrompts,
+		findFormat,
+		isEmulatingOffline,
+		maxClients,
+		readOnlyClients,
+		recorder=None,
+		reconnect=False,
+		channelLog=None
+):
+	"""Run the proxy with the Proxy, Server, and Mapper threads, and a listener for secondary clients."""
+	# Output is sent to every client through the group, so that it is only computed once.
+	clients = ClientGroup()
+	clients.add(ClientWriter(clientConnection, blocking=True), primary=True)
 	mapperThread = Mapper(
-		client=clientConnection,
+		client=clients,
 		server=serverConnection,
 		outputFormat=outputFormat,
 		interface=interface,
@@ -234,26 +717,45 @@ def main(
 		gagPrompts=gagPrompts,
 		findFormat=findFormat,
 		isEmulatingOffline=isEmulatingOffline,
+		channelLog=channelLog
 	)
 	proxyThread = Proxy(
 		client=clientConnection,
 		server=serverConnection,
 		mapper=mapperThread,
-		isEmulatingOffline=isEmulatingOffline
+		isEmulatingOffline=isEmulatingOffline,
+		recorder=recorder,
+		reconnect=reconnect
 	)
 	serverThread = Server(
-		client=clientConnection,
+		client=clients,
 		server=serverConnection,
 		mapper=mapperThread,
 		outputFormat=outputFormat,
 		interface=interface,
-		promptTerminator=promptTerminator
+		promptTerminator=promptTerminator,
+		recorder=recorder,
+		reconnect=reconnect
+	)
+	listenerThread = ClientListener(
+		proxySocket=proxySocket,
+		clients=clients,
+		server=serverConnection,
+		mapper=mapperThread,
+		isEmulatingOffline=isEmulatingOffline,
+		maxClients=maxClients,
+		isReadOnly=readOnlyClients,
+		recorder=recorder,
+		reconnect=reconnect
 	)
 	if not isEmulatingOffline:
 		serverThread.start()
 	proxyThread.start()
 	mapperThread.start()
+	if maxClients > 1:
+		listenerThread.start()
 	if interface != "text":
+		import pyglet
 		pyglet.app.run()
 	if not isEmulatingOffline:
 		serverThread.join()
@@ -264,13 +766,135 @@ def main(
 	if not isEmulatingOffline:
 		mapperThread.queue.put((None, None))
 	mapperThread.join()
+	if listenerThread.is_alive():
+		listenerThread.close()
+		listenerThread.join()
+	try:
+		clients.sendall(b"\r\n")
+	except EnvironmentError:
+		pass
+	clients.close()
 	try:
-		clientConnection.sendall(b"\r\n")
 		proxyThread.close()
 		clientConnection.shutdown(socket.SHUT_RDWR)
 	except EnvironmentError:
 		pass
 	proxyThread.join()
-	serverConnection.close()
 	clientConnection.close()
+
+
+def main(
+		outputFormat,
+		interface,
+		isEmulatingOffline,
+		promptTerminator,
+		gagPrompts,
+		findFormat,
+		localHost,
+		localPort,
+		remoteHost,
+		remotePort,
+		noSsl,
+		useAsync=False,
+		maxClients=1,
+		readOnlyClients=False,
+		captureFile=None,
+		reconnect=False,
+		channelLogDirectory=None
+):
+	outputFormat = outputFormat.strip().lower()
+	interface = interface.strip().lower()
+	if not promptTerminator:
+		promptTerminator = IAC + GA
+	if not gagPrompts:
+		gagPrompts = False
+	if interface != "text":
+		try:
+			# The engines import it again when they run the GUI.
+			import pyglet  # NOQA: F401
+		except ImportError:
+			print("Unable to find pyglet. Disabling the GUI")
+			interface = "text"
+	# initialise client connection
+	proxySocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	proxySocket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+	proxySocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	proxySocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	proxySocket.bind((localHost, localPort))
+	proxySocket.listen(maxClients)
+	# initialise server connection
+	if isEmulatingOffline:
+		serverConnection = MockedSocket()
+	else:
+		if not noSsl and ssl is not None and not useAsync:
+			# The host name of the certificate is verified by the context.
+			# The async engine wraps the connection in TLS itself.
+			sslContext = ssl.create_default_context(cafile=certifi.where())
+		else:
+			sslContext = None
+		serverConnection = ServerConnection(
+			remoteHost, remotePort, sslContext=sslContext, timeout=SERVER_CONNECT_TIMEOUT
+		)
+		# Connect while waiting for the client, so that the TLS handshake is done by the time the client connects.
+		serverConnection.startConnecting()
+	touch(LISTENING_STATUS_FILE)
+	clientConnection, proxyAddress = proxySocket.accept()
+	clientConnection.settimeout(1.0)
+	if not isEmulatingOffline and not serverConnection.waitConnected(SERVER_CONNECT_TIMEOUT):
+		try:
+			clientConnection.sendall(
+				"\r\nError: unable to connect to the server: {}\r\n".format(
+					serverConnection.error or "timed out"
+				).encode("utf-8")
+			)
+			clientConnection.sendall(b"\r\n")
+			clientConnection.shutdown(socket.SHUT_RDWR)
+		except EnvironmentError:
+			pass
+		clientConnection.close()
+		serverConnection.close()
+		proxySocket.close()
+		removeFile(LISTENING_STATUS_FILE)
+		return
+	recorder = SessionRecorder(captureFile) if captureFile else None
+	channelLog = ChannelLog(channelLogDirectory) if channelLogDirectory else None
+	if channelLog is not None:
+		channelLog.start()
+	if useAsync:
+		runAsyncEngine(
+			clientConnection,
+			serverConnection if isEmulatingOffline else serverConnection.currentSocket,
+			outputFormat=outputFormat,
+			interface=interface,
+			promptTerminator=promptTerminator,
+			gagPrompts=gagPrompts,
+			findFormat=findFormat,
+			isEmulatingOffline=isEmulatingOffline,
+			useSsl=not noSsl and ssl is not None,
+			recorder=recorder,
+			channelLog=channelLog
+		)
+	else:
+		runThreadedEngine(
+			clientConnection,
+			serverConnection,
+			proxySocket,
+			outputFormat=outputFormat,
+			interface=interface,
+			promptTerminator=promptTerminator,
+			gagPrompts=gagPrompts,
+			findFormat=findFormat,
+			isEmulatingOffline=isEmulatingOffline,
+			maxClients=maxClients,
+			readOnlyClients=readOnlyClients,
+			recorder=recorder,
+			reconnect=reconnect,
+			channelLog=channelLog
+		)
+	serverConnection.close()
+	proxySocket.close()
+	if recorder is not None:
+		recorder.close()
+	if channelLog is not None:
+		channelLog.close()
 	removeFile(LISTENING_STATUS_FILE)
@@ -3,11 +3,9 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+from functools import partial
+import json
 import logging
-try:
-	from Queue import Queue
-except ImportError:
-	from queue import Queue
 import re
 from telnetlib import IAC
 import textwrap
@@ -15,6 +13,7 @@ import threading
 from timeit import default_timer
 
 from . import roomdata
+from .channellog import CHANNEL_LOGS
 from .cleanmap import ExitsCleaner
 from .clock import (
 	CLOCK_REGEX,
@@ -28,7 +27,10 @@ from .clock import (
 	Clock
 )
 from .config import Config, config_lock
+from .eventqueue import EventQueue
+from .latency import LatencyTracker
 from .timers import Timer
+from .triggers import EXACT, PREFIX, REGEX, TriggerEngine
 from .world import (
 	DIRECTIONS,
 	REVERSE_DIRECTIONS,
@@ -37,7 +39,7 @@ from .world import (
 	RUN_DESTINATION_REGEX,
 	World
 )
-from .utils import formatDocString, stripAnsi, decodeBytes, regexFuzzy, simplified, escapeXML, unescapeXML
+from .utils import formatDocString, decodeBytes, regexFuzzy, simplified, escapeXML, EventText, jsonLine
 
 
 EXIT_TAGS_REGEX = re.compile(
@@ -125,6 +127,34 @@ MOVEMENT_PREVENTED_REGEX = re.compile(
 		)
 	)
 )
+# Lines which mud_event_line acts upon, regardless of the mapper's state.
+SCOUTING_PREFIX = "You quietly scout "
+CLOCK_HERE_LINE = "A huge clock is standing here."
+MUD_HOLE_LINE = (
+	"Wet, cold and filled with mud you drop down into a dark "
+	"and moist cave, while you notice the mud above you moving "
+	"to close the hole you left in the cave ceiling."
+)
+LOOSE_GRAVEL_LINE = (
+	"The gravel below your feet loosens, shifting slightly.. "
+	"Suddenly, you lose your balance and crash to the cave floor below."
+)
+NOT_RIDABLE_LINE = "It's too difficult to ride here."
+RIDABLE_LINE = "You are already riding."
+# The events produced from the fields of GMCP room messages, which the XML handler would otherwise produce.
+GMCP_ROOM_EVENTS = (
+	("name", "name"),
+	("desc", "description"),
+	("terrain", "terrain")
+)
+TIME_SYNC_REGEXES = (
+	("clock", CLOCK_REGEX),
+	("time", TIME_REGEX),
+	("dawn", DAWN_REGEX),
+	("day", DAY_REGEX),
+	("dusk", DUSK_REGEX),
+	("night", NIGHT_REGEX)
+)
 PROMPT_REGEX = re.compile(
 	(
 		r"^(?P<light>[@*!\)o]?)(?P<terrain>[\#\(\[\+\.%fO~UW:=<]?)"
@@ -148,7 +178,8 @@ class Mapper(threading.Thread, World):
 			promptTerminator,
 			gagPrompts,
 			findFormat,
-			isEmulatingOffline
+			isEmulatingOffline,
+			channelLog=None
 	):
 		threading.Thread.__init__(self)
 		self.name = "Mapper"
@@ -161,7 +192,8 @@ class Mapper(threading.Thread, World):
 		self.gagPrompts = gagPrompts
 		self.findFormat = findFormat
 		self.isEmulatingOffline = isEmulatingOffline
-		self.queue = Queue()
+		self.queue = EventQueue(isLineNeeded=self.isLineNeeded)
+		self.latency = LatencyTracker()
 		with config_lock:
 			cfg = Config()
 			self._autoUpdateRooms = cfg.get("autoUpdateRooms", False)
@@ -182,7 +214,18 @@ class Mapper(threading.Thread, World):
 		]:
 			self.registerMudEventHandler(legacyHandler, getattr(self, "mud_event_" + legacyHandler))
 		self.unknownMudEvents = []
+		# The events which MUME has sent by GMCP. The same events from the XML handler are then ignored,
+		# so that each room and movement is only handled once.
+		self.gmcpEvents = set()
+		# Triggers on the lines from MUME, which are matched by mud_event_line.
+		self.lineTriggers = TriggerEngine()
+		self.addLineTriggers()
 		ExitsCleaner(self, "exits")
+		# Messages from communication channels are logged by the channel log's own thread.
+		self.channelLog = channelLog
+		if channelLog is not None:
+			for channel in CHANNEL_LOGS:
+				self.registerMudEventHandler(channel, partial(channelLog.log, channel))
 		self.emulationCommands = [
 			func[len("emulation_command_"):] for func in dir(self)
 			if func and func.startswith("emulation_command_") and callable(self.__getattribute__(func))
@@ -216,6 +259,21 @@ class Mapper(threading.Thread, World):
 		self.timeSynchronized = False
 		World.__init__(self, interface=interface)
 
+	@property
+	def timeSynchronized(self):
+		return self._timeSynchronized
+
+	@timeSynchronized.setter
+	def timeSynchronized(self, value):
+		self._timeSynchronized = bool(value)
+		# The triggers for synchronizing the time are only needed until the time is synchronized.
+		for name, regex in TIME_SYNC_REGEXES:
+			name = "time sync " + name
+			if self._timeSynchronized:
+				self.lineTriggers.remove(name)
+			elif name not in self.lineTriggers:
+				self.lineTriggers.add(name, regex.pattern, self.trigger_syncTime, kind=REGEX)
+
 	@property
 	def autoUpdateRooms(self):
 		return self._autoUpdateRooms
@@ -258,6 +316,13 @@ class Mapper(threading.Thread, World):
 				self._client.sendall(
 					"\r\n{msg}\r\n".format(msg=msg).encode("utf-8").replace(IAC, IAC + IAC)
 				)
+		elif self._outputFormat == "jsonl":
+			if showPrompt and self.prompt and not self.gagPrompts:
+				self._client.sendall(
+					jsonLine("mapper", msg) + jsonLine("prompt", self.prompt) + self._promptTerminator
+				)
+			else:
+				self._client.sendall(jsonLine("mapper", msg))
 		else:
 			if showPrompt and self.prompt and not self.gagPrompts:
 				self._client.sendall(
@@ -404,6 +469,49 @@ class Mapper(threading.Thread, World):
 	def user_command_gettimerms(self, *args):
 		self.clientSend("TIMERMS:{:d}:TIMERMS".format(int((default_timer() - self.initTimer) * 1000)))
 
+	def user_command_latency(self, *args):
+		"""
+		Shows the latency percentiles of each stage in handling prompts, and the state of the mapper queue.
+		Use 'latency reset' to clear them.
+		"""
+		if args and args[0] and args[0].strip().lower() == "reset":
+			self.latency.reset()
+			self.queue.reset()
+			self.clientSend("Latency counters reset.")
+		else:
+			self.clientSend(self.latency.report() + "\n\n" + self.queue.report())
+
+	def user_command_triggers(self, *args):
+		"""
+		Shows how many times each trigger on lines from the game has matched, and the time spent handling them.
+		Use 'triggers reset' to clear them.
+		"""
+		if args and args[0] and args[0].strip().lower() == "reset":
+			self.lineTriggers.reset()
+			self.clientSend("Trigger counters reset.")
+		else:
+			self.clientSend(self.lineTriggers.report())
+
+	def user_command_review(self, *args):
+		"""
+		Shows the recent messages of a channel log, such as 'review tells'.
+		Give a number to show that many of the last messages, or text to show the messages containing it.
+		"""
+		if self.channelLog is None:
+			return self.clientSend("Channel logging is disabled.")
+		names = sorted(set(CHANNEL_LOGS.values()))
+		name, searchString = (args[0].strip().lower().split(None, 1) + [""])[:2] if args and args[0] else ("", "")
+		if name not in names:
+			return self.clientSend("Usage: review [{}] [number|text]".format("|".join(names)))
+		searchString = searchString.strip()
+		if searchString.isdigit():
+			lines = self.channelLog.tail(name, int(searchString))
+		elif searchString:
+			lines = [line for line in self.channelLog.tail(name) if searchString in line.lower()]
+		else:
+			lines = self.channelLog.tail(name, 20)
+		self.clientSend("\n".join(lines) if lines else "Nothing found!")
+
 	def user_command_clock(self, *args):
 		if not args or not args[0] or not args[0].strip():
 			self.clientSend(self.clock.time())
@@ -684,13 +792,11 @@ class Mapper(threading.Thread, World):
 			else:
 				self.clientSend("No such vnum or label: {0}.".format(vnum))
 		else:
-			nameVnums = []
-			descVnums = []
-			for vnum, roomObj in self.rooms.items():
-				if roomObj.name == name:
-					nameVnums.append(vnum)
-				if desc and roomObj.desc == desc:
-					descVnums.append(vnum)
+			nameVnums = [roomObj.vnum for roomObj in self.getRoomsFromName(name) if roomObj.name == name]
+			descVnums = [
+				roomObj.vnum for roomObj in self.getRoomsFromName(name, desc)
+				if roomObj.name == name and roomObj.desc == desc
+			] if desc else []
 			if not nameVnums:
 				self.clientSend("Current room not in the database. Unable to sync.")
 			elif len(descVnums) == 1:
@@ -715,6 +821,7 @@ class Mapper(threading.Thread, World):
 		deathTraps = []
 		oneWays = []
 		undefineds = []
+		incoming = self.getIncomingExits(self.currentRoom.vnum)
 		for direction, exitObj in self.currentRoom.exits.items():
 			if exitObj.door and exitObj.door != "exit":
 				doors.append("{}: {}".format(direction, exitObj.door))
@@ -722,10 +829,7 @@ class Mapper(threading.Thread, World):
 				undefineds.append(direction)
 			elif exitObj.to == "death":
 				deathTraps.append(direction)
-			elif (
-				REVERSE_DIRECTIONS[direction] not in self.rooms[exitObj.to].exits
-				or self.rooms[exitObj.to].exits[REVERSE_DIRECTIONS[direction]].to != self.currentRoom.vnum
-			):
+			elif (exitObj.to, REVERSE_DIRECTIONS[direction]) not in incoming:
 				oneWays.append(direction)
 		if doors:
 			self.clientSend("Doors: {}".format(", ".join(doors)), showPrompt=False)
@@ -776,15 +880,14 @@ class Mapper(threading.Thread, World):
 				continue
 			if direction not in self.currentRoom.exits:
 				output.append("Adding exit '{}' to current room.".format(direction))
-				self.currentRoom.exits[direction] = self.getNewExit(direction)
+				self.setExit(self.currentRoom, self.getNewExit(direction))
 				if self.autoLinking:
 					vnums = [
-						vnum for vnum, roomObj in self.rooms.items()
-						if (
+						roomObj.vnum for roomObj in self.getRoomsFromCoordinates(
 							self.coordinatesAddDirection(
 								(self.currentRoom.x, self.currentRoom.y, self.currentRoom.z),
 								direction
-							) == (roomObj.x, roomObj.y, roomObj.z)
+							)
 						)
 					]
 					if (
@@ -831,9 +934,8 @@ class Mapper(threading.Thread, World):
 			movement
 		)
 		self.rooms[vnum] = newRoom
-		if movement not in self.currentRoom.exits:
-			self.currentRoom.exits[movement] = self.getNewExit(movement)
-		self.currentRoom.exits[movement].to = vnum
+		self.indexRoom(newRoom)
+		self.setExitDestination(self.currentRoom, movement, vnum)
 		self.clientSend("Adding room '{}' with vnum '{}'".format(newRoom.name, vnum))
 
 	def mud_event_prompt(self, data):
@@ -861,33 +963,47 @@ class Mapper(threading.Thread, World):
 		self.movement = data
 		self.scouting = False
 
-	def mud_event_line(self, data):
-		if data.startswith("You quietly scout "):
-			self.scouting = True
-			return
-		elif data == "A huge clock is standing here.":
-			self.serverSend("look at clock")
+	def addLineTriggers(self):
+		triggers = self.lineTriggers
+		triggers.add("scouting", SCOUTING_PREFIX, self.trigger_scouting, kind=PREFIX)
+		triggers.add(
+			"clock here", CLOCK_HERE_LINE, lambda line, match: self.serverSend("look at clock"), kind=EXACT
+		)
+		triggers.add("mud hole", MUD_HOLE_LINE, lambda line, match: self.sync(vnum="17189"), kind=EXACT)
+		triggers.add("loose gravel", LOOSE_GRAVEL_LINE, lambda line, match: self.sync(vnum="15324"), kind=EXACT)
+		triggers.add("movement forced", MOVEMENT_FORCED_REGEX.pattern, self.trigger_stopRun, kind=REGEX)
+		triggers.add("movement prevented", MOVEMENT_PREVENTED_REGEX.pattern, self.trigger_stopRun, kind=REGEX)
+		triggers.add("not ridable", NOT_RIDABLE_LINE, self.trigger_ridable, kind=EXACT)
+		triggers.add("ridable", RIDABLE_LINE, self.trigger_ridable, kind=EXACT)
 
-		elif data == (
-			"Wet, cold and filled with mud you drop down into a dark "
-			"and moist cave, while you notice the mud above you moving "
-			"to close the hole you left in the cave ceiling."
-		):
-			self.sync(vnum="17189")
-		elif data == (
-			"The gravel below your feet loosens, shifting slightly.. "
-			"Suddenly, you lose your balance and crash to the cave floor below."
-		):
-			self.sync(vnum="15324")
-		elif not self.timeSynchronized:
-			self.syncTime(data)
-		if MOVEMENT_FORCED_REGEX.search(data) or MOVEMENT_PREVENTED_REGEX.search(data):
-			self.stopRun()
+	def trigger_scouting(self, line, match):
+		self.scouting = True
+
+	def trigger_syncTime(self, line, match):
+		self.syncTime(line)
+
+	def trigger_stopRun(self, line, match):
+		self.stopRun()
+
+	def trigger_ridable(self, line, match):
 		if self.isSynced and self.autoMapping:
-			if data == "It's too difficult to ride here." and self.currentRoom.ridable != "notridable":
-				self.clientSend(self.rridable("notridable"))
-			elif data == "You are already riding." and self.currentRoom.ridable != "ridable":
-				self.clientSend(self.rridable("ridable"))
+			ridable = "notridable" if line == NOT_RIDABLE_LINE else "ridable"
+			if self.currentRoom.ridable != ridable:
+				self.clientSend(self.rridable(ridable))
+
+	def mud_event_line(self, data):
+		self.lineTriggers.dispatch(data)
+
+	def isLineNeeded(self, data):
+		"""
+		Determine whether a line event from MUME must be handled, given the data of the event.
+		The queue drops lines which are not needed when the mapper falls behind.
+		It is called on the mapper thread as lines are taken from the queue, so it may read the mapper's state.
+		"""
+		if any(handler != self.mud_event_line for handler in self.mudEventHandlers.get("line", ())):
+			# Other handlers might need any line.
+			return True
+		return self.lineTriggers.test(self.toEventText(data).plain)
 
 	def syncTime(self, data):
 		if self.timeEvent is None:
@@ -1000,22 +1116,22 @@ class Mapper(threading.Thread, World):
 			self.movement = None
 			if self.autoMapping and self.autoUpdateRooms:
 				if self.roomName and self.currentRoom.name != self.roomName:
-					self.currentRoom.name = self.roomName
+					self.updateRoom(self.currentRoom, name=self.roomName)
 					self.clientSend("Updating room name.")
 				if self.description and self.currentRoom.desc != self.description:
-					self.currentRoom.desc = self.description
+					self.updateRoom(self.currentRoom, desc=self.description)
 					self.clientSend("Updating room description.")
 				if self.dynamic and self.currentRoom.dynamicDesc != self.dynamic:
-					self.currentRoom.dynamicDesc = self.dynamic
+					self.updateRoom(self.currentRoom, dynamicDesc=self.dynamic)
 					self.clientSend("Updating room dynamic description.")
 
 	def mud_event_exits(self, data):
 		exits = data
 		if self.autoMapping and self.isSynced and self.moved:
 			if self.addedNewRoomFrom and REVERSE_DIRECTIONS[self.moved] in exits:
-				self.currentRoom.exits[REVERSE_DIRECTIONS[self.moved]] = self.getNewExit(
-					direction=REVERSE_DIRECTIONS[self.moved],
-					to=self.addedNewRoomFrom
+				self.setExit(
+					self.currentRoom,
+					self.getNewExit(direction=REVERSE_DIRECTIONS[self.moved], to=self.addedNewRoomFrom)
 				)
 			self.updateExitFlags(exits)
 		self.addedNewRoomFrom = None
@@ -1028,10 +1144,54 @@ class Mapper(threading.Thread, World):
 			args = data[len(userCommand):].strip()
 			getattr(self, "user_command_{}".format(decodeBytes(userCommand)))(decodeBytes(args))
 
+	@staticmethod
+	def toEventText(data):
+		"""Convert the data of an event from elsewhere than the protocol handlers, such as bytes, to EventText."""
+		if isinstance(data, EventText):
+			return data
+		elif isinstance(data, (bytes, bytearray)):
+			return EventText.fromBytes(data)
+		return EventText(data)
+
 	def handleMudEvent(self, event, data):
-		data = stripAnsi(unescapeXML(decodeBytes(data)))
+		if event == "gmcp":
+			self.handleGMCP(data)
+		elif event in self.gmcpEvents:
+			return
+		elif event in self.mudEventHandlers:
+			# Handlers receive the text without ANSI color codes.
+			self.dispatchMudEvent(event, self.toEventText(data).plain)
+		else:
+			self.dispatchMudEvent(event, data)
+
+	def handleGMCP(self, data):
+		"""
+		Decode a GMCP message from MUME, and dispatch it as a 'gmcp.package.name' event.
+		Room messages are also dispatched as the events which the XML handler would produce,
+		and those events from the XML handler are ignored from then on.
+		"""
+		package, separator, value = decodeBytes(data).partition(" ")
+		package = package.strip().lower()
+		try:
+			value = json.loads(value) if value.strip() else None
+		except ValueError:
+			logger.warning(f"Invalid JSON in GMCP message {package}: {value!r}")
+			return
+		if package == "room.info" and isinstance(value, dict):
+			for field, event in GMCP_ROOM_EVENTS:
+				if isinstance(value.get(field), str):
+					self.gmcpEvents.add(event)
+					self.dispatchMudEvent(event, value[field])
+		elif package == "event.moved" and isinstance(value, dict) and isinstance(value.get("dir"), str):
+			self.gmcpEvents.add("movement")
+			self.dispatchMudEvent("movement", value["dir"])
+		self.dispatchMudEvent("gmcp." + package, value)
+
+	def dispatchMudEvent(self, event, data):
 		if event in self.mudEventHandlers:
-			if not self.scouting or event in ("prompt", "movement"):
+			# While scouting, the events are of the room being scouted, except for prompts and movement,
+			# and channel messages, which are logged whatever the player is doing.
+			if not self.scouting or event in ("prompt", "movement") or event in CHANNEL_LOGS:
 				for handler in self.mudEventHandlers[event]:
 					handler(data)
 		elif event not in self.unknownMudEvents:
@@ -1055,20 +1215,28 @@ class Mapper(threading.Thread, World):
 		if event in self.mudEventHandlers and handler in self.mudEventHandlers[event]:
 			self.mudEventHandlers[event].remove(handler)
 
+	def handleQueueItem(self, dataType, data):
+		latencyToken = None
+		try:
+			if dataType == USER_DATA:
+				# The data was a valid mapper command, sent from the user's mud client.
+				self.handleUserData(data)
+			elif dataType == MUD_DATA:
+				# The data was from the mud server.
+				event, data = data
+				if event == "prompt":
+					latencyToken = self.latency.promptDequeued()
+				self.handleMudEvent(event, data)
+		except Exception as e:
+			self.output("map error")
+			print("error " + str(e))
+		if latencyToken is not None:
+			self.latency.promptHandled(latencyToken)
+
 	def run(self):
 		while True:
-			try:
-				dataType, data = self.queue.get()
-				if data is None:
-					break
-				elif dataType == USER_DATA:
-					# The data was a valid mapper command, sent from the user's mud client.
-					self.handleUserData(data)
-				elif dataType == MUD_DATA:
-					# The data was from the mud server.
-					event, data = data
-					self.handleMudEvent(event, data)
-			except Exception as e:
-				self.output("map error")
-				print("error " + str(e))
+			dataType, data = self.queue.get()
+			if data is None:
+				break
+			self.handleQueueItem(dataType, data)
 		self.clientSend("Exiting mapper thread.")
@@ -4,14 +4,14 @@
 
 
 # Built-in Modules:
+from functools import partial
 import logging
 
 # Local Modules:
 from .base import BaseProtocolHandler
 from .telnet import TelnetHandler
 from .mpi import MPIHandler
-from .xml import XMLHandler
-from ..utils import unescapeXML
+from .xml import createXMLHandler
 
 
 logger = logging.getLogger(__name__)
@@ -19,36 +19,84 @@ __all__ = ["ProtocolHandler"]
 
 
 class ProtocolHandler(BaseProtocolHandler):
-	def __init__(self, *args, **kwargs):
+	def __init__(self, *args, substitutions=None, **kwargs):
 		super().__init__(*args, **kwargs)
-		self._telnet = TelnetHandler(processed=self._processed, *args, **kwargs)
-		self._mpi = MPIHandler(processed=self._processed, *args, **kwargs)
-		self._xml = XMLHandler(processed=self._processed, *args, **kwargs)
+		# The substitution engine applied to lines of output, or None.
+		self._substitutions = substitutions
+		# Whether the start of the current line was sent to the client before it was complete.
+		self._inPartialLine = False
+		# Where the text is in the processed output, since only text is substituted.
+		self._textSpans = None if substitutions is None else []
+		# Clients of the jsonl output format only receive the lines of JSON from the XML handler,
+		# so the bytes which the telnet and MPI handlers pass through to the client are discarded.
+		self._discarded = bytearray() if self._outputFormat == "jsonl" else None
+		passedThrough = self._processed if self._discarded is None else self._discarded
+		self._telnet = TelnetHandler(processed=passedThrough, *args, **kwargs)
+		self._mpi = MPIHandler(processed=passedThrough, *args, **kwargs)
+		self._xml = createXMLHandler(processed=self._processed, textSpans=self._textSpans, *args, **kwargs)
 		self.handlers = [
 			self._telnet,
 			self._mpi,
 			self._xml
 		]
+		# Chain the handlers together, so that each one forwards the bytes it doesn't consume to the next.
+		self._parseChunk = None
+		for handler in reversed(self.handlers):
+			self._parseChunk = partial(handler.parseChunk, forward=self._parseChunk)
 
-	def close(self):
+	def close(self, wait=False):
 		for handler in self.handlers:
-			handler.close()
+			handler.close(wait=wait)
 
 	__del__ = close
 
 	def notify(self, value):
-		for item in value:
-			for handler in self.handlers:
-				try:
-					item = handler.parse(item)
-				except TypeError:
-					for ordinal in bytes(item):
-						item = handler.parse(ordinal)
-				if item is None:
-					break
+		self._parseChunk(value)
+		if self._discarded is not None:
+			self._discarded.clear()
+
+	def _substitute(self):
+		"""
+		Apply substitutions and gags to the complete lines of text in the processed output.
+		Telnet negotiations, tags, and Tintin markers are left as they are.
+		Output is never held back waiting for the end of a line,
+		so a line which is split between reads from MUME, or by anything other than text, is sent unmodified.
+		"""
+		result = bytearray()
+		index = 0
+		for start, end in self._textSpans:
+			result.extend(self._processed[index:start])
+			result.extend(self._substituteLines(bytes(self._processed[start:end])))
+			index = end
+		result.extend(self._processed[index:])
+		self._textSpans.clear()
+		return bytes(result)
+
+	def _substituteLines(self, dataBytes):
+		lines = dataBytes.split(b"\n")
+		partial = lines.pop()
+		result = []
+		for line in lines:
+			if self._inPartialLine:
+				self._inPartialLine = False
+				result.append(line + b"\n")
+				continue
+			text = line[:-1] if line.endswith(b"\r") else line
+			substituted = self._substitutions.substitute(text)
+			if substituted is text:
+				result.append(line + b"\n")
+			elif substituted is not None:
+				result.append(substituted + line[len(text):] + b"\n")
+		if partial:
+			self._inPartialLine = True
+			result.append(partial)
+		return b"".join(result)
 
 	def parse(self, dataBytes):
 		self.notify(dataBytes)
-		result = bytes(self._processed)
+		if self._textSpans:
+			result = self._substitute()
+		else:
+			result = bytes(self._processed)
 		self._processed.clear()
-		return result if self._outputFormat == "raw" else unescapeXML(result, True)
+		return result
@@ -8,7 +8,7 @@ import logging
 
 # Local Modules:
 from ..mapper import MUD_DATA
-from ..utils import escapeIAC, unescapeXML
+from ..utils import escapeIAC
 
 
 logger = logging.getLogger(__name__)
@@ -42,15 +42,20 @@ class BaseProtocolHandler(object):
 
 	def _sendEvent(self, event, data):
 		try:
-			self._eventSender((MUD_DATA, (event, unescapeXML(data, True))))
+			self._eventSender((MUD_DATA, (event, data)))
 		except TypeError:
 			if isinstance(self._eventSender, list):
-				self._eventSender.append((MUD_DATA, (event, unescapeXML(data, True))))
+				self._eventSender.append((MUD_DATA, (event, data)))
 			else:
 				raise
 
 	def close(self, *args, **kwargs):
 		pass
 
-	def parse(self, *args, **kwargs):
-		pass
+	def parseChunk(self, dataBytes, forward=None):
+		"""
+		Parse a chunk of bytes, passing any bytes which are not consumed by this handler to forward.
+		This default implementation consumes nothing.
+		"""
+		if forward is not None:
+			forward(dataBytes)
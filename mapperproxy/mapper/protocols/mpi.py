@@ -4,8 +4,10 @@
 
 
 # Built-in Modules:
+import hashlib
 import logging
 import os
+import re
 import subprocess
 import sys
 import tempfile
@@ -17,11 +19,30 @@ from ..utils import removeFile
 
 
 MPI_INIT = b"~$#E"
+LF_REGEX = re.compile(b"\n")
+# The maximum number of editing and viewing sessions which may be open at once.
+# Further sessions wait until one of the open sessions is finished.
+MAX_MPI_SESSIONS = 4
+# Memory backed file systems, which are used for session files in preference to the disk.
+MEMORY_DIRECTORIES = ("/dev/shm", "/run/shm")
 
 
 logger = logging.getLogger(__name__)
 
 
+def getSessionDirectory():
+	"""Return a memory backed directory for session files if one is available, or None to use the default."""
+	for directory in MEMORY_DIRECTORIES:
+		if os.path.isdir(directory) and os.access(directory, os.W_OK | os.X_OK):
+			return directory
+	return None
+
+
+def fileHash(fileName):
+	with open(fileName, "rb") as fileObj:
+		return hashlib.sha256(fileObj.read()).digest()
+
+
 class MPIHandler(BaseProtocolHandler):
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
@@ -34,7 +55,15 @@ class MPIHandler(BaseProtocolHandler):
 		}
 		self._command = None
 		self._length = None
-		self._MPIThreads = []
+		# Sessions run in daemon threads, since they may wait for the user indefinitely,
+		# and must never prevent the program from exiting.
+		self._sessionSlots = threading.BoundedSemaphore(MAX_MPI_SESSIONS)
+		self._sessions = set()  # Threads of the sessions which have not finished yet.
+		self._sessionsLock = threading.Lock()
+		self._closed = False
+		# Files which are viewed by Tintin's pager after the session is finished, and are removed on closing.
+		self._viewFiles = []
+		self._sessionDirectory = getSessionDirectory()
 		if sys.platform == "win32":
 			self.editor = "notepad"
 			self.pager = "notepad"
@@ -44,17 +73,22 @@ class MPIHandler(BaseProtocolHandler):
 
 	def _edit(self, dataBytes):
 		session, description, body = dataBytes[1:].split(b"\n", 2)
-		with tempfile.NamedTemporaryFile(prefix="mume_editing_", suffix=".txt", delete=False) as fileObj:
+		with tempfile.NamedTemporaryFile(
+			prefix="mume_editing_",
+			suffix=".txt",
+			dir=self._sessionDirectory,
+			delete=False
+		) as fileObj:
 			fileObj.write(body.replace(b"\r", b"").replace(b"\n", b"\r\n"))
-		lastModified = os.path.getmtime(fileObj.name)
+		originalHash = fileHash(fileObj.name)
 		if self._outputFormat == "tintin":
 			print(f"MPICOMMAND:{self.editor} {fileObj.name}:MPICOMMAND")
 			input("Continue:")
 		else:
 			editorProcess = subprocess.Popen([*self.editor.split(), fileObj.name])
 			editorProcess.wait()
-		if os.path.getmtime(fileObj.name) == lastModified:
-			# The user closed the text editor without saving. Cancel the editing session.
+		if fileHash(fileObj.name) == originalHash:
+			# The user closed the text editor without changing the text. Cancel the editing session.
 			response = b"C" + session
 		else:
 			with open(fileObj.name, "rb") as fileObj:
@@ -64,10 +98,17 @@ class MPIHandler(BaseProtocolHandler):
 		self._sendRemote(MPI_INIT + b"E" + str(len(response)).encode("us-ascii") + b"\n" + response)
 
 	def _view(self, dataBytes):
-		with tempfile.NamedTemporaryFile(prefix="mume_viewing_", suffix=".txt", delete=False) as fileObj:
+		with tempfile.NamedTemporaryFile(
+			prefix="mume_viewing_",
+			suffix=".txt",
+			dir=self._sessionDirectory,
+			delete=False
+		) as fileObj:
 			fileObj.write(dataBytes.replace(b"\r", b"").replace(b"\n", b"\r\n"))
 		if self._outputFormat == "tintin":
 			print(f"MPICOMMAND:{self.pager} {fileObj.name}:MPICOMMAND")
+			with self._sessionsLock:
+				self._viewFiles.append(fileObj)
 		else:
 			pagerProcess = subprocess.Popen([*self.pager.split(), fileObj.name])
 			pagerProcess.wait()
@@ -97,24 +138,84 @@ class MPIHandler(BaseProtocolHandler):
 			self._MPIBuffer.append(ordinal)
 			if len(self._MPIBuffer) == self._length:
 				# The final byte in the expected MPI data has been received.
-				thread = threading.Thread(
-					target=self._commands[self._command],
-					args=(bytes(self._MPIBuffer),),
-					daemon=True
-				)
-				self._MPIThreads.append(thread)
+				self._startSession(self._commands[self._command], bytes(self._MPIBuffer))
 				self._command = None
 				self._length = None
 				self._MPIBuffer.clear()
 				self._inMPI.clear()
-				thread.start()
 
-	def close(self):
-		for thread in self._MPIThreads:
-			thread.join()
-		self._MPIThreads.clear()
+	def _startSession(self, function, dataBytes):
+		thread = threading.Thread(target=self._runSession, args=(function, dataBytes), name="MPISession")
+		thread.daemon = True
+		with self._sessionsLock:
+			if self._closed:
+				return
+			self._sessions.add(thread)
+		thread.start()
+
+	def _runSession(self, function, dataBytes):
+		try:
+			with self._sessionSlots:
+				function(dataBytes)
+		except Exception:
+			logger.exception("MPI session failed.")
+		finally:
+			# Forget about the session as soon as it is finished.
+			with self._sessionsLock:
+				self._sessions.discard(threading.current_thread())
+
+	@property
+	def activeSessions(self):
+		with self._sessionsLock:
+			return len(self._sessions)
+
+	def close(self, wait=False):
+		"""
+		Stop accepting sessions, and remove the files which were viewed in Tintin.
+		Sessions which are still open are left to finish in the background, unless wait is True.
+		"""
+		with self._sessionsLock:
+			self._closed = True
+			sessions = list(self._sessions)
+		if wait:
+			for thread in sessions:
+				thread.join()
+		with self._sessionsLock:
+			viewFiles = self._viewFiles
+			self._viewFiles = []
+		for fileObj in viewFiles:
+			removeFile(fileObj)
+
+	def parseChunk(self, dataBytes, forward=None):
+		index = 0
+		length = len(dataBytes)
+		while index < length:
+			if self._inMPI.isSet() and self._length is not None:
+				# The remaining bytes of the MPI data can be buffered in bulk, minus the final byte.
+				end = min(length, max(index, index + self._length - len(self._MPIBuffer) - 1))
+				self._MPIBuffer.extend(dataBytes[index:end])
+				index = end
+				if index == length:
+					break
+				self._handleMPI(dataBytes[index])
+				index += 1
+			elif self._inMPI.isSet() or self._MPIBuffer or self._lfReceived.isSet():
+				# The byte might be part of an MPI init sequence or negotiation.
+				value = self._parseByte(dataBytes[index])
+				index += 1
+				if value is not None and forward is not None:
+					forward(bytes((value,)) if isinstance(value, int) else value)
+			else:
+				# An MPI init sequence can only begin after a new-line character.
+				match = LF_REGEX.search(dataBytes, index)
+				end = length if match is None else match.end()
+				if forward is not None:
+					forward(dataBytes[index:end])
+				index = end
+				if match is not None:
+					self._lfReceived.set()
 
-	def parse(self, ordinal):
+	def _parseByte(self, ordinal):
 		if self._inMPI.isSet():
 			self._handleMPI(ordinal)
 		elif self._lfReceived.isSet() and ordinal in MPI_INIT and MPI_INIT.startswith(self._MPIBuffer):
@@ -4,9 +4,12 @@
 
 
 # Built-in Modules:
+import json
 import logging
+import re
 from telnetlib import IAC, DO, DONT, WILL, WONT, SB, SE, CHARSET, GA
 import threading
+import zlib
 
 # Local Modules:
 from .base import BaseProtocolHandler
@@ -23,6 +26,19 @@ LOCAL = 1
 SB_REQUEST, SB_ACCEPTED, SB_REJECTED, SB_TTABLE_IS, SB_TTABLE_REJECTED, SB_TTABLE_ACK, SB_TTABLE_NAK = (
 	bytes([i]) for i in range(1, 8)
 )
+# Mud Client Compression Protocol, version 2.
+# After MUME sends IAC + SB + MCCP2 + IAC + SE, everything it sends is compressed with zlib,
+# until the zlib stream ends.
+MCCP2 = bytes([86])
+# Generic Mud Communication Protocol.
+# Sub-negotiations contain a package name, optionally followed by a space and a JSON value.
+GMCP = bytes([201])
+# The GMCP packages which the mapper asks MUME to send.
+GMCP_SUPPORTED_PACKAGES = ("Char 1", "Event 1", "Room 1")
+
+# Patterns for locating the bytes which begin and end negotiations within received data.
+IAC_REGEX = re.compile(re.escape(IAC))
+SE_REGEX = re.compile(re.escape(SE))
 
 
 logger = logging.getLogger(__name__)
@@ -45,8 +61,11 @@ class TelnetHandler(BaseProtocolHandler):
 			CHARSET: {
 				"separator": b";",
 				"name": self.charsets["us-ascii"]
-			}
+			},
+			MCCP2: {},
+			GMCP: {}
 		}
+		self._decompressor = None
 
 	def _sendOption(self, command, option):
 		self._sendRemote(IAC + command + option, raw=True)
@@ -84,6 +103,7 @@ class TelnetHandler(BaseProtocolHandler):
 				txDeny = WONT
 			if nvt not in self._options[option]:
 				self._options[option][nvt] = NO
+			previousState = self._options[option][nvt]
 			if command == rxAccept:
 				if self._options[option][nvt] == NO:
 					self._options[option][nvt] = YES
@@ -104,6 +124,10 @@ class TelnetHandler(BaseProtocolHandler):
 						name = self._options[CHARSET]["name"]
 						logger.debug(f"Tell MUME we would like to use the '{name.decode('us-ascii')}' charset.")
 						self.sendSubOption(CHARSET, SB_REQUEST + separator + name)
+				if option == GMCP and nvt == REMOTE and previousState != YES and self._options[option][nvt] == YES:
+					logger.debug("MUME will send GMCP messages.")
+					self.sendGMCP("Core.Hello", {"client": "MPM", "version": "1"})
+					self.sendGMCP("Core.Supports.Set", list(GMCP_SUPPORTED_PACKAGES))
 			else:
 				if self._options[option][nvt] == YES:
 					self._options[option][nvt] = NO
@@ -113,6 +137,10 @@ class TelnetHandler(BaseProtocolHandler):
 					self._sendOption(txAccept, option)
 				else:
 					self._options[option][nvt] = NO
+			if option == GMCP and nvt == REMOTE:
+				# The client is also told whether MUME sends GMCP, so that it can use the messages as well.
+				# Its own GMCP negotiation is dropped by the TelnetFilter, so that it cannot turn the messages off.
+				self._processed.extend(IAC + command + option)
 		else:
 			self._processed.extend(IAC + command + option)
 
@@ -135,6 +163,14 @@ class TelnetHandler(BaseProtocolHandler):
 						"Unknown charset negotiation response from MUME: "
 						+ repr(IAC + SB + CHARSET + self._subOptionBuffer + IAC + SE)
 					)
+			elif option == GMCP:
+				# The message is sent to the mapper as is, so that the JSON is decoded by the mapper thread.
+				self._sendEvent("gmcp", bytes(self._subOptionBuffer).replace(IAC + IAC, IAC))
+				self._processed.extend(IAC + SB + option + self._subOptionBuffer + IAC + SE)
+			elif option == MCCP2:
+				if self._decompressor is None:
+					logger.debug("MUME starts compressing its output.")
+					self._decompressor = zlib.decompressobj()
 			else:
 				self._processed.extend(IAC + SB + option + self._subOptionBuffer + IAC + SE)
 			self._subOptionBuffer.clear()
@@ -148,6 +184,12 @@ class TelnetHandler(BaseProtocolHandler):
 	def sendSubOption(self, option, dataBytes):
 		self._sendRemote(IAC + SB + option + escapeIAC(dataBytes) + IAC + SE, raw=True)
 
+	def sendGMCP(self, package, value=None):
+		message = package.encode("us-ascii")
+		if value is not None:
+			message += b" " + json.dumps(value).encode("utf-8")
+		self.sendSubOption(GMCP, message)
+
 	def isOptionEnabled(self, option, nvt, state=YES):
 		return (
 			option in self._options
@@ -193,22 +235,69 @@ class TelnetHandler(BaseProtocolHandler):
 		self._options[CHARSET]["name"] = self.charsets[name]
 		self.enableOption(CHARSET, LOCAL)
 
-	def parse(self, ordinal):
-		if self._inSubOption.isSet():
-			# The byte is part of a sub-negotiation.
-			self._handleSubOption(ordinal)
-		elif self._optionNegotiation is not None:
-			# The byte is the final byte of a 3-byte option.
-			self._handleOption(ordinal)
-		elif self._inCommand.isSet():
-			# The byte is the final byte of a 2-byte command, or the second byte of a 3-byte option.
-			self._handleCommand(ordinal)
-			if ordinal in IAC:
-				# Escaped IAC.
-				return ordinal
-		elif ordinal in IAC:
-			# The byte is the first byte of a 2-byte command / 3-byte option.
-			self._inCommand.set()
-		else:
-			# The byte is not part of a Telnet negotiation.
-			return ordinal
+	def compress(self):
+		logger.debug("Ask MUME to compress its output.")
+		self.enableOption(MCCP2, REMOTE)
+
+	def negotiateGMCP(self):
+		logger.debug("Ask MUME to send GMCP messages.")
+		self.enableOption(GMCP, REMOTE)
+
+	def _decompress(self, dataBytes):
+		decompressor = self._decompressor
+		try:
+			result = decompressor.decompress(dataBytes)
+		except zlib.error as e:
+			logger.warning(f"Unable to decompress the output from MUME: {e}")
+			self._decompressor = None
+			self.disableOption(MCCP2, REMOTE)
+			return b""
+		if decompressor.eof:
+			# MUME ended the compressed stream. Anything after it is uncompressed.
+			logger.debug("MUME stops compressing its output.")
+			self._decompressor = None
+			result += decompressor.unused_data
+		return result
+
+	def parseChunk(self, dataBytes, forward=None):
+		if self._decompressor is not None:
+			dataBytes = self._decompress(dataBytes)
+		decompressor = self._decompressor
+		index = 0
+		length = len(dataBytes)
+		while index < length:
+			if self._inSubOption.isSet():
+				# Only SE can end a sub-negotiation, so the bytes before it can be buffered in bulk.
+				match = SE_REGEX.search(dataBytes, index)
+				if match is None:
+					self._subOptionBuffer.extend(dataBytes[index:])
+					break
+				self._subOptionBuffer.extend(dataBytes[index:match.start()])
+				self._handleSubOption(SE[0])
+				index = match.end()
+				if self._decompressor is not decompressor:
+					# Compression started in the middle of the chunk, so the rest of it must be decompressed.
+					self.parseChunk(dataBytes[index:], forward)
+					break
+			elif self._optionNegotiation is not None:
+				self._handleOption(dataBytes[index])
+				index += 1
+			elif self._inCommand.isSet():
+				ordinal = dataBytes[index]
+				index += 1
+				self._handleCommand(ordinal)
+				if ordinal in IAC and forward is not None:
+					# Escaped IAC.
+					forward(IAC)
+			else:
+				match = IAC_REGEX.search(dataBytes, index)
+				if match is None:
+					# The rest of the chunk is not part of a Telnet negotiation.
+					if forward is not None:
+						forward(dataBytes[index:])
+					break
+				elif match.start() > index and forward is not None:
+					forward(dataBytes[index:match.start()])
+				# The byte is the first byte of a 2-byte command / 3-byte option.
+				self._inCommand.set()
+				index = match.end()
@@ -5,11 +5,16 @@
 
 # Built-in Modules:
 import logging
+import re
 from telnetlib import IAC, DO, DONT, WILL, WONT, SB, SE
-import threading
 
 # Local Modules:
 from .base import BaseProtocolHandler
+from .telnet import GMCP
+
+
+IAC_REGEX = re.compile(re.escape(IAC))
+SE_REGEX = re.compile(re.escape(SE))
 
 
 logger = logging.getLogger(__name__)
@@ -20,33 +25,66 @@ class TelnetFilter(BaseProtocolHandler):
 		super().__init__(*args, **kwargs)
 		self._textBuffer = bytearray()
 		self._optionNegotiationOrds = frozenset(ord(byte) for byte in (DONT, DO, WONT, WILL))
-		self._inCommand = threading.Event()
-		self._inSubOption = threading.Event()
+		# Commands for the options which the proxy negotiates with MUME itself are dropped from the client.
+		self._privateCommandOrds = self._optionNegotiationOrds | frozenset(SB)
+		self._privateOptions = (GMCP,)
+		# The state is only checked once per negotiation, rather than once per byte, so plain flags are sufficient.
+		self._inCommand = False
+		self._inSubOption = False
+		# The command being received, which is held back until it is complete.
+		self._command = bytearray()
+
+	def _handleCommand(self, ordinal):
+		self._command.append(ordinal)
+		if ordinal in SB:
+			# Sub-option begin.
+			self._inSubOption = True
+		elif ordinal not in self._optionNegotiationOrds:
+			self._inCommand = False
+			if ordinal in IAC:
+				# Escaped IAC.
+				# IAC + IAC was erroneously added to the command. Remove it.
+				del self._command[-2:]
+				self._textBuffer.append(ordinal)
+			self._endCommand()
+
+	def _endCommand(self):
+		if self._command[2:3] in self._privateOptions and self._command[1] in self._privateCommandOrds:
+			# If the client negotiated GMCP with MUME, it could turn off the messages which the mapper relies on.
+			logger.debug(f"Dropping {bytes(self._command)!r} from the client.")
+		else:
+			self._processed.extend(self._command)
+		self._command.clear()
 
 	def parse(self, dataBytes):
-		for ordinal in dataBytes:
-			if self._inCommand.isSet():
-				self._processed.append(ordinal)
-				if ordinal in SB:
-					# Sub-option begin.
-					self._inSubOption.set()
-				elif not self._inSubOption.isSet() and ordinal not in self._optionNegotiationOrds or ordinal in SE:
-					self._inCommand.clear()
-					if ordinal in SE:
-						# Sub-option end.
-						self._inSubOption.clear()
-					elif ordinal in IAC:
-						# Escaped IAC.
-						# IAC + IAC was erroneously added to the processed buffer. Remove it.
-						del self._processed[-2:]
-						self._textBuffer.append(ordinal)
-			elif ordinal in IAC:
-				# The byte is the first byte of a 2-byte command / 3-byte option.
-				self._processed.append(ordinal)
-				self._inCommand.set()
+		index = 0
+		length = len(dataBytes)
+		while index < length:
+			if self._inSubOption:
+				# Every byte up to and including SE belongs to the sub-option.
+				match = SE_REGEX.search(dataBytes, index)
+				end = length if match is None else match.end()
+				self._command.extend(dataBytes[index:end])
+				index = end
+				if match is not None:
+					self._inCommand = False
+					self._inSubOption = False
+					self._endCommand()
+			elif self._inCommand:
+				# The byte is the final byte of a 2-byte command, or the second or third byte of a 3-byte option.
+				self._handleCommand(dataBytes[index])
+				index += 1
 			else:
-				# The byte is not part of a Telnet negotiation.
-				self._textBuffer.append(ordinal)
+				match = IAC_REGEX.search(dataBytes, index)
+				if match is None:
+					# The rest of the data is not part of a Telnet negotiation.
+					self._textBuffer.extend(dataBytes[index:])
+					break
+				self._textBuffer.extend(dataBytes[index:match.start()])
+				# The byte is the first byte of a 2-byte command / 3-byte option.
+				self._command.extend(IAC)
+				self._inCommand = True
+				index = match.end()
 		if b"\n" in self._textBuffer:
 			text, self._textBuffer = self._textBuffer.rsplit(b"\n", 1)
 			text.extend(b"\n")
@@ -4,98 +4,262 @@
 
 
 # Built-in Modules:
+from functools import partial
 import logging
+import re
 from telnetlib import IAC
-import threading
 
 # Local Modules:
 from .base import BaseProtocolHandler
-from ..utils import escapeIAC
+from ..utils import EventText, TextDecoder, decodeBytes, escapeIAC, jsonLine, unescapeXML
+
+
+# Memoryview objects have no find method, so compiled patterns are used for searching instead.
+IAC_REGEX = re.compile(re.escape(IAC))
+TAG_START_REGEX = re.compile(b"<")
+TAG_END_REGEX = re.compile(b">")
+AMPERSAND_REGEX = re.compile(b"&")
+# The length of the longest escaped entity, '&amp;', without the semicolon.
+MAX_PARTIAL_ENTITY_LENGTH = 4
+MODES = {  # If a tag matches a key, the mode will be changed to its value.
+	b"room": b"room",
+	b"exits": b"exits",
+	b"prompt": b"prompt",
+	b"name": b"name",
+	b"description": b"description",
+	b"terrain": b"terrain",
+	b"/exits": None,
+	b"/prompt": None,
+	b"/room": None,
+	b"/name": b"room",
+	b"/description": b"room",
+	b"/terrain": b"room"
+}
+# Tags of communication channels, whose text is sent as an event named after the tag.
+CHANNELS = (b"tell", b"narrate", b"pray", b"say", b"emote")
+TINTIN_REPLACEMENTS = {  # Used for reformatting tags for Tintin.
+	b"prompt": b"PROMPT:",
+	b"/prompt": b":PROMPT",
+	b"name": b"NAME:",
+	b"/name": b":NAME",
+	b"tell": b"TELL:",
+	b"/tell": b":TELL",
+	b"narrate": b"NARRATE:",
+	b"/narrate": b":NARRATE",
+	b"pray": b"PRAY:",
+	b"/pray": b":PRAY",
+	b"say": b"SAY:",
+	b"/say": b":SAY",
+	b"emote": b"EMOTE:",
+	b"/emote": b":EMOTE"
+}
 
 
 logger = logging.getLogger(__name__)
 
 
 class XMLHandler(BaseProtocolHandler):
-	def __init__(self, *args, **kwargs):
+	"""
+	Handles MUME's XML, sending events to the mapper and the text to the client with the tags removed.
+	Each output format has its own subclass, chosen once by createXMLHandler,
+	so that the output format need not be checked for every byte or tag.
+	"""
+
+	outputsGratuitous = False  # Whether text inside gratuitous tags is sent to the client.
+
+	def __init__(self, *args, textSpans=None, **kwargs):
 		super().__init__(*args, **kwargs)
+		# A list of the [start, end] positions in the processed output of each run of text, or None.
+		# Runs of text which are next to each other are combined.
+		self._textSpans = textSpans
 		self._tagBuffer = bytearray()  # Used for start and end tag names.
-		self._textBuffer = bytearray()  # Used for the text between start and end tags.
-		self._lineBuffer = bytearray()  # Used for non-XML lines.
-		self._inTag = threading.Event()
-		self._inGratuitous = threading.Event()
+		self._textBuffer = []  # Used for the decoded text between start and end tags.
+		self._lineBuffer = []  # Used for decoded non-XML lines.
+		self._channelBuffer = None  # Used for the decoded text of a channel message, while inside a channel tag.
+		self._entityBuffer = bytearray()  # Used for the start of an escaped entity which was split between chunks.
+		# Text is decoded once, as it is received, for the events which are sent to the mapper.
+		self._decoder = TextDecoder()
+		self._inTag = False
+		self._inGratuitous = False
+		self._outputText = self._output
 		self._mode = None
-		self._modes = {  # If a tag matches a key, self._mode will be changed to its value.
-			b"room": b"room",
-			b"exits": b"exits",
-			b"prompt": b"prompt",
-			b"name": b"name",
-			b"description": b"description",
-			b"terrain": b"terrain",
-			b"/exits": None,
-			b"/prompt": None,
-			b"/room": None,
-			b"/name": b"room",
-			b"/description": b"room",
-			b"/terrain": b"room"
-		}
-		self._tintinReplacements = {  # Used for reformatting tags for Tintin.
-			b"prompt": b"PROMPT:",
-			b"/prompt": b":PROMPT",
-			b"name": b"NAME:",
-			b"/name": b":NAME",
-			b"tell": b"TELL:",
-			b"/tell": b":TELL",
-			b"narrate": b"NARRATE:",
-			b"/narrate": b":NARRATE",
-			b"pray": b"PRAY:",
-			b"/pray": b":PRAY",
-			b"say": b"SAY:",
-			b"/say": b":SAY",
-			b"emote": b"EMOTE:",
-			b"/emote": b":EMOTE"
+		# The action for each known tag, resolved here rather than when the tag is received.
+		self._tagActions = {
+			b"gratuitous": partial(self._setGratuitous, True),
+			b"/gratuitous": partial(self._setGratuitous, False)
 		}
+		for tag, mode in MODES.items():
+			if not tag.startswith(b"/"):
+				event = None
+			elif tag == b"/room":
+				event = "dynamic"
+			else:
+				event = tag[1:].decode("us-ascii")
+			self._tagActions[tag] = partial(self._setMode, mode, event)
+		for channel in CHANNELS:
+			self._tagActions[channel] = self._startChannel
+			self._tagActions[b"/" + channel] = partial(self._endChannel, channel.decode("us-ascii"))
 
-	def _handleTag(self, ordinal):
-		modes = self._modes
-		if ordinal in b">":
-			# End of tag reached.
-			self._inTag.clear()
-			tag = bytes(self._tagBuffer)
-			self._tagBuffer.clear()
-			text = bytes(self._textBuffer)
-			self._textBuffer.clear()
-			if self._outputFormat == "raw":
-				self._processed.extend(b"<" + escapeIAC(tag) + b">")
-			elif self._outputFormat == "tintin" and not self._inGratuitous.isSet():
-				self._processed.extend(self._tintinReplacements.get(escapeIAC(tag), b""))
-			if self._mode is None and tag.startswith(b"movement"):
-				self._sendEvent("movement", tag[13:-1])
-			elif tag == b"gratuitous":
-				self._inGratuitous.set()
-			elif tag == b"/gratuitous":
-				self._inGratuitous.clear()
-			elif tag in modes:
-				self._mode = modes[tag]
-				if tag.startswith(b"/"):
-					self._sendEvent("dynamic" if tag == b"/room" else tag[1:].decode("us-ascii"), text)
-		else:
-			self._tagBuffer.append(ordinal)
+	def _eventText(self, text):
+		return EventText(unescapeXML(text))
+
+	def _setGratuitous(self, inGratuitous):
+		self._inGratuitous = inGratuitous
+		self._outputText = self._output if self.outputsGratuitous or not inGratuitous else self._discard
+
+	def _setMode(self, mode, event):
+		self._mode = mode
+		if event is not None:
+			self._sendEvent(event, self._eventText("".join(self._textBuffer)))
+
+	def _startChannel(self):
+		self._channelBuffer = []
 
-	def parse(self, ordinal):
-		if self._inTag.isSet():
-			self._handleTag(ordinal)
-		elif ordinal in b"<":
-			self._inTag.set()
+	def _endChannel(self, channel):
+		if self._channelBuffer is not None:
+			text = "".join(self._channelBuffer).strip()
+			self._channelBuffer = None
+			self._sendEvent(channel, self._eventText(text))
+
+	def _startTag(self):
+		if self._entityBuffer:
+			# The ampersand was not the start of an escaped entity after all.
+			self._extendText(self._entityBuffer)
+			self._entityBuffer.clear()
+		self._inTag = True
+
+	def _outputTag(self, tag):
+		"""Send a tag to the client. Tags are removed from the normal output format."""
+
+	def _endTag(self):
+		self._inTag = False
+		tag = bytes(self._tagBuffer)
+		self._tagBuffer.clear()
+		self._outputTag(tag)
+		action = self._tagActions.get(tag)
+		if action is not None:
+			action()
+		elif self._mode is None and tag.startswith(b"movement"):
+			self._sendEvent("movement", self._eventText(decodeBytes(tag[13:-1])))
+		self._textBuffer.clear()
+
+	def _discard(self, dataBytes):
+		pass
+
+	def _output(self, dataBytes):
+		"""Send text to the client, unescaping XML entities."""
+		if self._entityBuffer:
+			dataBytes = self._entityBuffer + dataBytes
+			self._entityBuffer.clear()
+		if AMPERSAND_REGEX.search(dataBytes) is not None:
+			# Hold back an entity which is split between chunks, until the rest of it is received.
+			tail = bytes(dataBytes[-MAX_PARTIAL_ENTITY_LENGTH:])
+			start = tail.rfind(b"&")
+			if start >= 0 and b";" not in tail[start:]:
+				split = len(dataBytes) - len(tail) + start
+				self._entityBuffer.extend(dataBytes[split:])
+				dataBytes = dataBytes[:split]
+			dataBytes = unescapeXML(bytes(dataBytes), True)
+		self._extendText(dataBytes)
+
+	def _extendText(self, dataBytes):
+		"""Add text to the processed output, recording where it is."""
+		start = len(self._processed)
+		if IAC_REGEX.search(dataBytes) is None:
+			self._processed.extend(dataBytes)
 		else:
-			self._textBuffer.append(ordinal)
-			if self._outputFormat == "raw" or not self._inGratuitous.isSet():
-				self._processed.append(ordinal)
-				if ordinal in IAC:
-					self._processed.append(ordinal)  # Double the IAC to escape it.
-			if self._mode is None:
-				self._lineBuffer.append(ordinal)
-				if ordinal in b"\n":
-					line = bytes(self._lineBuffer.rstrip(b"\r\n"))
-					self._lineBuffer.clear()
-					self._sendEvent("line", line)
+			self._processed.extend(escapeIAC(bytes(dataBytes)))
+		if self._textSpans is None:
+			return
+		elif self._textSpans and self._textSpans[-1][1] >= start:
+			# The MPI handler may have removed a new-line character from the end of the output since.
+			self._textSpans[-1][1] = len(self._processed)
+		else:
+			self._textSpans.append([start, len(self._processed)])
+
+	def _handleText(self, dataBytes):
+		self._outputText(dataBytes)
+		text = self._decoder.decode(dataBytes)
+		if self._channelBuffer is not None:
+			self._channelBuffer.append(text)
+		if self._mode is not None:
+			# Text outside of a mode is only ever sent as line events, so it need not be buffered here.
+			self._textBuffer.append(text)
+			return
+		lineStart = 0
+		lineEnd = text.find("\n")
+		while lineEnd >= 0:
+			self._lineBuffer.append(text[lineStart:lineEnd])
+			line = "".join(self._lineBuffer).rstrip("\r\n")
+			self._lineBuffer.clear()
+			self._sendEvent("line", self._eventText(line))
+			lineStart = lineEnd + 1
+			lineEnd = text.find("\n", lineStart)
+		self._lineBuffer.append(text[lineStart:])
+
+	def parseChunk(self, dataBytes, forward=None):
+		index = 0
+		length = len(dataBytes)
+		while index < length:
+			if self._inTag:
+				match = TAG_END_REGEX.search(dataBytes, index)
+				if match is None:
+					self._tagBuffer.extend(dataBytes[index:])
+					break
+				self._tagBuffer.extend(dataBytes[index:match.start()])
+				self._endTag()
+				index = match.end()
+			else:
+				match = TAG_START_REGEX.search(dataBytes, index)
+				if match is None:
+					self._handleText(dataBytes[index:])
+					break
+				elif match.start() > index:
+					self._handleText(dataBytes[index:match.start()])
+				self._startTag()
+				index = match.end()
+
+
+class RawXMLHandler(XMLHandler):
+	"""Sends everything to the client unmodified, including tags, gratuitous text, and escaped entities."""
+
+	outputsGratuitous = True
+
+	def _outputTag(self, tag):
+		self._processed.extend(b"<" + escapeIAC(tag) + b">")
+
+	def _output(self, dataBytes):
+		self._extendText(dataBytes)
+
+
+class TintinXMLHandler(XMLHandler):
+	"""Replaces some tags with markers which Tintin can trigger on, and removes the others."""
+
+	def _outputTag(self, tag):
+		if not self._inGratuitous:
+			# Tags containing IAC are never in the table, so the tag need not be escaped first.
+			self._processed.extend(TINTIN_REPLACEMENTS.get(tag, b""))
+
+
+class JSONLXMLHandler(XMLHandler):
+	"""Sends each event to the client as a line of JSON, instead of the text."""
+
+	def _output(self, dataBytes):
+		pass
+
+	def _sendEvent(self, event, data):
+		super()._sendEvent(event, data)
+		self._processed.extend(jsonLine(event, data))
+
+
+XML_HANDLERS = {
+	"normal": XMLHandler,
+	"raw": RawXMLHandler,
+	"tintin": TintinXMLHandler,
+	"jsonl": JSONLXMLHandler
+}
+
+
+def createXMLHandler(*args, outputFormat=None, **kwargs):
+	"""Create the XML handler for an output format, or for the normal format if it is unknown."""
+	return XML_HANDLERS.get(outputFormat, XMLHandler)(*args, outputFormat=outputFormat, **kwargs)
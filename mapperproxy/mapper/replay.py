@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from queue import Empty
+from telnetlib import GA, IAC
+import time
+
+# Local Modules:
+from .capture import FROM_CLIENT, FROM_SERVER, readCapture
+from .main import MockedSocket, Proxy, Server
+from .mapper import Mapper
+
+
+class OutputSink(object):
+	"""Stands in for the client socket, optionally writing the data it receives to a file."""
+
+	def __init__(self, fileObj=None):
+		self._fileObj = fileObj
+		self.bytesReceived = 0
+
+	def sendall(self, data):
+		self.bytesReceived += len(data)
+		if self._fileObj is not None:
+			self._fileObj.write(data)
+
+
+def replay(
+		fileName,
+		outputFormat="normal",
+		promptTerminator=None,
+		findFormat="{vnum}, {name}, {attribute}",
+		realTime=False,
+		output=None
+):
+	"""
+	Push a session capture through the Server, Proxy, and Mapper, without using the network.
+	If realTime is True, the chunks are replayed with their original pacing, otherwise as fast as possible.
+	Output for the client is written to the output file object, if one is given.
+	Returns a dictionary of statistics about the replay, including the latency report from the mapper.
+	"""
+	if not promptTerminator:
+		promptTerminator = IAC + GA
+	client = OutputSink(output)
+	server = MockedSocket()
+	mapper = Mapper(
+		client=client,
+		server=server,
+		outputFormat=outputFormat,
+		interface="text",
+		promptTerminator=promptTerminator,
+		gagPrompts=False,
+		findFormat=findFormat,
+		isEmulatingOffline=False
+	)
+	proxy = Proxy(client=client, server=server, mapper=mapper, isEmulatingOffline=False)
+	serverHandler = Server(
+		client=client,
+		server=server,
+		mapper=mapper,
+		outputFormat=outputFormat,
+		interface="text",
+		promptTerminator=promptTerminator
+	)
+	# Editing and viewing sessions would block the replay waiting for the user, so ignore them.
+	serverHandler._handler._mpi._commands = {b"E": lambda dataBytes: None, b"V": lambda dataBytes: None}
+	chunks = {FROM_SERVER: 0, FROM_CLIENT: 0}
+	bytesRead = {FROM_SERVER: 0, FROM_CLIENT: 0}
+	startTime = time.monotonic()
+	for timestamp, direction, data in readCapture(fileName):
+		if realTime:
+			delay = timestamp - (time.monotonic() - startTime)
+			if delay > 0:
+				time.sleep(delay)
+		if direction == FROM_SERVER:
+			serverHandler.sendToClient(serverHandler.handleServerData(data))
+		else:
+			proxy.handleClientData(data)
+		chunks[direction] += 1
+		bytesRead[direction] += len(data)
+		# Handle the events produced by this chunk before the next one, as the mapper thread would.
+		while True:
+			try:
+				dataType, data = mapper.queue.get_nowait()
+			except Empty:
+				break
+			mapper.handleQueueItem(dataType, data)
+	serverHandler._handler.close()
+	elapsed = time.monotonic() - startTime
+	return {
+		"elapsed": elapsed,
+		"serverChunks": chunks[FROM_SERVER],
+		"serverBytes": bytesRead[FROM_SERVER],
+		"clientChunks": chunks[FROM_CLIENT],
+		"clientBytes": bytesRead[FROM_CLIENT],
+		"outputBytes": client.bytesReceived,
+		"latency": mapper.latency.report()
+	}
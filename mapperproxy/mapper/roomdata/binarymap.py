@@ -0,0 +1,248 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import itertools
+import mmap
+import os
+import struct
+
+# Local Modules:
+from .objects import Exit, Room
+
+
+MAGIC = b"MPMAP\x00"
+VERSION = 1
+# The magic bytes, version, and the number of rooms, exits, and strings.
+HEADER = struct.Struct("<6sHIII")
+ROOM_STRING_FIELDS = (
+	"vnum",
+	"name",
+	"desc",
+	"dynamicDesc",
+	"note",
+	"terrain",
+	"light",
+	"align",
+	"portable",
+	"ridable"
+)
+ROOM_FLAG_FIELDS = ("mobFlags", "loadFlags")
+ROOM_FIELDS = ROOM_STRING_FIELDS + ROOM_FLAG_FIELDS + ("x", "y", "z", "avoid")
+ROOM_FIELD_POSITIONS = {name: position for position, name in enumerate(ROOM_FIELDS)}
+# The string table indexes of the string and flag fields, the coordinates, avoid,
+# and the index of the first exit of the room, followed by the number of exits.
+ROOM_RECORD = struct.Struct("<12I3iBIB")
+EXIT_STRING_FIELDS = ("direction", "to", "door")
+EXIT_FLAG_FIELDS = ("exitFlags", "doorFlags")
+EXIT_RECORD = struct.Struct("<5I")
+# The string table is a list of the offsets at which each string ends, followed by the UTF-8 encoded strings.
+STRING_END = struct.Struct("<I")
+
+
+def isBinaryMap(filePath):
+	with open(filePath, "rb") as fileObj:
+		return fileObj.read(len(MAGIC)) == MAGIC
+
+
+def dumpBinaryRooms(rooms, filePath):
+	"""
+	Write a dictionary of room dictionaries, as stored in JSON maps, to a binary map file.
+	Identical strings, such as flags, terrains, and repeated descriptions, are only stored once.
+	"""
+	strings = {}
+
+	def getIndex(text):
+		return strings.setdefault(text, len(strings))
+
+	roomRecords = []
+	exitRecords = []
+	for vnum, roomDict in rooms.items():
+		exits = roomDict["exits"]
+		roomRecords.append(
+			ROOM_RECORD.pack(
+				getIndex(vnum),
+				*(getIndex(roomDict[key]) for key in ROOM_STRING_FIELDS[1:]),
+				*(getIndex(" ".join(sorted(roomDict[key]))) for key in ROOM_FLAG_FIELDS),
+				roomDict["x"],
+				roomDict["y"],
+				roomDict["z"],
+				bool(roomDict.get("avoid")),
+				len(exitRecords),
+				len(exits)
+			)
+		)
+		for direction, exitDict in exits.items():
+			exitRecords.append(
+				EXIT_RECORD.pack(
+					getIndex(direction),
+					getIndex(exitDict["to"]),
+					getIndex(exitDict["door"]),
+					*(getIndex(" ".join(sorted(exitDict[key]))) for key in EXIT_FLAG_FIELDS)
+				)
+			)
+	encoded = [text.encode("utf-8") for text in strings]
+	tempPath = filePath + ".tmp"
+	with open(tempPath, "wb") as fileObj:
+		fileObj.write(HEADER.pack(MAGIC, VERSION, len(roomRecords), len(exitRecords), len(encoded)))
+		fileObj.write(b"".join(roomRecords))
+		fileObj.write(b"".join(exitRecords))
+		fileObj.write(b"".join(STRING_END.pack(end) for end in itertools.accumulate(map(len, encoded))))
+		fileObj.write(b"".join(encoded))
+	# The map is replaced at once, so that an interrupted write never leaves it truncated.
+	os.replace(tempPath, filePath)
+
+
+class BinaryMap(object):
+	"""
+	A binary map file, mapped into memory.
+	Rooms are created without reading their attributes, which are decoded the first time they are used,
+	and each string is decoded once, and shared by all the rooms using it.
+	"""
+
+	def __init__(self, filePath):
+		with open(filePath, "rb") as fileObj:
+			self._mmap = mmap.mmap(fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, version, self.roomCount, self.exitCount, stringCount = HEADER.unpack_from(self._mmap)
+		except struct.error:
+			magic = version = None
+		if magic != MAGIC or version != VERSION:
+			self.close()
+			raise ValueError("Not a binary map of version {}: {}".format(VERSION, filePath))
+		self._exitsOffset = HEADER.size + self.roomCount * ROOM_RECORD.size
+		self._stringEndsOffset = self._exitsOffset + self.exitCount * EXIT_RECORD.size
+		self._stringsOffset = self._stringEndsOffset + stringCount * STRING_END.size
+		if self._stringsOffset > len(self._mmap):
+			self.close()
+			raise ValueError("Truncated binary map: {}".format(filePath))
+		self._strings = [None] * stringCount
+
+	def close(self):
+		"""Unmap the file. Attributes of rooms which have not been decoded can no longer be used."""
+		self._mmap.close()
+		self._strings = []
+
+	@property
+	def closed(self):
+		return self._mmap.closed
+
+	def getString(self, index):
+		text = self._strings[index]
+		if text is None:
+			end = STRING_END.unpack_from(self._mmap, self._stringEndsOffset + index * STRING_END.size)[0]
+			if index:
+				start = STRING_END.unpack_from(self._mmap, self._stringEndsOffset + (index - 1) * STRING_END.size)[0]
+			else:
+				start = 0
+			text = self._mmap[self._stringsOffset + start:self._stringsOffset + end].decode("utf-8")
+			self._strings[index] = text
+		return text
+
+	def _getRoomRecord(self, index):
+		return ROOM_RECORD.unpack_from(self._mmap, HEADER.size + index * ROOM_RECORD.size)
+
+	def getRoomAttribute(self, index, name):
+		"""Decode an attribute of the room at index. Raises KeyError if the room has no such attribute."""
+		position = ROOM_FIELD_POSITIONS[name] if name != "exits" else None
+		record = self._getRoomRecord(index)
+		if name == "exits":
+			return self._getExits(self.getString(record[0]), *record[-2:])
+		if name in ROOM_STRING_FIELDS:
+			return self.getString(record[position])
+		elif name in ROOM_FLAG_FIELDS:
+			return set(self.getString(record[position]).split())
+		elif name == "avoid":
+			return bool(record[position])
+		return record[position]
+
+	def _getExits(self, vnum, first, count):
+		exits = {}
+		for index in range(first, first + count):
+			direction, to, door, exitFlags, doorFlags = EXIT_RECORD.unpack_from(
+				self._mmap, self._exitsOffset + index * EXIT_RECORD.size
+			)
+			exitObj = Exit()
+			exitObj.direction = self.getString(direction)
+			exitObj.vnum = vnum
+			exitObj.to = self.getString(to)
+			exitObj.door = self.getString(door)
+			exitObj.exitFlags = set(self.getString(exitFlags).split())
+			exitObj.doorFlags = set(self.getString(doorFlags).split())
+			exits[exitObj.direction] = exitObj
+		return exits
+
+	def getExitDestinations(self, roomObj):
+		"""Return a list of the direction and destination of each exit of a mapped room, without decoding them."""
+		first, count = self._getRoomRecord(roomObj._index)[-2:]
+		destinations = []
+		for index in range(first, first + count):
+			direction, to = EXIT_RECORD.unpack_from(self._mmap, self._exitsOffset + index * EXIT_RECORD.size)[:2]
+			destinations.append((self.getString(direction), self.getString(to)))
+		return destinations
+
+	def getRooms(self):
+		"""
+		A generator which yields a MappedRoom for each room in the map.
+		The vnum, name, description, and coordinates, which are needed to index rooms, are decoded at once.
+		"""
+		for index in range(self.roomCount):
+			record = self._getRoomRecord(index)
+			roomObj = MappedRoom(self, index, self.getString(record[0]))
+			roomObj.name = self.getString(record[1])
+			roomObj.desc = self.getString(record[2])
+			roomObj.x, roomObj.y, roomObj.z = record[12:15]
+			yield roomObj
+
+	def getRoomDicts(self):
+		"""A generator which yields the vnum and dictionary of each room, as stored in JSON maps."""
+		for roomObj in self.getRooms():
+			roomDict = {key: getattr(roomObj, key) for key in ROOM_FIELDS if key != "vnum"}
+			for key in ROOM_FLAG_FIELDS:
+				roomDict[key] = sorted(roomDict[key])
+			roomDict["exits"] = {
+				direction: {
+					"to": exitObj.to,
+					"door": exitObj.door,
+					"exitFlags": sorted(exitObj.exitFlags),
+					"doorFlags": sorted(exitObj.doorFlags)
+				} for direction, exitObj in roomObj.exits.items()
+			}
+			yield roomObj.vnum, roomDict
+
+
+class MappedRoom(Room):
+	"""
+	A room whose attributes are decoded from a binary map the first time they are used.
+	Attributes which are assigned are kept like those of any other room.
+	"""
+
+	def __init__(self, binaryMap, index, vnum):
+		# Room.__init__ is not called, since the attributes it sets are decoded on demand.
+		self._binaryMap = binaryMap
+		self._index = index
+		self.vnum = vnum
+
+	def __getattr__(self, name):
+		# Only called for attributes which have not been decoded or assigned yet.
+		if name.startswith("_"):
+			raise AttributeError(name)
+		elif name == "cost":
+			self.calculateCost()
+			return self.cost
+		elif self._binaryMap.closed:
+			# Only the attributes which were decoded before the map was closed remain.
+			raise AttributeError(name)
+		try:
+			value = self._binaryMap.getRoomAttribute(self._index, name)
+		except KeyError:
+			raise AttributeError(name) from None
+		setattr(self, name, value)
+		return value
+
+	def attributes(self):
+		for name in ROOM_FIELDS + ("cost", "exits"):
+			getattr(self, name)
+		return {name: value for name, value in vars(self).items() if not name.startswith("_")}
@@ -12,6 +12,7 @@ try:
 except ImportError:
 	rapidjson = None
 
+from .binarymap import BinaryMap, dumpBinaryRooms, isBinaryMap
 from ..utils import getDirectoryPath
 
 
@@ -25,6 +26,38 @@ SAMPLE_MAP_FILE = "arda.json.sample"
 MAP_DIRECTORY = getDirectoryPath("maps")
 MAP_FILE_PATH = os.path.join(MAP_DIRECTORY, MAP_FILE)
 SAMPLE_MAP_FILE_PATH = os.path.join(MAP_DIRECTORY, SAMPLE_MAP_FILE)
+BINARY_MAP_FILE = "arda.bin"
+BINARY_MAP_FILE_PATH = os.path.join(MAP_DIRECTORY, BINARY_MAP_FILE)
+# Values from older maps, and the values which replace them.
+TERRAIN_REPLACEMENTS = {
+	"random": "undefined",
+	"death": "deathtrap",
+	"shallowwater": "shallow"
+}
+MOB_FLAG_REPLACEMENTS = {
+	"any": "passive_mob",
+	"smob": "aggressive_mob",
+	"quest": "quest_mob",
+	"scoutguild": "scout_guild",
+	"mageguild": "mage_guild",
+	"clericguild": "cleric_guild",
+	"warriorguild": "warrior_guild",
+	"rangerguild": "ranger_guild",
+	"armourshop": "armour_shop",
+	"foodshop": "food_shop",
+	"petshop": "pet_shop",
+	"weaponshop": "weapon_shop"
+}
+LOAD_FLAG_REPLACEMENTS = {
+	"packhorse": "pack_horse",
+	"trainedhorse": "trained_horse"
+}
+DOOR_FLAG_REPLACEMENTS = {
+	"noblock": "no_block",
+	"nobreak": "no_break",
+	"nopick": "no_pick",
+	"needkey": "need_key"
+}
 
 
 def _load(filePath):
@@ -70,8 +103,31 @@ def dumpLabels(labels):
 		json.dump(labels, fileObj, sort_keys=True, indent=2, separators=(",", ": "))
 
 
+def _loadBinary(filePath):
+	try:
+		return None, BinaryMap(filePath)
+	except EnvironmentError as e:
+		return "{}: '{}'".format(e.strerror, e.filename), None
+	except ValueError:
+		return "Corrupted database file: {}".format(filePath), None
+
+
 def loadRooms():
+	"""
+	Load the map, returning an error message or None, and the rooms or None.
+	The rooms are a BinaryMap if the binary map exists and is not older than the JSON map,
+	or a dictionary of room dictionaries otherwise.
+	"""
 	errorMessages = []
+	if os.path.isfile(BINARY_MAP_FILE_PATH) and (
+		not os.path.exists(MAP_FILE_PATH)
+		or os.path.getmtime(BINARY_MAP_FILE_PATH) >= os.path.getmtime(MAP_FILE_PATH)
+	):
+		errors, result = _loadBinary(BINARY_MAP_FILE_PATH)
+		if result is None:
+			errorMessages.append(errors)
+		else:
+			return None, result
 	errors, result = _load(MAP_FILE_PATH)
 	if result is None:
 		errorMessages.append(errors)
@@ -88,9 +144,54 @@ def loadRooms():
 		return None, result
 
 
-def dumpRooms(rooms):
-	with codecs.open(MAP_FILE_PATH, "wb", encoding="utf-8") as fileObj:
+def _dumpJSON(rooms, filePath):
+	with codecs.open(filePath, "wb", encoding="utf-8") as fileObj:
 		if rapidjson is not None:
 			rapidjson.dump(rooms, fileObj, sort_keys=True, indent=2, chunk_size=2**16)
 		else:
 			fileObj.write(json.dumps(rooms, sort_keys=True, indent=2))
+
+
+def dumpRooms(rooms, binary=False):
+	if binary:
+		dumpBinaryRooms(rooms, BINARY_MAP_FILE_PATH)
+	else:
+		_dumpJSON(rooms, MAP_FILE_PATH)
+
+
+def normalizeRoom(roomDict):
+	"""Replace the values of older maps in a room dictionary."""
+	roomDict["terrain"] = TERRAIN_REPLACEMENTS.get(roomDict["terrain"], roomDict["terrain"])
+	roomDict["mobFlags"] = sorted({MOB_FLAG_REPLACEMENTS.get(flag, flag) for flag in roomDict["mobFlags"]})
+	roomDict["loadFlags"] = sorted({LOAD_FLAG_REPLACEMENTS.get(flag, flag) for flag in roomDict["loadFlags"]})
+	roomDict.setdefault("avoid", False)
+	for exitDict in roomDict["exits"].values():
+		exitDict["doorFlags"] = sorted({DOOR_FLAG_REPLACEMENTS.get(flag, flag) for flag in exitDict["doorFlags"]})
+
+
+def convertMap(sourcePath=MAP_FILE_PATH, destinationPath=None):
+	"""
+	Convert a JSON map to a binary map, or a binary map to a JSON map, returning an error message or None.
+	The destination defaults to the binary or JSON map in the maps directory.
+	"""
+	try:
+		isBinary = isBinaryMap(sourcePath)
+	except EnvironmentError as e:
+		return "{}: '{}'".format(e.strerror, e.filename)
+	if isBinary:
+		errors, binaryMap = _loadBinary(sourcePath)
+		if binaryMap is None:
+			return errors
+		try:
+			rooms = dict(binaryMap.getRoomDicts())
+		finally:
+			binaryMap.close()
+		_dumpJSON(rooms, destinationPath or MAP_FILE_PATH)
+	else:
+		errors, rooms = _load(sourcePath)
+		if rooms is None:
+			return errors
+		for roomDict in rooms.values():
+			normalizeRoom(roomDict)
+		dumpBinaryRooms(rooms, destinationPath or BINARY_MAP_FILE_PATH)
+	return None
@@ -144,6 +144,10 @@ class Room(object):
 		# and the order of rooms with the same movement cost is irrelevant.
 		return False
 
+	def attributes(self):
+		"""Return a dictionary of the attributes of the room, such as for formatting the output of find commands."""
+		return vars(self)
+
 	def calculateCost(self):
 		try:
 			self.cost = TERRAIN_COSTS[self.terrain]
@@ -0,0 +1,225 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import codecs
+import json
+import os.path
+import re
+
+# Local Modules:
+from .triggers import BACK_REFERENCE_REGEX, EXACT, NAMED_GROUP_REGEX, REGEX
+from .utils import getDirectoryPath
+
+
+SUBSTRING = "substring"  # The pattern is found anywhere in the line.
+KINDS = (EXACT, SUBSTRING, REGEX)
+SUBSTITUTIONS_FILE_PATH = os.path.join(getDirectoryPath("data"), "substitutions.json")
+# Tintin style place holders in replacements, where %0 is the matched text and %1 to %9 are groups.
+PLACE_HOLDER_REGEX = re.compile(rb"%(\d)")
+ANSI_REGEX = re.compile(rb"\x1b\[[\d;]*m")
+
+
+def stripColors(line):
+	"""
+	Return the line without ANSI color codes,
+	and a list of the position in the line of each byte of the result, followed by the length of the line.
+	"""
+	plain = []
+	positions = []
+	index = 0
+	for match in ANSI_REGEX.finditer(line):
+		plain.append(line[index:match.start()])
+		positions.extend(range(index, match.start()))
+		index = match.end()
+	plain.append(line[index:])
+	positions.extend(range(index, len(line) + 1))
+	return b"".join(plain), positions
+
+
+class Rule(object):
+	def __init__(self, kind, pattern, replacement=None):
+		if kind not in KINDS:
+			raise ValueError(f"Unknown substitution kind: {kind!r}")
+		self.kind = kind
+		self.pattern = pattern.encode("utf-8")
+		if kind == REGEX:
+			self.regex = re.compile(self.pattern)
+		else:
+			self.regex = re.compile(re.escape(self.pattern))
+		if replacement is None:
+			self.template = None  # The line is gagged.
+		else:
+			template = replacement.encode("utf-8").replace(b"\\", b"\\\\")
+			for match in PLACE_HOLDER_REGEX.finditer(template):
+				if int(match.group(1)) > self.regex.groups:
+					raise ValueError(
+						f"Place holder %{match.group(1).decode('us-ascii')} in replacement {replacement!r} "
+						+ f"has no matching group in pattern {pattern!r}"
+					)
+			self.template = PLACE_HOLDER_REGEX.sub(rb"\\g<\1>", template)
+
+	def apply(self, line):
+		"""
+		Apply the rule to a line.
+		The rule is matched against the line without colors,
+		but the color codes outside of the matched text are kept.
+		"""
+		if b"\x1b" not in line:
+			if self.kind == EXACT and line != self.pattern:
+				return line
+			return self.regex.sub(self.template, line)
+		plain, positions = stripColors(line)
+		if self.kind == EXACT and plain != self.pattern:
+			return line
+		result = []
+		index = 0
+		for match in self.regex.finditer(plain):
+			start = positions[match.start()]
+			# The end is taken after the last matched byte, so that a color code which follows it is kept.
+			end = positions[match.end() - 1] + 1 if match.end() > match.start() else start
+			result.append(line[index:start])
+			result.append(match.expand(self.template))
+			# The color codes inside of the matched text still apply to the text after it.
+			result.extend(ANSI_REGEX.findall(line, start, end))
+			index = end
+		result.append(line[index:])
+		return b"".join(result)
+
+
+class SubstitutionEngine(object):
+	"""
+	Substitutes and gags lines of text from MUME before they are sent to the client.
+	Exact rules are looked up in a dictionary keyed by the line.
+	Substrings are combined into one alternation of literals, which the regular expression engine
+	matches in a single pass over the line, and the matched text is looked up in a dictionary.
+	Regex rules are combined into a second alternation, with a named group identifying each rule.
+	Where matches of several substrings, or of several regex rules, overlap, only the first of them is found.
+	"""
+
+	def __init__(self):
+		self._rules = []
+		self._compiled = None
+		self.substituted = 0
+		self.gagged = 0
+
+	def add(self, kind, pattern, replacement=None):
+		"""Add a rule. If replacement is None, lines matching the rule are gagged."""
+		self._rules.append(Rule(kind, pattern, replacement))
+		self._compiled = None
+
+	def load(self, data):
+		"""Add the rules in a dictionary with 'gags' and 'substitutions' lists, such as from a JSON file."""
+		for item in data.get("gags", []):
+			for kind in KINDS:
+				if kind in item:
+					self.add(kind, item[kind])
+					break
+			else:
+				raise ValueError(f"Gag without a pattern: {item!r}")
+		for item in data.get("substitutions", []):
+			for kind in KINDS:
+				if kind in item:
+					self.add(kind, item[kind], item["replacement"])
+					break
+			else:
+				raise ValueError(f"Substitution without a pattern: {item!r}")
+
+	def __len__(self):
+		return len(self._rules)
+
+	def _compile(self):
+		exact = {}
+		substrings = {}
+		parts = []
+		combinedRules = []
+		separateRules = []
+		for order, rule in enumerate(self._rules):
+			if rule.kind == EXACT:
+				exact.setdefault(rule.pattern, []).append((order, rule))
+				continue
+			elif rule.kind == SUBSTRING:
+				substrings.setdefault(rule.pattern, []).append((order, rule))
+				continue
+			elif BACK_REFERENCE_REGEX.search(rule.pattern.decode("utf-8")) is not None:
+				separateRules.append((order, rule))
+				continue
+			pattern = NAMED_GROUP_REGEX.sub("(?:", rule.pattern.decode("utf-8")).encode("utf-8")
+			part = b"(?P<_%d>%s)" % (len(combinedRules), pattern)
+			try:
+				re.compile(part)
+			except re.error:
+				separateRules.append((order, rule))
+			else:
+				parts.append(part)
+				combinedRules.append((order, rule))
+		if substrings:
+			# Substrings are kept apart from regex rules, since named groups prevent the regular expression engine
+			# from optimizing alternations of literals.
+			# Longer substrings are tried first, so that they take precedence over substrings of themselves.
+			substringRegex = re.compile(
+				b"|".join(re.escape(pattern) for pattern in sorted(substrings, key=len, reverse=True))
+			)
+		else:
+			substringRegex = None
+		combined = re.compile(b"|".join(parts)) if parts else None
+		self._compiled = (
+			exact, substrings, substringRegex, combined, tuple(combinedRules), tuple(separateRules)
+		)
+		return self._compiled
+
+	def _hits(self, line):
+		exact, substrings, substringRegex, combined, combinedRules, separateRules = (
+			self._compiled or self._compile()
+		)
+		hits = list(exact.get(line, ()))
+		if substringRegex is not None:
+			for match in substringRegex.finditer(line):
+				hits.extend(substrings[match.group()])
+		if combined is not None:
+			for match in combined.finditer(line):
+				hits.append(combinedRules[int(match.lastgroup[1:])])
+		for order, rule in separateRules:
+			if rule.regex.search(line) is not None:
+				hits.append((order, rule))
+		# A rule may match more than once, but is only applied once.
+		return [rule for order, rule in sorted(set(hits), key=lambda hit: hit[0])]
+
+	def substitute(self, line):
+		"""
+		Return the line with the matching substitutions applied, or None if it is gagged.
+		Rules are matched against the line without colors, but the colors are kept in the result.
+		"""
+		if b"\x1b" in line:
+			# Colors would prevent patterns from matching.
+			plain = ANSI_REGEX.sub(b"", line)
+		else:
+			plain = line
+		hits = self._hits(plain)
+		if not hits:
+			return line
+		for rule in hits:
+			if rule.template is None:
+				self.gagged += 1
+				return None
+		for rule in hits:
+			line = rule.apply(line)
+		self.substituted += 1
+		return line
+
+
+def loadSubstitutions(filePath=SUBSTITUTIONS_FILE_PATH):
+	"""Load the rules in a JSON file, returning an error message or None, and the engine or None."""
+	if not os.path.exists(filePath):
+		return None, None
+	try:
+		with codecs.open(filePath, "rb", encoding="utf-8") as fileObj:
+			engine = SubstitutionEngine()
+			engine.load(json.load(fileObj))
+	except IOError as e:
+		return "{}: '{}'".format(e.strerror, e.filename), None
+	except (KeyError, ValueError, re.error) as e:
+		return "Invalid substitutions file {}: {}".format(filePath, e), None
+	return None, engine if len(engine) else None
@@ -0,0 +1,161 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import re
+from timeit import default_timer
+
+
+# The kinds of trigger.
+EXACT = "exact"  # The line is equal to the pattern.
+PREFIX = "prefix"  # The line starts with the pattern.
+REGEX = "regex"  # The pattern is a regular expression which is searched for in the line.
+KINDS = (EXACT, PREFIX, REGEX)
+# Named groups are made non-capturing when a pattern is combined with others, so that names do not collide.
+NAMED_GROUP_REGEX = re.compile(r"(?<!\\)\(\?P<\w+>")
+# Patterns with back references depend on their own group numbering, so they are never combined.
+BACK_REFERENCE_REGEX = re.compile(r"\(\?P=|\\[1-9]")
+
+
+class Trigger(object):
+	def __init__(self, name, pattern, callback, kind):
+		self.name = name
+		self.pattern = pattern
+		self.callback = callback
+		self.kind = kind
+		self.regex = re.compile(pattern) if kind == REGEX else None
+		self.hits = 0
+		self.cost = 0.0  # The total time in seconds spent in the callback.
+
+
+class TriggerEngine(object):
+	"""
+	Matches lines against many triggers at once, and calls the callback of every trigger which matches.
+	Exact and prefix triggers are looked up in dictionaries keyed by the line, or by its prefix of each length.
+	Regex triggers are combined into one expression with a look ahead for each trigger,
+	so that a single match finds every regex trigger which matches.
+	Callbacks are called in the order the triggers were added, with the line,
+	and the match object for regex triggers or None for the others.
+	"""
+
+	def __init__(self):
+		self._triggers = {}
+		# The lookup tables built from the triggers, or None if they must be rebuilt.
+		self._compiled = None
+		self.lines = 0
+		self.matchCost = 0.0  # The total time in seconds spent matching lines.
+
+	def add(self, name, pattern, callback, kind=REGEX):
+		if kind not in KINDS:
+			raise ValueError(f"Unknown trigger kind: {kind!r}")
+		elif name in self._triggers:
+			raise ValueError(f"A trigger named {name!r} already exists.")
+		self._triggers[name] = Trigger(name, pattern, callback, kind)
+		self._compiled = None
+
+	def remove(self, name):
+		if self._triggers.pop(name, None) is not None:
+			self._compiled = None
+
+	def __contains__(self, name):
+		return name in self._triggers
+
+	def __getitem__(self, name):
+		return self._triggers[name]
+
+	def __len__(self):
+		return len(self._triggers)
+
+	def _compile(self):
+		exact = {}
+		prefixes = {}
+		combinedTriggers = []
+		separateTriggers = []
+		parts = []
+		for order, trigger in enumerate(list(self._triggers.values())):
+			if trigger.kind == EXACT:
+				exact.setdefault(trigger.pattern, []).append((order, trigger))
+			elif trigger.kind == PREFIX:
+				prefixes.setdefault(len(trigger.pattern), {}).setdefault(trigger.pattern, []).append((order, trigger))
+			elif BACK_REFERENCE_REGEX.search(trigger.pattern) is not None:
+				separateTriggers.append((order, trigger))
+			else:
+				part = "(?:(?=.*?(?P<_{}>{})))?".format(
+					len(combinedTriggers), NAMED_GROUP_REGEX.sub("(?:", trigger.pattern)
+				)
+				try:
+					re.compile(part)
+				except re.error:
+					# For example, patterns with inline flags.
+					separateTriggers.append((order, trigger))
+				else:
+					parts.append(part)
+					combinedTriggers.append((order, trigger))
+		combined = re.compile("".join(parts)) if parts else None
+		combinedTriggers = tuple(
+			(combined.groupindex[f"_{index}"], order, trigger)
+			for index, (order, trigger) in enumerate(combinedTriggers)
+		)
+		self._compiled = (exact, prefixes, combined, combinedTriggers, tuple(separateTriggers))
+		return self._compiled
+
+	def _hits(self, line):
+		exact, prefixes, combined, combinedTriggers, separateTriggers = self._compiled or self._compile()
+		hits = []
+		if line in exact:
+			hits.extend(exact[line])
+		for length, triggers in prefixes.items():
+			if line[:length] in triggers:
+				hits.extend(triggers[line[:length]])
+		if combined is not None:
+			match = combined.match(line)
+			for group, order, trigger in combinedTriggers:
+				if match.start(group) >= 0:
+					hits.append((order, trigger))
+		for order, trigger in separateTriggers:
+			if trigger.regex.search(line) is not None:
+				hits.append((order, trigger))
+		hits.sort(key=lambda hit: hit[0])
+		return [trigger for order, trigger in hits]
+
+	def test(self, line):
+		"""Determine whether any trigger matches the line, without calling any callbacks."""
+		return bool(self._hits(line))
+
+	def dispatch(self, line):
+		"""Call the callback of every trigger which matches the line, returning the number of matches."""
+		startTime = default_timer()
+		hits = self._hits(line)
+		self.lines += 1
+		self.matchCost += default_timer() - startTime
+		for trigger in hits:
+			startTime = default_timer()
+			trigger.hits += 1
+			try:
+				# Regex triggers are matched again on their own, to get the groups for the callback.
+				trigger.callback(line, trigger.regex.search(line) if trigger.regex is not None else None)
+			finally:
+				trigger.cost += default_timer() - startTime
+		return len(hits)
+
+	def reset(self):
+		self.lines = 0
+		self.matchCost = 0.0
+		for trigger in self._triggers.values():
+			trigger.hits = 0
+			trigger.cost = 0.0
+
+	def report(self):
+		lines = [f"{'Trigger':<24}{'Kind':<8}{'Hits':>8}{'Cost ms':>12}{'Per hit us':>12}"]
+		for trigger in self._triggers.values():
+			perHit = trigger.cost / trigger.hits * 1000000 if trigger.hits else 0.0
+			lines.append(
+				f"{trigger.name:<24}{trigger.kind:<8}{trigger.hits:>8}{trigger.cost * 1000:>12.3f}{perHit:>12.1f}"
+			)
+		perLine = self.matchCost / self.lines * 1000000 if self.lines else 0.0
+		lines.append(
+			f"Matched {self.lines} lines in {self.matchCost * 1000:.3f} ms ({perLine:.1f} us per line)."
+		)
+		return "\n".join(lines)
@@ -0,0 +1,56 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+def getTrigrams(text):
+	return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex(object):
+	"""
+	An inverted index from the trigrams of texts to the keys of the texts containing them.
+	The keys of the texts which may contain a substring are found by intersecting the keys of its trigrams,
+	starting with the rarest, so that only those candidates need to be checked against the substring.
+	Texts are indexed in lower case.
+	"""
+
+	def __init__(self):
+		self._postings = {}
+		self._trigrams = {}  # The trigrams indexed for each key, for removing it.
+
+	def __len__(self):
+		return len(self._trigrams)
+
+	def add(self, key, *texts):
+		"""Index one or more texts under a key, replacing the texts already indexed under it."""
+		self.remove(key)
+		trigrams = set()
+		for text in texts:
+			trigrams.update(getTrigrams(text.lower()))
+		self._trigrams[key] = trigrams
+		for trigram in trigrams:
+			self._postings.setdefault(trigram, set()).add(key)
+
+	def remove(self, key):
+		for trigram in self._trigrams.pop(key, ()):
+			keys = self._postings[trigram]
+			keys.discard(key)
+			if not keys:
+				del self._postings[trigram]
+
+	def candidates(self, text):
+		"""
+		Return a set of the keys whose texts may contain text, ignoring case,
+		or None if text is too short to have trigrams, in which case any key may match.
+		"""
+		trigrams = getTrigrams(text.lower())
+		if not trigrams:
+			return None
+		postings = sorted((self._postings.get(trigram, frozenset()) for trigram in trigrams), key=len)
+		result = set(postings[0])
+		for keys in postings[1:]:
+			if not result:
+				break
+			result &= keys
+		return result
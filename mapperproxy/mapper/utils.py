@@ -3,6 +3,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import codecs
+import json
 import math
 import os
 import re
@@ -22,12 +24,13 @@ ESCAPE_XML_STR_ENTITIES = (
 	("<", "&lt;"),
 	(">", "&gt;")
 )
-UNESCAPE_XML_STR_ENTITIES = tuple((second, first) for first, second in ESCAPE_XML_STR_ENTITIES)
+# Ampersands are unescaped last, so that escaped entities such as '&amp;lt;' are only unescaped once.
+UNESCAPE_XML_STR_ENTITIES = tuple((second, first) for first, second in reversed(ESCAPE_XML_STR_ENTITIES))
 ESCAPE_XML_BYTES_ENTITIES = tuple(
 	(first.encode("us-ascii"), second.encode("us-ascii"))
 	for first, second in ESCAPE_XML_STR_ENTITIES
 )
-UNESCAPE_XML_BYTES_ENTITIES = tuple((second, first) for first, second in ESCAPE_XML_BYTES_ENTITIES)
+UNESCAPE_XML_BYTES_ENTITIES = tuple((second, first) for first, second in reversed(ESCAPE_XML_BYTES_ENTITIES))
 
 
 def formatDocString(functionOrString, width=79, prefix=""):
@@ -166,6 +169,11 @@ def unescapeXML(data, isbytes=False):
 	return multiReplace(data, UNESCAPE_XML_BYTES_ENTITIES if isbytes else UNESCAPE_XML_STR_ENTITIES)
 
 
+def jsonLine(event, data):
+	"""Encode an event as a line of JSON, for clients using the jsonl output format."""
+	return json.dumps({"event": event, "data": data}).encode("us-ascii") + b"\r\n"
+
+
 def decodeBytes(data):
 	try:
 		return data.decode("utf-8")
@@ -175,6 +183,46 @@ def decodeBytes(data):
 		return ""
 
 
+class TextDecoder(object):
+	"""
+	Decodes bytes which arrive in chunks, where a multi-byte character may be split between chunks.
+	Like decodeBytes, UTF-8 is tried first, and Latin-1 is used for data which is not valid UTF-8.
+	"""
+
+	def __init__(self):
+		self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+	def decode(self, data, final=False):
+		try:
+			return self._decoder.decode(data, final)
+		except UnicodeDecodeError:
+			pending, flags = self._decoder.getstate()
+			self._decoder.reset()
+			return (pending + bytes(data)).decode("latin-1")
+
+	def reset(self):
+		self._decoder.reset()
+
+
+class EventText(str):
+	"""
+	The text of a mud event, decoded and with XML entities unescaped, as it would be displayed.
+	The text without ANSI color codes is only computed when it is first needed.
+	"""
+
+	@classmethod
+	def fromBytes(cls, data):
+		return cls(unescapeXML(decodeBytes(data)))
+
+	@property
+	def plain(self):
+		try:
+			return self._plain
+		except AttributeError:
+			self._plain = stripAnsi(self) if "\x1b" in self else str(self)
+			return self._plain
+
+
 def page(lines):
 	"""Output word wrapped lines using the 'more' shell command if necessary."""
 	lines = "\n".join(lines).splitlines()
@@ -7,15 +7,12 @@ import gc
 import heapq
 import itertools
 import operator
-try:
-	from Queue import Queue
-except ImportError:
-	from queue import Queue
 import re
-import threading
 from fuzzywuzzy import fuzz
 
 from . import roomdata
+from .guiupdates import GUIUpdateChannel
+from .trigrams import TrigramIndex
 from .utils import regexFuzzy
 
 
@@ -28,6 +25,8 @@ DIRECTION_COORDINATES = {
 	"up": (0, 0, 1),
 	"down": (0, 0, -1)
 }
+# The attributes of rooms, and 'door' for the names of their doors, which substring searches are indexed for.
+TEXT_INDEX_FIELDS = ("name", "desc", "dynamicDesc", "note", "door")
 LEAD_BEFORE_ENTERING_VNUMS = [
 	"196",
 	"3473",
@@ -75,17 +74,27 @@ class World(object):
 	def __init__(self, interface="text"):
 		self.isSynced = False
 		self.rooms = {}
+		# The rooms at each X-Y-Z coordinates, for looking up rooms by location without scanning the map.
+		self._roomsByCoordinates = {}
+		# The rooms with each lower case name, and with each lower case name and description.
+		self._roomsByName = {}
+		self._roomsByNameDesc = {}
+		# The trigram index of each text field, built when the field is first searched.
+		self._textIndexes = {}
+		# The (vnum, direction) of the exits leading to each vnum, including 'undefined' and 'death'.
+		self._incomingExits = {}
 		self.labels = {}
 		self._interface = interface
 		if interface != "text":
-			self._gui_queue = Queue()
-			self._gui_queue_lock = threading.RLock()
+			self._gui_updates = GUIUpdateChannel()
 			if interface == "hc":
 				from .gui.hc import Window
 			elif interface == "sighted":
 				from .gui.sighted import Window
 			self.window = Window(self)
 		self._currentRoom = None
+		# The binary map which rooms were loaded from, if any.
+		self._binaryMap = None
 		self.loadRooms()
 		self.loadLabels()
 
@@ -97,8 +106,7 @@ class World(object):
 	def currentRoom(self, value):
 		self._currentRoom = value
 		if self._interface != "text":
-			with self._gui_queue_lock:
-				self._gui_queue.put(("on_map_sync", value))
+			self._gui_updates.sync(value)
 
 	@currentRoom.deleter
 	def currentRoom(self):
@@ -107,8 +115,7 @@ class World(object):
 	def GUIRefresh(self):
 		"""Trigger the clearing and redrawing of rooms by the GUI"""
 		if self._interface != "text":
-			with self._gui_queue_lock:
-				self._gui_queue.put(("on_gui_refresh",))
+			self._gui_updates.refresh()
 
 	def output(self, text):
 		print(text)
@@ -122,66 +129,44 @@ class World(object):
 		if db is None:
 			return self.output(errors)
 		self.output("Creating room objects.")
-		terrainReplacements = {
-			"random": "undefined",
-			"death": "deathtrap",
-			"shallowwater": "shallow"
-		}
-		mobFlagReplacements = {
-			"any": "passive_mob",
-			"smob": "aggressive_mob",
-			"quest": "quest_mob",
-			"scoutguild": "scout_guild",
-			"mageguild": "mage_guild",
-			"clericguild": "cleric_guild",
-			"warriorguild": "warrior_guild",
-			"rangerguild": "ranger_guild",
-			"armourshop": "armour_shop",
-			"foodshop": "food_shop",
-			"petshop": "pet_shop",
-			"weaponshop": "weapon_shop"
-		}
-		loadFlagReplacements = {
-			"packhorse": "pack_horse",
-			"trainedhorse": "trained_horse"
-		}
-		doorFlagReplacements = {
-			"noblock": "no_block",
-			"nobreak": "no_break",
-			"nopick": "no_pick",
-			"needkey": "need_key"
-		}
-		for vnum, roomDict in db.items():
-			newRoom = roomdata.objects.Room(vnum)
-			newRoom.name = roomDict["name"]
-			newRoom.desc = roomDict["desc"]
-			newRoom.dynamicDesc = roomDict["dynamicDesc"]
-			newRoom.note = roomDict["note"]
-			terrain = roomDict["terrain"]
-			newRoom.terrain = terrain if terrain not in terrainReplacements else terrainReplacements[terrain]
-			newRoom.light = roomDict["light"]
-			newRoom.align = roomDict["align"]
-			newRoom.portable = roomDict["portable"]
-			newRoom.ridable = roomDict["ridable"]
-			try:
+		if isinstance(db, roomdata.binarymap.BinaryMap):
+			# Most attributes of rooms, including their exits, are decoded as they are used.
+			self._binaryMap = db
+			for newRoom in db.getRooms():
+				for direction, to in db.getExitDestinations(newRoom):
+					self._incomingExits.setdefault(to, set()).add((newRoom.vnum, direction))
+				self.rooms[newRoom.vnum] = newRoom
+				self.indexRoom(newRoom)
+		else:
+			for vnum, roomDict in db.items():
+				roomdata.database.normalizeRoom(roomDict)
+				newRoom = roomdata.objects.Room(vnum)
+				newRoom.name = roomDict["name"]
+				newRoom.desc = roomDict["desc"]
+				newRoom.dynamicDesc = roomDict["dynamicDesc"]
+				newRoom.note = roomDict["note"]
+				newRoom.terrain = roomDict["terrain"]
+				newRoom.light = roomDict["light"]
+				newRoom.align = roomDict["align"]
+				newRoom.portable = roomDict["portable"]
+				newRoom.ridable = roomDict["ridable"]
 				newRoom.avoid = roomDict["avoid"]
-			except KeyError:
-				pass
-			newRoom.mobFlags = {mobFlagReplacements.get(flag, flag) for flag in roomDict["mobFlags"]}
-			newRoom.loadFlags = {loadFlagReplacements.get(flag, flag) for flag in roomDict["loadFlags"]}
-			newRoom.x = roomDict["x"]
-			newRoom.y = roomDict["y"]
-			newRoom.z = roomDict["z"]
-			newRoom.calculateCost()
-			for direction, exitDict in roomDict["exits"].items():
-				newExit = self.getNewExit(direction, exitDict["to"], vnum)
-				newExit.exitFlags = set(exitDict["exitFlags"])
-				newExit.doorFlags = {doorFlagReplacements.get(flag, flag) for flag in exitDict["doorFlags"]}
-				newExit.door = exitDict["door"]
-				newRoom.exits[direction] = newExit
-			self.rooms[vnum] = newRoom
-			roomDict.clear()
-			del roomDict
+				newRoom.mobFlags = set(roomDict["mobFlags"])
+				newRoom.loadFlags = set(roomDict["loadFlags"])
+				newRoom.x = roomDict["x"]
+				newRoom.y = roomDict["y"]
+				newRoom.z = roomDict["z"]
+				newRoom.calculateCost()
+				for direction, exitDict in roomDict["exits"].items():
+					newExit = self.getNewExit(direction, exitDict["to"], vnum)
+					newExit.exitFlags = set(exitDict["exitFlags"])
+					newExit.doorFlags = set(exitDict["doorFlags"])
+					newExit.door = exitDict["door"]
+					self.setExit(newRoom, newExit)
+				self.rooms[vnum] = newRoom
+				self.indexRoom(newRoom)
+				roomDict.clear()
+				del roomDict
 		self.currentRoom = self.rooms["0"]
 		self.emulationRoom = self.rooms["0"]
 		self.lastEmulatedJump = None
@@ -222,7 +207,10 @@ class World(object):
 				newRoom["exits"][direction] = newExit
 			db[vnum] = newRoom
 		self.output("Saving the database.")
-		roomdata.database.dumpRooms(db)
+		if self._binaryMap is not None:
+			# Every room was decoded to create the dict, so the map can be unmapped before the file is replaced.
+			self._binaryMap.close()
+		roomdata.database.dumpRooms(db, binary=self._binaryMap is not None)
 		if not gc.isenabled():
 			gc.enable()
 			gc.collect()
@@ -247,6 +235,50 @@ class World(object):
 		newExit.vnum = self.currentRoom.vnum if parent is None else parent
 		return newExit
 
+	def _indexExit(self, roomObj, exitObj):
+		self._incomingExits.setdefault(exitObj.to, set()).add((roomObj.vnum, exitObj.direction))
+
+	def _unindexExit(self, roomObj, exitObj):
+		incoming = self._incomingExits.get(exitObj.to)
+		if incoming is not None:
+			incoming.discard((roomObj.vnum, exitObj.direction))
+			if not incoming:
+				del self._incomingExits[exitObj.to]
+
+	def setExit(self, roomObj, exitObj):
+		"""Add an exit to a room, replacing any exit in the same direction."""
+		if exitObj.direction in roomObj.exits:
+			self._unindexExit(roomObj, roomObj.exits[exitObj.direction])
+		roomObj.exits[exitObj.direction] = exitObj
+		self._indexExit(roomObj, exitObj)
+		self.updateDoors(roomObj)
+
+	def setExitDestination(self, roomObj, direction, to):
+		"""Link the exit of a room in a given direction to a vnum, adding the exit if it does not exist."""
+		if direction not in roomObj.exits:
+			self.setExit(roomObj, self.getNewExit(direction, to, roomObj.vnum))
+		else:
+			exitObj = roomObj.exits[direction]
+			self._unindexExit(roomObj, exitObj)
+			exitObj.to = to
+			self._indexExit(roomObj, exitObj)
+		return roomObj.exits[direction]
+
+	def removeExit(self, roomObj, direction):
+		self._unindexExit(roomObj, roomObj.exits[direction])
+		del roomObj.exits[direction]
+		self.updateDoors(roomObj)
+
+	def getIncomingExits(self, vnum):
+		"""Return a set of the (vnum, direction) of the exits leading to a vnum."""
+		return set(self._incomingExits.get(vnum, ()))
+
+	def rebuildExitsIndex(self):
+		self._incomingExits.clear()
+		for roomObj in self.rooms.values():
+			for exitObj in roomObj.exits.values():
+				self._indexExit(roomObj, exitObj)
+
 	def sortExits(self, exitsDict):
 		return sorted(
 			exitsDict.items(),
@@ -261,15 +293,107 @@ class World(object):
 		I.E. True if moving in a given direction then moving back in the direction
 		you just came from would put you back where you started, False otherwise.
 		"""
-		try:
-			dest = self.rooms[exitObj.to]
-		except KeyError:
-			return False
 		revdir = REVERSE_DIRECTIONS[exitObj.direction]
-		if revdir in dest.exits and dest.exits[revdir].to == exitObj.vnum:
-			return True
+		return (exitObj.to, revdir) in self._incomingExits.get(exitObj.vnum, ())
+
+	def _roomIndexKeys(self, roomObj):
+		name = roomObj.name.strip().lower()
+		return (
+			(self._roomsByCoordinates, (roomObj.x, roomObj.y, roomObj.z)),
+			(self._roomsByName, name),
+			(self._roomsByNameDesc, (name, roomObj.desc.strip().lower()))
+		)
+
+	def _getRoomTexts(self, roomObj, field):
+		if field == "door":
+			return [exitObj.door for exitObj in roomObj.exits.values() if exitObj.door]
+		return [getattr(roomObj, field)]
+
+	def _getTextIndex(self, field):
+		if field not in self._textIndexes:
+			textIndex = TrigramIndex()
+			for roomObj in self.rooms.values():
+				textIndex.add(roomObj, *self._getRoomTexts(roomObj, field))
+			self._textIndexes[field] = textIndex
+		return self._textIndexes[field]
+
+	def _getTextCandidates(self, kwArgs):
+		"""Return the rooms which may match the substrings of text fields in a search, or None if any room may."""
+		candidates = None
+		for field, value in kwArgs.items():
+			if field not in TEXT_INDEX_FIELDS:
+				continue
+			rooms = self._getTextIndex(field).candidates(value)
+			if rooms is not None:
+				candidates = rooms if candidates is None else candidates & rooms
+		return candidates
+
+	def updateDoors(self, roomObj):
+		"""Update the index of door names after the doors of a room changed."""
+		if "door" in self._textIndexes:
+			self._textIndexes["door"].add(roomObj, *self._getRoomTexts(roomObj, "door"))
+
+	def indexRoom(self, roomObj):
+		"""Add a room to the indexes of rooms by location and text. Must be called when it is added to the map."""
+		for index, key in self._roomIndexKeys(roomObj):
+			index.setdefault(key, []).append(roomObj)
+		for field, textIndex in self._textIndexes.items():
+			textIndex.add(roomObj, *self._getRoomTexts(roomObj, field))
+
+	def unindexRoom(self, roomObj):
+		"""Remove a room from the indexes of rooms by location and text, before it is removed from the map."""
+		for index, key in self._roomIndexKeys(roomObj):
+			rooms = index.get(key, [])
+			for i, obj in enumerate(rooms):
+				if obj is roomObj:
+					del rooms[i]
+					break
+			if not rooms:
+				index.pop(key, None)
+		for textIndex in self._textIndexes.values():
+			textIndex.remove(roomObj)
+
+	def updateRoom(self, roomObj, **attributes):
+		"""Change the attributes of a room, such as its coordinates or texts, keeping the indexes up to date."""
+		self.unindexRoom(roomObj)
+		for key, value in attributes.items():
+			setattr(roomObj, key, value)
+		self.indexRoom(roomObj)
+
+	def rebuildRoomsIndex(self):
+		for index in (self._roomsByCoordinates, self._roomsByName, self._roomsByNameDesc, self._textIndexes):
+			index.clear()
+		for roomObj in self.rooms.values():
+			self.indexRoom(roomObj)
+
+	def getRoomsFromName(self, name, desc=None):
+		"""
+		Return a list of the rooms with the given name, and description if provided.
+		Case and surrounding white space are ignored.
+		"""
+		if desc is None:
+			return list(self._roomsByName.get(name.strip().lower(), ()))
+		return list(self._roomsByNameDesc.get((name.strip().lower(), desc.strip().lower()), ()))
+
+	def getRoomsFromCoordinates(self, coordinates):
+		"""Return a list of the rooms at the given X-Y-Z coordinates."""
+		return list(self._roomsByCoordinates.get(tuple(coordinates), ()))
+
+	def _getRoomsInBox(self, x, y, z, radiusX, radiusY, radiusZ):
+		"""A generator which yields the rooms within the given distances of X-Y-Z coordinates."""
+		cells = self._roomsByCoordinates
+		if (2 * radiusX + 1) * (2 * radiusY + 1) * (2 * radiusZ + 1) <= len(cells):
+			for cellX in range(x - radiusX, x + radiusX + 1):
+				for cellY in range(y - radiusY, y + radiusY + 1):
+					for cellZ in range(z - radiusZ, z + radiusZ + 1):
+						cell = cells.get((cellX, cellY, cellZ))
+						if cell:
+							yield from cell
 		else:
-			return False
+			# The box is larger than the occupied part of the map, so it is cheaper to check every cell.
+			for (cellX, cellY, cellZ), cell in cells.items():
+				if abs(cellX - x) <= radiusX and abs(cellY - y) <= radiusY and abs(cellZ - z) <= radiusZ:
+					yield from cell
 
 	def getNeighborsFromCoordinates(self, start=None, radius=1):
 		"""A generator which yields all rooms in the vicinity of the given X-Y-Z coordinates.
@@ -286,12 +410,10 @@ class World(object):
 			radiusX = radiusY = radiusZ = int(radius)
 		else:
 			radiusX, radiusY, radiusZ = radius
-		for vnum, obj in self.rooms.items():
+		for obj in list(self._getRoomsInBox(x, y, z, radiusX, radiusY, radiusZ)):
 			if obj.x == x and obj.y == y and obj.z == z:
 				continue
-			differenceX, differenceY, differenceZ = obj.x - x, obj.y - y, obj.z - z
-			if abs(differenceX) <= radiusX and abs(differenceY) <= radiusY and abs(differenceZ) <= radiusZ:
-				yield(vnum, obj, differenceX, differenceY, differenceZ)
+			yield(obj.vnum, obj, obj.x - x, obj.y - y, obj.z - z)
 
 	def getNeighborsFromRoom(self, start=None, radius=1):
 		"""A generator which yields all rooms in the vicinity of a room object.
@@ -305,15 +427,9 @@ class World(object):
 			radiusX = radiusY = radiusZ = int(radius)
 		else:
 			radiusX, radiusY, radiusZ = radius
-		for vnum, obj in self.rooms.items():
-			differenceX, differenceY, differenceZ = obj.x - x, obj.y - y, obj.z - z
-			if (
-				abs(differenceX) <= radiusX
-				and abs(differenceY) <= radiusY
-				and abs(differenceZ) <= radiusZ
-				and obj is not start
-			):
-				yield(vnum, obj, differenceX, differenceY, differenceZ)
+		for obj in list(self._getRoomsInBox(x, y, z, radiusX, radiusY, radiusZ)):
+			if obj is not start:
+				yield(obj.vnum, obj, obj.x - x, obj.y - y, obj.z - z)
 
 	def getVnum(self, roomObj=None):
 		result = None
@@ -361,14 +477,20 @@ class World(object):
 		else:
 			origin = matchDict["origin"]
 			self.output("Changing the Vnum '{}' to '{}'.".format(origin, destination))
-		for roomVnum, roomObj in self.rooms.items():
-			for direction, exitObj in roomObj.exits.items():
-				if roomVnum == origin:
-					exitObj.vnum = destination
-				if exitObj.to == origin:
-					self.rooms[roomVnum].exits[direction].to = destination
-		self.rooms[origin].vnum = destination
-		self.rooms[destination] = self.rooms[origin]
+		roomObj = self.rooms[origin]
+		incoming = self.getIncomingExits(origin)
+		for exitObj in roomObj.exits.values():
+			self._unindexExit(roomObj, exitObj)
+		for roomVnum, direction in incoming:
+			if roomVnum == origin:
+				roomObj.exits[direction].to = destination
+			else:
+				self.setExitDestination(self.rooms[roomVnum], direction, destination)
+		roomObj.vnum = destination
+		for exitObj in roomObj.exits.values():
+			exitObj.vnum = destination
+			self._indexExit(roomObj, exitObj)
+		self.rooms[destination] = roomObj
 		del self.rooms[origin]
 
 	def rdelete(self, *args):
@@ -384,10 +506,12 @@ class World(object):
 		else:
 			return "Syntax: rdelete [vnum]"
 		output = "Deleting room '{}' with name '{}'.".format(vnum, self.rooms[vnum].name)
-		for roomVnum, roomObj in self.rooms.items():
-			for direction, exitObj in roomObj.exits.items():
-				if exitObj.to == vnum:
-					self.rooms[roomVnum].exits[direction].to = "undefined"
+		for roomVnum, direction in self.getIncomingExits(vnum):
+			self.setExitDestination(self.rooms[roomVnum], direction, "undefined")
+		roomObj = self.rooms[vnum]
+		for exitObj in roomObj.exits.values():
+			self._unindexExit(roomObj, exitObj)
+		self.unindexRoom(roomObj)
 		del self.rooms[vnum]
 		self.GUIRefresh()
 		return output
@@ -421,7 +545,19 @@ class World(object):
 		results = []
 		if not kwArgs:
 			return results
-		for vnum, roomObj in self.rooms.items():
+		if exactMatch and "name" in kwArgs:
+			# Only the rooms with the given name, and description if any, can match.
+			candidates = self.getRoomsFromName(kwArgs["name"], kwArgs.get("desc"))
+		else:
+			candidates = self._getTextCandidates(kwArgs)
+		if candidates is None:
+			candidates = self.rooms.values()
+		else:
+			# The candidates are checked in the order of the rooms, rather than the order of the indexes,
+			# so that rooms at the same distance are always listed in the same order.
+			candidates = frozenset(candidates)
+			candidates = [roomObj for roomObj in self.rooms.values() if roomObj in candidates]
+		for roomObj in candidates:
 			keysMatched = 0
 			for key, value in kwArgs.items():
 				if key in ("name", "desc", "dynamicDesc", "note"):
@@ -462,7 +598,7 @@ class World(object):
 				direction=currentRoom.directionTo(roomObj),
 				clockPosition=currentRoom.clockPositionTo(roomObj),
 				distance=currentRoom.manhattanDistance(roomObj),
-				**vars(roomObj)
+				**roomObj.attributes()
 			) for roomObj in reversed(results[:20])
 		)
 
@@ -480,7 +616,7 @@ class World(object):
 				direction=currentRoom.directionTo(roomObj),
 				clockPosition=currentRoom.clockPositionTo(roomObj),
 				distance=currentRoom.manhattanDistance(roomObj),
-				**vars(roomObj)
+				**roomObj.attributes()
 			) for roomObj in reversed(results[:20])
 		)
 
@@ -504,7 +640,7 @@ class World(object):
 				direction=currentRoom.directionTo(roomObj),
 				clockPosition=currentRoom.clockPositionTo(roomObj),
 				distance=currentRoom.manhattanDistance(roomObj),
-				**vars(roomObj)
+				**roomObj.attributes()
 			) for roomObj in reversed(sorted(results, key=lambda r: r.manhattanDistance(currentRoom))[:20])
 		)
 
@@ -522,7 +658,7 @@ class World(object):
 				direction=currentRoom.directionTo(roomObj),
 				clockPosition=currentRoom.clockPositionTo(roomObj),
 				distance=currentRoom.manhattanDistance(roomObj),
-				**vars(roomObj)
+				**roomObj.attributes()
 			) for roomObj in reversed(results[:20])
 		)
 
@@ -540,7 +676,7 @@ class World(object):
 				direction=currentRoom.directionTo(roomObj),
 				clockPosition=currentRoom.clockPositionTo(roomObj),
 				distance=currentRoom.manhattanDistance(roomObj),
-				**vars(roomObj)
+				**roomObj.attributes()
 			) for roomObj in reversed(results[:20])
 		)
 
@@ -554,14 +690,14 @@ class World(object):
 		if note.lower().startswith("-r"):
 			if len(note) > 2:
 				return "Error: '-r' requires no extra arguments. Change aborted."
-			self.currentRoom.note = ""
+			self.updateRoom(self.currentRoom, note="")
 			return "Note removed."
 		elif note.lower().startswith("-a"):
 			if len(note) == 2:
 				return "Error: '-a' requires text to be appended. Change aborted."
-			self.currentRoom.note = "{} {}".format(self.currentRoom.note.strip(), note[2:].strip())
+			self.updateRoom(self.currentRoom, note="{} {}".format(self.currentRoom.note.strip(), note[2:].strip()))
 		else:
-			self.currentRoom.note = note
+			self.updateRoom(self.currentRoom, note=note)
 		return "Room note now set to '{}'.".format(self.currentRoom.note)
 
 	def ralign(self, *args):
@@ -639,7 +775,7 @@ class World(object):
 	def rx(self, *args):
 		if args and args[0] and args[0].strip():
 			try:
-				self.currentRoom.x = int(args[0].strip())
+				self.updateRoom(self.currentRoom, x=int(args[0].strip()))
 				self.GUIRefresh()
 				return "Setting room X coordinate to '{}'.".format(self.currentRoom.x)
 			except ValueError:
@@ -649,7 +785,7 @@ class World(object):
 	def ry(self, *args):
 		if args and args[0] and args[0].strip():
 			try:
-				self.currentRoom.y = int(args[0].strip())
+				self.updateRoom(self.currentRoom, y=int(args[0].strip()))
 				self.GUIRefresh()
 				return "Setting room Y coordinate to '{}'.".format(self.currentRoom.y)
 			except ValueError:
@@ -659,7 +795,7 @@ class World(object):
 	def rz(self, *args):
 		if args and args[0] and args[0].strip():
 			try:
-				self.currentRoom.z = int(args[0].strip())
+				self.updateRoom(self.currentRoom, z=int(args[0].strip()))
 				self.GUIRefresh()
 				return "Setting room Z coordinate to '{}'.".format(self.currentRoom.z)
 			except ValueError:
@@ -807,10 +943,11 @@ class World(object):
 			if not matchDict["name"]:
 				return "Error: 'add' expects a name for the secret."
 			elif direction not in self.currentRoom.exits:
-				self.currentRoom.exits[direction] = self.getNewExit(direction)
+				self.setExit(self.currentRoom, self.getNewExit(direction))
 			self.currentRoom.exits[direction].exitFlags.add("door")
 			self.currentRoom.exits[direction].doorFlags.add("hidden")
 			self.currentRoom.exits[direction].door = matchDict["name"]
+			self.updateDoors(self.currentRoom)
 			self.GUIRefresh()
 			return "Adding secret '{}' to direction '{}'.".format(matchDict["name"], direction)
 		elif direction not in self.currentRoom.exits:
@@ -823,6 +960,7 @@ class World(object):
 			if "hidden" in self.currentRoom.exits[direction].doorFlags:
 				self.currentRoom.exits[direction].doorFlags.remove("hidden")
 			self.currentRoom.exits[direction].door = ""
+			self.updateDoors(self.currentRoom)
 			self.GUIRefresh()
 			return "Secret {} removed.".format(direction)
 
@@ -847,9 +985,7 @@ class World(object):
 				return "Error: 'add' expects a vnum or 'undefined'."
 			elif matchDict["vnum"] != "undefined" and matchDict["vnum"] not in self.rooms:
 				return "Error: vnum {} not in database.".format(matchDict["vnum"])
-			elif direction not in self.currentRoom.exits:
-				self.currentRoom.exits[direction] = self.getNewExit(direction)
-			self.currentRoom.exits[direction].to = matchDict["vnum"]
+			self.setExitDestination(self.currentRoom, direction, matchDict["vnum"])
 			if matchDict["vnum"] == "undefined":
 				self.GUIRefresh()
 				return "Direction {} now undefined.".format(direction)
@@ -858,9 +994,9 @@ class World(object):
 					reversedDirection not in self.rooms[matchDict["vnum"]].exits
 					or self.rooms[matchDict["vnum"]].exits[reversedDirection].to == "undefined"
 				):
-					self.rooms[matchDict["vnum"]].exits[reversedDirection] = self.getNewExit(
-						reversedDirection,
-						self.currentRoom.vnum
+					self.setExit(
+						self.rooms[matchDict["vnum"]],
+						self.getNewExit(reversedDirection, self.currentRoom.vnum, matchDict["vnum"])
 					)
 					self.GUIRefresh()
 					return (
@@ -905,7 +1041,7 @@ class World(object):
 				)
 			)
 		elif "remove".startswith(matchDict["mode"]):
-			del self.currentRoom.exits[direction]
+			self.removeExit(self.currentRoom, direction)
 			self.GUIRefresh()
 			return "Exit {} removed.".format(direction)
 
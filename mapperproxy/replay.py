@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import argparse
+
+import mapper.replay
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Replay a session captured by the Mume mapper.")
+	parser.add_argument("capture", help="The session capture file to replay.")
+	parser.add_argument(
+		"-f",
+		"--format",
+		help="Select how data from the server is transformed before  being sent to the client.",
+		choices=["normal", "tintin", "raw", "jsonl"],
+		default="normal"
+	)
+	parser.add_argument(
+		"-rt",
+		"--real-time",
+		help="Replay the capture with its original pacing, rather than as fast as possible.",
+		action="store_true"
+	)
+	parser.add_argument(
+		"-o",
+		"--output",
+		metavar="file",
+		help="Write the output which would have been sent to the client to a file."
+	)
+	args = parser.parse_args()
+	if args.output:
+		outputFile = open(args.output, "wb")
+	else:
+		outputFile = None
+	try:
+		stats = mapper.replay.replay(
+			args.capture,
+			outputFormat=args.format,
+			realTime=args.real_time,
+			output=outputFile
+		)
+	finally:
+		if outputFile is not None:
+			outputFile.close()
+	megabytes = (stats["serverBytes"] + stats["clientBytes"]) / 1024 / 1024
+	print(
+		f"Replayed {stats['serverChunks']} chunks ({stats['serverBytes']} bytes) from the server "
+		+ f"and {stats['clientChunks']} chunks ({stats['clientBytes']} bytes) from the client "
+		+ f"in {stats['elapsed']:.3f} seconds ({megabytes / stats['elapsed']:.2f} MB/s)."
+	)
+	print(stats["latency"])
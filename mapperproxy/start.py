@@ -33,7 +33,7 @@ if __name__ == "__main__":
 		"-f",
 		"--format",
 		help="Select how data from the server is transformed before  being sent to the client.",
-		choices=["normal", "tintin", "raw"],
+		choices=["normal", "tintin", "raw", "jsonl"],
 		default="normal"
 	)
 	parser.add_argument(
@@ -95,6 +95,45 @@ if __name__ == "__main__":
 		),
 		default="{vnum}, {name}, {attribute}"
 	)
+	parser.add_argument(
+		"-as",
+		"--async",
+		dest="use_async",
+		help="Drive the client, server, and mapper from a single asyncio event loop instead of separate threads.",
+		action="store_true"
+	)
+	parser.add_argument(
+		"-mc",
+		"--max-clients",
+		metavar="number",
+		type=int,
+		help="The maximum number of local clients which may share the session.",
+		default=1
+	)
+	parser.add_argument(
+		"-roc",
+		"--read-only-clients",
+		help="Ignore input from clients which connect after the first one.",
+		action="store_true"
+	)
+	parser.add_argument(
+		"-cap",
+		"--capture",
+		metavar="file",
+		help="Record the data received from the server and the client to a file, for replaying with replay.py."
+	)
+	parser.add_argument(
+		"-rc",
+		"--reconnect",
+		help="Reconnect to the server if the connection is lost. Not supported by the async engine.",
+		action="store_true"
+	)
+	parser.add_argument(
+		"-cl",
+		"--channel-log",
+		metavar="directory",
+		help="Log the messages of communication channels, such as tells and narrates, to files in a directory."
+	)
 	args = parser.parse_args()
 	try:
 		mapper.main.main(
@@ -108,7 +147,13 @@ if __name__ == "__main__":
 			localPort=args.local_port,
 			remoteHost=args.remote_host,
 			remotePort=args.remote_port,
-			noSsl=args.no_ssl
+			noSsl=args.no_ssl,
+			useAsync=args.use_async,
+			maxClients=args.max_clients,
+			readOnlyClients=args.read_only_clients,
+			captureFile=args.capture,
+			reconnect=args.reconnect,
+			channelLogDirectory=args.channel_log
 		)
 	except Exception:
 		traceback.print_exception(*sys.exc_info())
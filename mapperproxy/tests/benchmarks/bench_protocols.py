@@ -0,0 +1,227 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+Throughput benchmarks for the protocol handlers.
+
+Run from the mapperproxy directory with:
+	python -m tests.benchmarks.bench_protocols [--stream FILE] [--output FILE] [--compare FILE]
+
+Results can be saved as JSON with --output, and compared against an earlier run with --compare.
+"""
+
+
+# Built-in Modules:
+import argparse
+import json
+import platform
+import random
+import sys
+from telnetlib import IAC, DO, WILL, SB, SE, CHARSET, GA, NAWS, TTYPE
+import time
+import tracemalloc
+from unittest.mock import Mock
+
+# Local Modules:
+from mapper.protocols import ProtocolHandler
+from mapper.protocols.mpi import MPI_INIT
+from mapper.protocols.telnet import SB_ACCEPTED
+from mapper.protocols.telnetfilter import TelnetFilter
+
+
+OUTPUT_FORMATS = ("normal", "tintin", "raw", "jsonl")
+CHUNK_SIZE = 4096  # The size of the receive buffer used by the server thread.
+CHANNELS = (b"tell", b"narrate", b"say", b"pray", b"emote")
+NAMES = (b"Gandalf", b"Frodo", b"Aragorn", b"Legolas", b"Gimli", b"Boromir", b"Samwise")
+DIRECTIONS = (b"north", b"east", b"south", b"west", b"up", b"down")
+
+
+def generateMudStream(size, seed=0):
+	"""Generate a stream resembling output from a MUME session, of at least size bytes."""
+	rng = random.Random(seed)
+	words = (
+		b"the a dark forest path leads through ancient trees whose branches form a canopy overhead "
+		+ b"lamplighter bench tavern river stone wall gate road hill mountain orc troll dwarf elf"
+	).split()
+
+	def sentence(length):
+		return b" ".join(rng.choice(words) for i in range(length)).capitalize() + b"."
+
+	def prompt():
+		light = rng.choice((b"*", b"o", b"!"))
+		return b"<prompt>\x1b[34m" + light + b" Mana:Hot Move:Tired>\x1b[0m</prompt>" + IAC + GA
+
+	stream = bytearray(
+		IAC + DO + TTYPE + IAC + DO + NAWS
+		+ b"\r\n                              ***  MUME VIII  ***\r\n\r\n"
+		+ IAC + SB + CHARSET + SB_ACCEPTED + b"US-ASCII" + IAC + SE
+		+ IAC + WILL + CHARSET
+	)
+	while len(stream) < size:
+		kind = rng.random()
+		if kind < 0.4:
+			# Moving into a room.
+			stream.extend(b"<movement dir=" + rng.choice(DIRECTIONS) + b"/>")
+			stream.extend(b"<room><name>" + sentence(3) + b"</name>\r\n")
+			description = b"\r\n".join(sentence(12) for i in range(rng.randint(2, 6))) + b"\r\n"
+			stream.extend(b"<gratuitous><description>" + description + b"</description></gratuitous>")
+			for i in range(rng.randint(0, 4)):
+				stream.extend(sentence(8) + b" is here.\r\n")
+			stream.extend(b"</room><exits>Exits: " + b", ".join(rng.sample(DIRECTIONS, 3)) + b".\r\n</exits>")
+			stream.extend(prompt())
+		elif kind < 0.9:
+			# Channel spam.
+			for i in range(rng.randint(1, 10)):
+				channel = rng.choice(CHANNELS)
+				stream.extend(
+					b"<" + channel + b">" + rng.choice(NAMES) + b" " + channel + b"s '" + sentence(rng.randint(4, 30))
+					+ b" &lt;3 &amp; " + IAC + IAC + b"'</" + channel + b">\r\n"
+				)
+			stream.extend(prompt())
+		elif kind < 0.95:
+			# Viewing a text with MPI.
+			text = b"\n".join(sentence(10) for i in range(rng.randint(5, 40))) + b"\n"
+			stream.extend(b"\n" + MPI_INIT + b"V" + str(len(text)).encode("us-ascii") + b"\n" + text)
+		else:
+			# Editing a text with MPI.
+			body = b"M" + str(rng.randint(1, 99999)).encode("us-ascii") + b"\nDescription\n"
+			body += b"\n".join(sentence(10) for i in range(rng.randint(2, 10))) + b"\n"
+			stream.extend(b"\n" + MPI_INIT + b"E" + str(len(body)).encode("us-ascii") + b"\n" + body)
+	return bytes(stream)
+
+
+def generateClientStream(size, seed=0):
+	"""Generate a stream resembling input from a mud client, of at least size bytes."""
+	rng = random.Random(seed)
+	commands = (b"look", b"north", b"south", b"kill orc", b"narrate hello everyone", b"path 1234", b"rinfo")
+	stream = bytearray(IAC + WILL + TTYPE + IAC + WILL + NAWS)
+	while len(stream) < size:
+		if rng.random() < 0.05:
+			# The window was resized.
+			stream.extend(IAC + SB + NAWS + bytes((0, rng.randint(80, 200), 0, rng.randint(24, 60))) + IAC + SE)
+		stream.extend(rng.choice(commands) + b"\r\n")
+	return bytes(stream)
+
+
+def chunks(stream, chunkSize=CHUNK_SIZE):
+	"""Yield memoryview slices of a reused buffer, like the server thread does."""
+	buffer = bytearray(chunkSize)
+	view = memoryview(buffer)
+	for i in range(0, len(stream), chunkSize):
+		chunk = stream[i:i + chunkSize]
+		buffer[:len(chunk)] = chunk
+		yield view[:len(chunk)]
+
+
+def runProtocolHandler(stream, outputFormat):
+	eventCount = 0
+
+	def countEvent(item):
+		nonlocal eventCount
+		eventCount += 1
+
+	handler = ProtocolHandler(
+		remoteSender=bytearray(),
+		eventSender=countEvent,
+		outputFormat=outputFormat,
+		promptTerminator=IAC + GA
+	)
+	# Don't open any editors or pagers.
+	handler._mpi._commands = {b"E": Mock(), b"V": Mock()}
+	for chunk in chunks(stream):
+		handler.parse(chunk)
+	handler.close()
+	return eventCount
+
+
+def runTelnetFilter(stream):
+	handler = TelnetFilter()
+	for chunk in chunks(stream):
+		handler.parse(chunk)
+	return 0
+
+
+def measure(func, stream, repeat):
+	"""Return the best throughput in MB/s and events/s from repeat runs, and the peak allocation per KB."""
+	bestTime = None
+	events = 0
+	for i in range(repeat):
+		startTime = time.perf_counter()
+		events = func(stream)
+		elapsed = time.perf_counter() - startTime
+		bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+	tracemalloc.start()
+	func(stream)
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return {
+		"mbPerSecond": len(stream) / bestTime / 1024 / 1024,
+		"eventsPerSecond": events / bestTime,
+		"peakBytesPerKB": peak / (len(stream) / 1024)
+	}
+
+
+def runBenchmarks(mudStream, clientStream, repeat=3):
+	results = {}
+	for outputFormat in OUTPUT_FORMATS:
+		results[f"ProtocolHandler[{outputFormat}]"] = measure(
+			lambda stream: runProtocolHandler(stream, outputFormat),
+			mudStream,
+			repeat
+		)
+	results["TelnetFilter"] = measure(runTelnetFilter, clientStream, repeat)
+	return results
+
+
+def formatResults(results, baseline=None):
+	lines = [f"{'Benchmark':<28}{'MB/s':>10}{'events/s':>14}{'peak B/KB':>12}"]
+	for name, result in results.items():
+		line = (
+			f"{name:<28}{result['mbPerSecond']:>10.2f}{result['eventsPerSecond']:>14.0f}"
+			+ f"{result['peakBytesPerKB']:>12.1f}"
+		)
+		if baseline is not None and name in baseline:
+			change = (result["mbPerSecond"] / baseline[name]["mbPerSecond"] - 1) * 100
+			line += f"  ({change:+.1f}% MB/s)"
+		lines.append(line)
+	return "\n".join(lines)
+
+
+def main(args=None):
+	parser = argparse.ArgumentParser(description="Benchmark the protocol handlers.")
+	parser.add_argument("-s", "--stream", help="A file containing raw bytes received from MUME.")
+	parser.add_argument("-S", "--size", type=int, help="The size of generated streams.", default=1024 * 1024)
+	parser.add_argument("-r", "--repeat", type=int, help="The number of timed runs.", default=3)
+	parser.add_argument("-o", "--output", help="Save the results to a JSON file.")
+	parser.add_argument("-c", "--compare", help="Compare the results with a JSON file from an earlier run.")
+	args = parser.parse_args(args)
+	if args.stream:
+		with open(args.stream, "rb") as fileObj:
+			mudStream = fileObj.read()
+	else:
+		mudStream = generateMudStream(args.size)
+	clientStream = generateClientStream(args.size)
+	results = runBenchmarks(mudStream, clientStream, args.repeat)
+	baseline = None
+	if args.compare:
+		with open(args.compare, "r", encoding="utf-8") as fileObj:
+			baseline = json.load(fileObj)["results"]
+	print(formatResults(results, baseline))
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as fileObj:
+			json.dump(
+				{
+					"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+					"python": sys.version,
+					"platform": platform.platform(),
+					"streamSize": len(mudStream),
+					"results": results
+				},
+				fileObj,
+				indent=2
+			)
+
+
+if __name__ == "__main__":
+	main()
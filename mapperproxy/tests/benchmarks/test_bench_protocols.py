@@ -0,0 +1,32 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+
+# Local Modules:
+from .bench_protocols import generateClientStream, generateMudStream, runBenchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+	def testRunBenchmarks(self):
+		results = runBenchmarks(generateMudStream(16 * 1024), generateClientStream(16 * 1024), repeat=1)
+		self.assertEqual(
+			list(results),
+			[
+				"ProtocolHandler[normal]",
+				"ProtocolHandler[tintin]",
+				"ProtocolHandler[raw]",
+				"ProtocolHandler[jsonl]",
+				"TelnetFilter"
+			]
+		)
+		for name, result in results.items():
+			self.assertGreater(result["mbPerSecond"], 0, name)
+		self.assertGreater(results["ProtocolHandler[normal]"]["eventsPerSecond"], 0)
+
+	def testGeneratedStreamsAreDeterministic(self):
+		self.assertEqual(generateMudStream(8 * 1024), generateMudStream(8 * 1024))
+		self.assertNotEqual(generateMudStream(8 * 1024), generateMudStream(8 * 1024, seed=1))
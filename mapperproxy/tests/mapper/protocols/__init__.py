@@ -4,9 +4,8 @@
 
 
 def parseMudOutput(handler, dataBytes):
+	"""Feed the bytes to a handler one at a time, returning the bytes which it passes on."""
 	result = bytearray()
-	for ordinal in dataBytes:
-		value = handler.parse(ordinal)
-		if value is not None:
-			result.append(value)
+	for index in range(len(dataBytes)):
+		handler.parseChunk(dataBytes[index:index + 1], result.extend)
 	return result
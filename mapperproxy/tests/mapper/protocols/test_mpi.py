@@ -0,0 +1,96 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import os
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+# Local Modules:
+from mapper.protocols.mpi import MAX_MPI_SESSIONS, MPI_INIT, MPIHandler
+
+
+class TestMPIHandler(unittest.TestCase):
+	def setUp(self):
+		self.mudReceives = bytearray()
+		self.handler = MPIHandler(remoteSender=self.mudReceives, outputFormat="normal")
+		self.handler.editor = "editor"
+		self.fileNames = []
+
+	def tearDown(self):
+		self.handler.close()
+
+	def runEditor(self, newText=None):
+		def popen(args):
+			fileName = args[-1]
+			self.fileNames.append(fileName)
+			if newText is not None:
+				with open(fileName, "wb") as fileObj:
+					fileObj.write(newText)
+			return Mock()
+
+		with patch("mapper.protocols.mpi.subprocess.Popen", side_effect=popen):
+			self.handler._edit(b"M12\nDescription\nbody text\n")
+
+	def testEditCancelledWhenUnchanged(self):
+		# Rewriting the file without changing its contents still cancels the session.
+		self.runEditor(b"body text\r\n")
+		self.assertEqual(self.mudReceives, MPI_INIT + b"E4\nC12\n")
+		self.assertFalse(os.path.exists(self.fileNames[0]))
+
+	def testEditChanged(self):
+		self.runEditor(b"new text\r\n")
+		self.assertEqual(self.mudReceives, MPI_INIT + b"E13\nE12\nnew text\n")
+		self.assertFalse(os.path.exists(self.fileNames[0]))
+
+	def testSessionPool(self):
+		lock = threading.Lock()
+		running = []
+		maxRunning = []
+		release = threading.Event()
+
+		def session(dataBytes):
+			with lock:
+				running.append(dataBytes)
+				maxRunning.append(len(running))
+			release.wait(5)
+			with lock:
+				running.remove(dataBytes)
+
+		for i in range(MAX_MPI_SESSIONS * 2):
+			self.handler._startSession(session, bytes([i]))
+		self.assertEqual(self.handler.activeSessions, MAX_MPI_SESSIONS * 2)
+		release.set()
+		self.handler.close(wait=True)
+		self.assertLessEqual(max(maxRunning), MAX_MPI_SESSIONS)
+		self.assertEqual(len(maxRunning), MAX_MPI_SESSIONS * 2)
+		# Finished sessions are forgotten.
+		self.assertEqual(self.handler.activeSessions, 0)
+
+	def testCloseWithoutWaiting(self):
+		release = threading.Event()
+		self.handler._startSession(lambda dataBytes: release.wait(5), b"")
+		# Sessions may wait for the user indefinitely, so they must never keep the program from exiting.
+		self.assertTrue(all(thread.daemon for thread in self.handler._sessions))
+		self.handler.close()
+		self.assertEqual(self.handler.activeSessions, 1)
+		release.set()
+		self.handler.close(wait=True)
+		self.assertEqual(self.handler.activeSessions, 0)
+		# No sessions are started once the handler is closed.
+		self.handler._startSession(lambda dataBytes: None, b"")
+		self.assertEqual(self.handler.activeSessions, 0)
+
+	def testTintinViewFilesRemovedOnClose(self):
+		self.handler._outputFormat = "tintin"
+		with patch("builtins.print") as printMock:
+			self.handler._view(b"Some text\n")
+		fileName = printMock.call_args[0][0].split(" ", 1)[1][:-len(":MPICOMMAND")]
+		# The file is kept for Tintin's pager, after the session is finished.
+		with open(fileName, "rb") as fileObj:
+			self.assertEqual(fileObj.read(), b"Some text\r\n")
+		self.handler.close()
+		self.assertFalse(os.path.exists(fileName))
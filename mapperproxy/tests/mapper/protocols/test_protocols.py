@@ -0,0 +1,164 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import json
+from telnetlib import IAC, DO, WILL, SB, SE, CHARSET, GA, TTYPE
+import unittest
+from unittest.mock import Mock, call
+
+# Local Modules:
+from mapper.mapper import MUD_DATA
+from mapper.protocols import ProtocolHandler
+from mapper.protocols.mpi import MPI_INIT
+from mapper.protocols.telnet import SB_ACCEPTED
+
+
+SAMPLE_STREAM = (
+	IAC + DO + TTYPE
+	+ b"\r\n                              ***  MUME VIII  ***\r\n\r\n"
+	+ IAC + SB + CHARSET + SB_ACCEPTED + b"US-ASCII" + IAC + SE
+	+ IAC + WILL + CHARSET
+	+ b"<movement dir=down/><room><name>Seagull Inn</name>\r\n"
+	+ b"<gratuitous><description>This is the most famous meeting-place in Harlond.\r\n"
+	+ b"</description></gratuitous>"
+	+ b"A white-painted bench is here.\r\n"
+	+ b"An elven lamplighter &amp; a &lt;cat&gt; are resting here.\r\n"
+	+ b"</room><exits>Exits: north, [east], south.\r\n</exits>"
+	+ b"<prompt>\x1b[34mMana:Hot Move:Tired>\x1b[0m</prompt>" + IAC + GA
+	+ b"<tell>Gandalf tells you 'hi " + IAC + IAC + b"'</tell>\r\n"
+	+ b"\n$x\n~$~$#E\n~$#Z\n~$#V" + b"Q\n"
+	+ b"\n" + MPI_INIT + b"V25\nSome text to be viewed.\n\n"
+	+ b"\n" + MPI_INIT + b"E27\nM12\nDescription\nbody text\r\n"
+	+ b"Trailing text with no new line"
+)
+
+SAMPLE_TEXT = (
+	b"\r\n                              ***  MUME VIII  ***\r\n\r\n"
+	+ b"{name}\r\n"
+	+ b"A white-painted bench is here.\r\n"
+	+ b"An elven lamplighter & a <cat> are resting here.\r\n"
+	+ b"Exits: north, [east], south.\r\n"
+	+ b"{prompt}" + IAC + GA
+	+ b"{tell}\r\n"
+	+ b"\n$x\n~$~$#E\n~$#Z\n~$#VQ\n"
+	+ b"Trailing text with no new line"
+)
+SAMPLE_OUTPUTS = {
+	"normal": IAC + DO + TTYPE + SAMPLE_TEXT.replace(b"{name}", b"Seagull Inn").replace(
+		b"{prompt}", b"\x1b[34mMana:Hot Move:Tired>\x1b[0m"
+	).replace(b"{tell}", b"Gandalf tells you 'hi " + IAC + IAC + b"'"),
+	"tintin": IAC + DO + TTYPE + SAMPLE_TEXT.replace(b"{name}", b"NAME:Seagull Inn:NAME").replace(
+		b"{prompt}", b"PROMPT:\x1b[34mMana:Hot Move:Tired>\x1b[0m:PROMPT"
+	).replace(b"{tell}", b"TELL:Gandalf tells you 'hi " + IAC + IAC + b"':TELL")
+}
+SAMPLE_EVENTS = [
+	(MUD_DATA, event) for event in (
+		("line", ""),
+		("line", "                              ***  MUME VIII  ***"),
+		("line", ""),
+		("movement", "down"),
+		("name", "Seagull Inn"),
+		("description", "This is the most famous meeting-place in Harlond.\r\n"),
+		("dynamic", "A white-painted bench is here.\r\nAn elven lamplighter & a <cat> are resting here.\r\n"),
+		("exits", "Exits: north, [east], south.\r\n"),
+		("prompt", "\x1b[34mMana:Hot Move:Tired>\x1b[0m"),
+		("tell", "Gandalf tells you 'hi \xff'"),
+		("line", "Gandalf tells you 'hi \xff'"),
+		("line", ""),
+		("line", "$x"),
+		("line", "~$~$#E"),
+		("line", "~$#Z"),
+		("line", "~$#VQ"),
+		("line", ""),
+		("line", "")
+	)
+]
+
+
+def parsePerByte(handler, dataBytes):
+	"""The reference, feeding the bytes through the chain of handlers one at a time."""
+	for index in range(len(dataBytes)):
+		handler.notify(dataBytes[index:index + 1])
+	result = bytes(handler._processed)
+	handler._processed.clear()
+	return result
+
+
+class TestProtocolHandler(unittest.TestCase):
+	def createHandler(self, outputFormat):
+		events = []
+		mudReceives = bytearray()
+		handler = ProtocolHandler(
+			remoteSender=mudReceives,
+			eventSender=events,
+			outputFormat=outputFormat,
+			promptTerminator=IAC + GA
+		)
+		handler._mpi._commands = {b"E": Mock(), b"V": Mock()}
+		return handler, events, mudReceives
+
+	def testParseChunkMatchesPerByteParsing(self):
+		for outputFormat in ("normal", "tintin", "raw", "jsonl"):
+			for chunkSize in (1, 2, 3, 5, 7, 64, 4096):
+				reference, referenceEvents, referenceMudReceives = self.createHandler(outputFormat)
+				handler, events, mudReceives = self.createHandler(outputFormat)
+				# Like the server thread, reuse one receive buffer, and pass memoryview slices of it to the handler.
+				buffer = bytearray(4096)
+				view = memoryview(buffer)
+				for i in range(0, len(SAMPLE_STREAM), chunkSize):
+					chunk = SAMPLE_STREAM[i:i + chunkSize]
+					description = f"output format {outputFormat!r}, chunk size {chunkSize}, offset {i}"
+					buffer[:len(chunk)] = chunk
+					handler.notify(view[:len(chunk)])
+					output = bytes(handler._processed)
+					handler._processed.clear()
+					self.assertEqual(output, parsePerByte(reference, chunk), description)
+				handler.close(wait=True)
+				reference.close(wait=True)
+				description = f"output format {outputFormat!r}, chunk size {chunkSize}"
+				self.assertEqual(events, referenceEvents, description)
+				self.assertEqual(mudReceives, referenceMudReceives, description)
+				for command in (b"E", b"V"):
+					self.assertEqual(
+						handler._mpi._commands[command].mock_calls,
+						reference._mpi._commands[command].mock_calls,
+						description
+					)
+
+	def testParseChunkExpectedOutput(self):
+		# Unlike the per-byte reference, which shares the text handling of the XML handler,
+		# the output and events are compared with fixed values.
+		for outputFormat, expectedOutput in SAMPLE_OUTPUTS.items():
+			for chunkSize in (1, 3, 64, 4096):
+				handler, events, mudReceives = self.createHandler(outputFormat)
+				# The chunks are parsed as parts of one read, since a new-line character before an MPI init sequence
+				# can only be removed while it is still in the output.
+				view = memoryview(SAMPLE_STREAM)
+				for i in range(0, len(SAMPLE_STREAM), chunkSize):
+					handler.notify(view[i:i + chunkSize])
+				handler.close(wait=True)
+				description = f"output format {outputFormat!r}, chunk size {chunkSize}"
+				self.assertEqual(bytes(handler._processed), expectedOutput, description)
+				self.assertEqual(events, SAMPLE_EVENTS, description)
+				self.assertEqual(mudReceives, IAC + DO + CHARSET, description)
+				self.assertEqual(
+					handler._mpi._commands[b"V"].mock_calls, [call(b"Some text to be viewed.\n\n")], description
+				)
+				self.assertEqual(
+					handler._mpi._commands[b"E"].mock_calls, [call(b"M12\nDescription\nbody text\r\n")], description
+				)
+
+	def testJSONLOutputOnlyContainsRecords(self):
+		handler, events, mudReceives = self.createHandler("jsonl")
+		output = handler.parse(SAMPLE_STREAM)
+		handler.close()
+		# Telnet negotiations and the text around MPI sessions are not sent to the client.
+		lines = output.split(b"\r\n")
+		self.assertEqual(lines.pop(), b"")
+		self.assertEqual(
+			[json.loads(line)["event"] for line in lines],
+			[event for dataType, (event, data) in events]
+		)
@@ -4,12 +4,14 @@
 
 
 # Built-in Modules:
-from telnetlib import IAC, DO, WILL, SB, SE, CHARSET, GA
+from telnetlib import IAC, DO, DONT, WILL, SB, SE, CHARSET, GA
 import unittest
+import zlib
 
 # Local Modules:
 from . import parseMudOutput
-from mapper.protocols.telnet import SB_ACCEPTED, SB_REQUEST, TelnetHandler
+from mapper.mapper import MUD_DATA
+from mapper.protocols.telnet import GMCP, MCCP2, REMOTE, SB_ACCEPTED, SB_REQUEST, TelnetHandler
 
 
 class TestTelnetHandler(unittest.TestCase):
@@ -47,3 +49,71 @@ class TestTelnetHandler(unittest.TestCase):
 		self.assertEqual(mudReceives, bytearray())
 		# make sure that no part of the charset negotiation was sent to the user's client.
 		self.assertEqual(clientReceives, bytearray())
+
+	def testCompression(self):
+		mudReceives = bytearray()
+		handler = TelnetHandler(remoteSender=mudReceives, promptTerminator=IAC + GA)
+		handler.compress()
+		self.assertEqual(mudReceives, bytearray(IAC + DO + MCCP2))
+		# MUME agrees. The client must not see any part of the negotiation.
+		output = bytearray()
+		handler.parseChunk(IAC + WILL + MCCP2, output.extend)
+		self.assertTrue(handler.isOptionEnabled(MCCP2, REMOTE))
+		self.assertEqual(output, bytearray())
+		text = b"<room><name>Seagull Inn</name>" + IAC + IAC + b"</room>" + IAC + GA
+		compressor = zlib.compressobj()
+		compressed = compressor.compress(text * 3) + compressor.flush()
+		# Compression starts in the middle of a chunk.
+		# The uncompressed stream resumes after the zlib stream ends.
+		stream = b"before" + IAC + SB + MCCP2 + IAC + SE + compressed + b"after"
+		expected = b"before" + (text.replace(IAC + IAC, IAC).replace(IAC + GA, b"\r\n")) * 3 + b"after"
+		for chunkSize in (1, 2, 5, 16, len(stream)):
+			handler = TelnetHandler(remoteSender=bytearray(), promptTerminator=b"\r\n")
+			handler._processed = output = bytearray()
+			for i in range(0, len(stream), chunkSize):
+				handler.parseChunk(stream[i:i + chunkSize], output.extend)
+			self.assertEqual(output, bytearray(expected), f"chunk size {chunkSize}")
+			self.assertIsNone(handler._decompressor)
+
+	def testCompressionError(self):
+		mudReceives = bytearray()
+		handler = TelnetHandler(remoteSender=mudReceives)
+		handler.parseChunk(IAC + WILL + MCCP2)
+		mudReceives.clear()
+		output = bytearray()
+		handler.parseChunk(IAC + SB + MCCP2 + IAC + SE + b"not compressed", output.extend)
+		# Corrupt data is dropped, and MUME is told to stop compressing.
+		self.assertEqual(output, bytearray())
+		self.assertIsNone(handler._decompressor)
+		self.assertEqual(mudReceives, bytearray(IAC + DONT + MCCP2))
+
+	def testGMCP(self):
+		mudReceives = bytearray()
+		events = []
+		output = bytearray()
+		handler = TelnetHandler(processed=output, remoteSender=mudReceives, eventSender=events)
+		handler.negotiateGMCP()
+		self.assertEqual(mudReceives, bytearray(IAC + DO + GMCP))
+		mudReceives.clear()
+		# When MUME agrees, the mapper says hello and lists the packages it supports.
+		handler.parseChunk(IAC + WILL + GMCP, output.extend)
+		# The client is told as well.
+		self.assertEqual(output, bytearray(IAC + WILL + GMCP))
+		output.clear()
+		self.assertEqual(
+			mudReceives,
+			bytearray(
+				IAC + SB + GMCP + b'Core.Hello {"client": "MPM", "version": "1"}' + IAC + SE
+				+ IAC + SB + GMCP + b'Core.Supports.Set ["Char 1", "Event 1", "Room 1"]' + IAC + SE
+			)
+		)
+		mudReceives.clear()
+		# Repeated agreement is not acknowledged.
+		handler.parseChunk(IAC + WILL + GMCP, output.extend)
+		self.assertEqual(mudReceives, bytearray())
+		output.clear()
+		# Messages are sent to the mapper undecoded, and forwarded to the client.
+		message = b'Room.Info {"name": "Seagull Inn", "desc": "A &lt;famous&gt; inn."}'
+		handler.parseChunk(b"text" + IAC + SB + GMCP + message + IAC + SE + b"more text", output.extend)
+		self.assertEqual(output, bytearray(b"text" + IAC + SB + GMCP + message + IAC + SE + b"more text"))
+		self.assertEqual(events, [(MUD_DATA, ("gmcp", message))])
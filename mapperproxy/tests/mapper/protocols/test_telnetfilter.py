@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from telnetlib import IAC, DO, DONT, WILL, WONT, SB, SE, NAWS, TTYPE
+import unittest
+
+# Local Modules:
+from mapper.protocols.telnet import GMCP
+from mapper.protocols.telnetfilter import TelnetFilter
+
+
+SAMPLE_INPUT = (
+	IAC + WILL + TTYPE + IAC + WILL + NAWS
+	+ b"look\r\n"
+	+ IAC + SB + NAWS + b"\x00\x50\x00\x18" + IAC + SE
+	+ b"say hello " + IAC + IAC + b" world\r\n"
+	+ b"path 1234\r\nnorth"
+	+ IAC + DONT + GMCP + IAC + SB + GMCP + b'Core.Supports.Set ["Char 1"]' + IAC + SE
+	+ IAC + WONT + TTYPE
+	+ b"\r\n" + IAC + SB + TTYPE + b"\x00VT100" + IAC + SE
+	+ b"partial line"
+)
+
+
+def parsePerByte(state, dataBytes):
+	"""
+	The reference implementation, which tracks the state of each byte in turn.
+	Commands are held back until they are complete, and those of GMCP are dropped.
+	"""
+	processed = bytearray()
+	command = state["command"]
+	for ordinal in dataBytes:
+		if state["inCommand"]:
+			command.append(ordinal)
+			if ordinal in SB:
+				state["inSubOption"] = True
+			elif not state["inSubOption"] and ordinal not in (DO + DONT + WILL + WONT) or ordinal in SE:
+				state["inCommand"] = False
+				if ordinal in SE:
+					state["inSubOption"] = False
+				elif ordinal in IAC:
+					del command[-2:]
+					state["text"].append(ordinal)
+				if command[2:3] != GMCP:
+					processed.extend(command)
+				command.clear()
+		elif ordinal in IAC:
+			command.append(ordinal)
+			state["inCommand"] = True
+		else:
+			state["text"].append(ordinal)
+	if b"\n" in state["text"]:
+		text, state["text"] = state["text"].rsplit(b"\n", 1)
+		text.extend(b"\n")
+	else:
+		text = b""
+	return bytes(processed), bytes(text)
+
+
+class TestTelnetFilter(unittest.TestCase):
+	def testParse(self):
+		handler = TelnetFilter()
+		negotiations, text = handler.parse(IAC + WILL + NAWS + b"look\r\nsay " + IAC + IAC + b"\r\nno")
+		self.assertEqual(negotiations, IAC + WILL + NAWS)
+		self.assertEqual(text, b"look\r\nsay " + IAC + b"\r\n")
+		negotiations, text = handler.parse(b"rth\r\n")
+		self.assertEqual(negotiations, b"")
+		self.assertEqual(text, b"north\r\n")
+		# Commands which are split between reads are held back until they are complete.
+		self.assertEqual(handler.parse(IAC + SB + NAWS + b"\x00\x50"), (b"", b""))
+		self.assertEqual(
+			handler.parse(b"\x00\x18" + IAC + SE), (IAC + SB + NAWS + b"\x00\x50\x00\x18" + IAC + SE, b"")
+		)
+
+	def testGMCPDropped(self):
+		# The proxy negotiates GMCP with MUME itself, so the client must not turn it off or change the packages.
+		handler = TelnetFilter()
+		negotiations, text = handler.parse(
+			IAC + DO + GMCP + IAC + DONT + GMCP + IAC + WILL + NAWS
+			+ IAC + SB + GMCP + b'Core.Supports.Set ["Char 1"]' + IAC + SE + b"look\r\n"
+		)
+		self.assertEqual(negotiations, IAC + WILL + NAWS)
+		self.assertEqual(text, b"look\r\n")
+
+	def testParseMatchesPerByteParsing(self):
+		for chunkSize in (1, 2, 3, 5, 7, 64, 4096):
+			handler = TelnetFilter()
+			state = {"inCommand": False, "inSubOption": False, "command": bytearray(), "text": bytearray()}
+			for i in range(0, len(SAMPLE_INPUT), chunkSize):
+				chunk = SAMPLE_INPUT[i:i + chunkSize]
+				self.assertEqual(
+					handler.parse(memoryview(chunk)),
+					parsePerByte(state, chunk),
+					f"chunk size {chunkSize}, offset {i}"
+				)
@@ -0,0 +1,100 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+
+# Local Modules:
+from mapper.mapper import MUD_DATA
+from mapper.protocols.xml import JSONLXMLHandler, RawXMLHandler, createXMLHandler
+from mapper.utils import EventText
+
+
+class TestXMLHandler(unittest.TestCase):
+	def parseInChunks(self, dataBytes, chunkSize, outputFormat="normal"):
+		processed = bytearray()
+		events = []
+		handler = createXMLHandler(processed=processed, eventSender=events, outputFormat=outputFormat)
+		for i in range(0, len(dataBytes), chunkSize):
+			handler.parseChunk(memoryview(dataBytes)[i:i + chunkSize])
+		return bytes(processed), events
+
+	def testDecodeOnce(self):
+		name = "Café &amp;lt;Inn&gt;"
+		dataBytes = (
+			b"<room><name>" + name.encode("utf-8") + b"</name></room>"
+			+ "\x1b[32mGandalf — tells you &apos;hi&apos; &amp;amp;\x1b[0m\r\n".encode("utf-8")
+		)
+		for chunkSize in range(1, 8):
+			output, events = self.parseInChunks(dataBytes, chunkSize)
+			description = f"chunk size {chunkSize}"
+			# Entities and multi-byte characters which are split between chunks are only unescaped once.
+			self.assertEqual(
+				output,
+				"Café &lt;Inn>\x1b[32mGandalf — tells you &apos;hi&apos; &amp;\x1b[0m\r\n".encode("utf-8"),
+				description
+			)
+			self.assertEqual(
+				events,
+				[
+					(MUD_DATA, ("name", "Café &lt;Inn>")),
+					(MUD_DATA, ("dynamic", "")),
+					(MUD_DATA, ("line", "\x1b[32mGandalf — tells you &apos;hi&apos; &amp;\x1b[0m"))
+				],
+				description
+			)
+			line = events[-1][1][1]
+			self.assertIsInstance(line, EventText)
+			self.assertEqual(line.plain, "Gandalf — tells you &apos;hi&apos; &amp;")
+
+	def testRawOutputIsNotUnescaped(self):
+		dataBytes = b"<prompt>&lt;&amp;&gt;</prompt>"
+		output, events = self.parseInChunks(dataBytes, 3, outputFormat="raw")
+		self.assertIsInstance(createXMLHandler(outputFormat="raw"), RawXMLHandler)
+		self.assertEqual(output, dataBytes)
+		self.assertEqual(events, [(MUD_DATA, ("prompt", "<&>"))])
+
+	def testLatin1Fallback(self):
+		output, events = self.parseInChunks(b"Caf\xe9\r\n", 2)
+		self.assertEqual(output, b"Caf\xe9\r\n")
+		self.assertEqual(events, [(MUD_DATA, ("line", "Café"))])
+
+	def testAmpersandBeforeTag(self):
+		# An ampersand which is held back as the possible start of an entity is output before the tag.
+		output, events = self.parseInChunks(b"a &<prompt>></prompt>", 3, outputFormat="tintin")
+		self.assertEqual(output, b"a &PROMPT:>:PROMPT")
+
+	def testJSONLines(self):
+		dataBytes = (
+			b"<movement dir=up/><room><name>Inn &amp; Tavern</name></room>"
+			+ b"Gandalf \xe2\x80\x94 tells you 'hi'\r\n"
+		)
+		for chunkSize in (1, 4, 64):
+			output, events = self.parseInChunks(dataBytes, chunkSize, outputFormat="jsonl")
+			self.assertEqual(
+				output,
+				b'{"event": "movement", "data": "up"}\r\n'
+				+ b'{"event": "name", "data": "Inn & Tavern"}\r\n'
+				+ b'{"event": "dynamic", "data": ""}\r\n'
+				+ b'{"event": "line", "data": "Gandalf \\u2014 tells you \'hi\'"}\r\n',
+				f"chunk size {chunkSize}"
+			)
+			# The mapper receives the same events as it would with any other output format.
+			self.assertEqual(events, self.parseInChunks(dataBytes, chunkSize)[1])
+		self.assertIsInstance(createXMLHandler(outputFormat="jsonl"), JSONLXMLHandler)
+
+	def testChannels(self):
+		dataBytes = b"<tell>Gandalf tells you 'hi &amp; bye'</tell>\r\n<narrate>Bilbo narrates 'hi'</narrate>\r\n"
+		output, events = self.parseInChunks(dataBytes, 5)
+		self.assertEqual(output, b"Gandalf tells you 'hi & bye'\r\nBilbo narrates 'hi'\r\n")
+		self.assertEqual(
+			events,
+			[
+				(MUD_DATA, ("tell", "Gandalf tells you 'hi & bye'")),
+				(MUD_DATA, ("line", "Gandalf tells you 'hi & bye'")),
+				(MUD_DATA, ("narrate", "Bilbo narrates 'hi'")),
+				(MUD_DATA, ("line", "Bilbo narrates 'hi'"))
+			]
+		)
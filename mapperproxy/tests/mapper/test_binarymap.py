@@ -0,0 +1,162 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Local Modules:
+from mapper.roomdata import database
+from mapper.roomdata.binarymap import BinaryMap, MappedRoom, dumpBinaryRooms
+from mapper.world import World
+
+
+ROOMS = {
+	"0": {
+		"name": "Inside the Prancing Pony",
+		"desc": "A common room.\n",
+		"dynamicDesc": "Butterbur is here.\n",
+		"note": "",
+		"terrain": "indoors",
+		"light": "lit",
+		"align": "undefined",
+		"portable": "portable",
+		"ridable": "notridable",
+		"avoid": False,
+		"mobFlags": ["rent", "shop"],
+		"loadFlags": [],
+		"x": 0,
+		"y": 0,
+		"z": 0,
+		"exits": {
+			"west": {"to": "1", "door": "", "exitFlags": ["exit"], "doorFlags": []}
+		}
+	},
+	"1": {
+		"name": "Bree Streets",
+		"desc": "A street in Bree.\n",
+		"dynamicDesc": "",
+		"note": "Señor",
+		"terrain": "road",
+		"light": "undefined",
+		"align": "undefined",
+		"portable": "undefined",
+		"ridable": "ridable",
+		"avoid": True,
+		"mobFlags": [],
+		"loadFlags": ["pack_horse"],
+		"x": -1,
+		"y": 0,
+		"z": 0,
+		"exits": {
+			"east": {"to": "0", "door": "door", "exitFlags": ["door", "exit"], "doorFlags": ["need_key"]},
+			"down": {"to": "undefined", "door": "", "exitFlags": ["exit"], "doorFlags": []}
+		}
+	}
+}
+
+
+class TestBinaryMap(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.filePath = os.path.join(self.directory, "arda.bin")
+		dumpBinaryRooms(ROOMS, self.filePath)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def testRoundTrip(self):
+		binaryMap = BinaryMap(self.filePath)
+		self.assertEqual(dict(binaryMap.getRoomDicts()), ROOMS)
+		binaryMap.close()
+
+	def testMappedRoom(self):
+		binaryMap = BinaryMap(self.filePath)
+		room = list(binaryMap.getRooms())[1]
+		self.assertIsInstance(room, MappedRoom)
+		self.assertEqual(room.vnum, "1")
+		self.assertNotIn("note", vars(room))
+		self.assertEqual(room.note, "Señor")
+		self.assertIn("note", vars(room))
+		self.assertEqual((room.x, room.avoid, room.loadFlags), (-1, True, {"pack_horse"}))
+		self.assertEqual(room.cost, 1000.85)
+		self.assertEqual(room.exits["east"].doorFlags, {"need_key"})
+		self.assertEqual(room.exits["east"].vnum, "1")
+		room.note = "Changed"
+		self.assertEqual(room.note, "Changed")
+		attributes = room.attributes()
+		self.assertEqual((attributes["name"], attributes["note"]), ("Bree Streets", "Changed"))
+		self.assertNotIn("_binaryMap", attributes)
+		with self.assertRaises(AttributeError):
+			room.nonexistent
+		binaryMap.close()
+		self.assertEqual(room.note, "Changed")
+		with self.assertRaises(AttributeError):
+			room.nonexistent
+
+	def testInvalidFiles(self):
+		filePath = os.path.join(self.directory, "arda.json")
+		with open(filePath, "w") as fileObj:
+			json.dump(ROOMS, fileObj)
+		with self.assertRaises(ValueError):
+			BinaryMap(filePath)
+		with open(self.filePath, "rb") as fileObj:
+			data = fileObj.read()
+		with open(self.filePath, "wb") as fileObj:
+			fileObj.write(data[:100])
+		with self.assertRaises(ValueError):
+			BinaryMap(self.filePath)
+
+	def testConvertMap(self):
+		jsonPath = os.path.join(self.directory, "arda.json")
+		self.assertIsNone(database.convertMap(self.filePath, jsonPath))
+		with open(jsonPath, "rb") as fileObj:
+			self.assertEqual(json.loads(fileObj.read().decode("utf-8")), ROOMS)
+		# Values of older maps are replaced when converting to binary.
+		legacyRooms = json.loads(json.dumps(ROOMS))
+		legacyRooms["1"]["terrain"] = "random"
+		legacyRooms["1"]["exits"]["east"]["doorFlags"] = ["needkey"]
+		del legacyRooms["0"]["avoid"]
+		with open(jsonPath, "w") as fileObj:
+			json.dump(legacyRooms, fileObj)
+		binaryPath = os.path.join(self.directory, "converted.bin")
+		self.assertIsNone(database.convertMap(jsonPath, binaryPath))
+		binaryMap = BinaryMap(binaryPath)
+		rooms = dict(binaryMap.getRoomDicts())
+		binaryMap.close()
+		self.assertEqual(rooms["1"]["terrain"], "undefined")
+		self.assertEqual(rooms["1"]["exits"]["east"]["doorFlags"], ["need_key"])
+		self.assertFalse(rooms["0"]["avoid"])
+		self.assertIsNotNone(database.convertMap(os.path.join(self.directory, "nonexistent.json")))
+
+	def testWorld(self):
+		jsonPath = os.path.join(self.directory, "arda.json")
+		with patch.object(database, "BINARY_MAP_FILE_PATH", self.filePath), patch.object(
+			database, "MAP_FILE_PATH", jsonPath
+		), patch.object(World, "loadLabels"):
+			world = World(interface="text")
+			self.assertIsInstance(world.rooms["0"], MappedRoom)
+			self.assertEqual(world.getIncomingExits("0"), {("1", "east")})
+			self.assertEqual([obj.vnum for obj in world.getRoomsFromCoordinates((-1, 0, 0))], ["1"])
+			self.assertNotIn("dynamicDesc", vars(world.rooms["0"]))
+			world.updateRoom(world.rooms["0"], note="Barliman's inn")
+			world.saveRooms()
+			# Every room was decoded when saving, so the world can still be used after the map is closed.
+			roomObj = world.rooms["1"]
+			self.assertEqual((roomObj.note, roomObj.cost), ("Señor", 1000.85))
+			self.assertEqual(roomObj.exits["east"].doorFlags, {"need_key"})
+			self.assertFalse(hasattr(roomObj, "nonexistent"))
+			world.updateRoom(roomObj, note="A street")
+			self.assertEqual([obj.vnum for obj in world.getRoomsFromName("Bree Streets")], ["1"])
+			world.saveRooms()
+		binaryMap = BinaryMap(self.filePath)
+		rooms = dict(binaryMap.getRoomDicts())
+		binaryMap.close()
+		self.assertEqual(rooms["0"]["note"], "Barliman's inn")
+		self.assertEqual(rooms["1"], dict(ROOMS["1"], note="A street"))
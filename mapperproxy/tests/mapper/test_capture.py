@@ -0,0 +1,55 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import os
+import tempfile
+import unittest
+
+# Local Modules:
+from mapper.capture import CAPTURE_MAGIC, FROM_CLIENT, FROM_SERVER, CaptureError, SessionRecorder, readCapture
+
+
+class TestCapture(unittest.TestCase):
+	def setUp(self):
+		fileDescriptor, self.fileName = tempfile.mkstemp(prefix="mume_capture_")
+		os.close(fileDescriptor)
+
+	def tearDown(self):
+		os.remove(self.fileName)
+
+	def testRecordAndRead(self):
+		recorder = SessionRecorder(self.fileName)
+		recorder.record(FROM_SERVER, b"<prompt>>")
+		recorder.record(FROM_CLIENT, memoryview(b"look\r\n"))
+		recorder.record(FROM_SERVER, b"")
+		recorder.close()
+		# Recording after the capture is closed is ignored.
+		recorder.record(FROM_SERVER, b"ignored")
+		records = list(readCapture(self.fileName))
+		self.assertEqual(
+			[(direction, data) for timestamp, direction, data in records],
+			[(FROM_SERVER, b"<prompt>>"), (FROM_CLIENT, b"look\r\n"), (FROM_SERVER, b"")]
+		)
+		timestamps = [timestamp for timestamp, direction, data in records]
+		self.assertEqual(timestamps, sorted(timestamps))
+		self.assertGreaterEqual(timestamps[0], 0)
+
+	def testTruncatedCapture(self):
+		recorder = SessionRecorder(self.fileName)
+		recorder.record(FROM_SERVER, b"complete")
+		recorder.record(FROM_SERVER, b"truncated")
+		recorder.close()
+		with open(self.fileName, "r+b") as fileObj:
+			fileObj.truncate(os.path.getsize(self.fileName) - 1)
+		with self.assertLogs("mapper.capture", "WARNING"):
+			records = list(readCapture(self.fileName))
+		self.assertEqual([data for timestamp, direction, data in records], [b"complete"])
+
+	def testInvalidCapture(self):
+		with open(self.fileName, "wb") as fileObj:
+			fileObj.write(b"not" + CAPTURE_MAGIC)
+		with self.assertRaises(CaptureError):
+			list(readCapture(self.fileName))
@@ -0,0 +1,56 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import codecs
+import os.path
+import shutil
+import tempfile
+import unittest
+
+# Local Modules:
+from mapper.channellog import ChannelLog
+
+
+class TestChannelLog(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directory)
+
+	def read(self, name):
+		with codecs.open(os.path.join(self.directory, name), "rb", encoding="utf-8") as fileObj:
+			return fileObj.read()
+
+	def testLog(self):
+		with codecs.open(os.path.join(self.directory, "tells.txt"), "wb", encoding="utf-8") as fileObj:
+			fileObj.write("Bilbo tells you 'old'\n")
+		channelLog = ChannelLog(self.directory, flushInterval=60.0)
+		channelLog.start()
+		channelLog.log("tell", "Gandalf tells you 'hi'")
+		channelLog.log("say", "Frodo says 'hi'")
+		channelLog.log("emote", "Sam smiles.")
+		# The tails are updated before the messages are written, and include the existing messages.
+		self.assertEqual(channelLog.tail("tells"), ["Bilbo tells you 'old'", "Gandalf tells you 'hi'"])
+		self.assertEqual(channelLog.tail("says", 1), ["Sam smiles."])
+		self.assertEqual(channelLog.tail("prays", 5), [])
+		channelLog.close()
+		# The waiting messages are written in one batch when the log is closed.
+		self.assertEqual(channelLog.batches, 1)
+		self.assertEqual(self.read("tells.txt"), "Bilbo tells you 'old'\nGandalf tells you 'hi'\n")
+		self.assertEqual(self.read("says.txt"), "Frodo says 'hi'\nSam smiles.\n")
+		channelLog.log("tell", "Ignored after closing.")
+		self.assertEqual(channelLog.written, 3)
+
+	def testRotation(self):
+		channelLog = ChannelLog(self.directory, maxBytes=10, backupCount=2, tailLength=2)
+		for i in range(4):
+			channelLog.log("narrate", f"message {i}")
+			channelLog._write(channelLog._pending)
+			channelLog._pending = []
+		channelLog.close()
+		self.assertEqual(self.read("narrates.1.txt"), "message 3\n")
+		self.assertEqual(self.read("narrates.2.txt"), "message 2\n")
+		self.assertFalse(os.path.exists(os.path.join(self.directory, "narrates.3.txt")))
+		self.assertEqual(channelLog.tail("narrates"), ["message 2", "message 3"])
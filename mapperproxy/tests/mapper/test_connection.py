@@ -0,0 +1,125 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import os.path
+import socket
+import ssl
+import threading
+import unittest
+
+# Local Modules:
+from mapper.connection import ServerConnection
+
+
+class TestServerConnection(unittest.TestCase):
+	def setUp(self):
+		self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.listener.bind(("127.0.0.1", 0))
+		self.listener.listen(2)
+		self.listener.settimeout(5.0)
+		self.host, self.port = self.listener.getsockname()
+		self.connection = ServerConnection(self.host, self.port, timeout=5.0)
+
+	def tearDown(self):
+		self.connection.close()
+		self.listener.close()
+
+	def accept(self):
+		remote, address = self.listener.accept()
+		self.addCleanup(remote.close)
+		remote.settimeout(5.0)
+		return remote
+
+	def testPreConnect(self):
+		self.connection.startConnecting()
+		self.assertTrue(self.connection.waitConnected(5.0))
+		self.assertEqual(self.connection.connectionCount, 1)
+		self.assertIsNone(self.connection.error)
+		remote = self.accept()
+		self.connection.sendall(b"look\r\n")
+		self.assertEqual(remote.recv(4096), b"look\r\n")
+		remote.sendall(b"<prompt>>")
+		buffer = bytearray(4096)
+		self.assertEqual(buffer[:self.connection.recv_into(buffer)], b"<prompt>>")
+
+	def testConnectionRefused(self):
+		self.listener.close()
+		self.assertFalse(self.connection.waitConnected(5.0))
+		self.assertIsInstance(self.connection.error, ConnectionError)
+		self.assertIsNone(self.connection.currentSocket)
+		with self.assertRaises(ConnectionError):
+			self.connection.recv_into(bytearray(1))
+
+	def testReconnect(self):
+		self.assertTrue(self.connection.waitConnected(5.0))
+		self.accept().close()
+		self.assertTrue(self.connection.reconnect(attempts=3, initialDelay=0.01))
+		self.assertEqual(self.connection.connectionCount, 2)
+		remote = self.accept()
+		self.connection.sendall(b"look\r\n")
+		self.assertEqual(remote.recv(4096), b"look\r\n")
+
+	def testReconnectGivesUp(self):
+		self.assertTrue(self.connection.waitConnected(5.0))
+		self.listener.close()
+		self.assertFalse(self.connection.reconnect(attempts=3, initialDelay=0.01, maxDelay=0.02))
+		self.assertEqual(self.connection.connectionCount, 1)
+		self.assertIsInstance(self.connection.error, ConnectionError)
+		# Data sent while disconnected is dropped, until the connection is closed.
+		self.connection.sendall(b"look\r\n")
+		self.connection.close()
+		with self.assertRaises(ConnectionError):
+			self.connection.sendall(b"look\r\n")
+		self.assertFalse(self.connection.reconnect(attempts=3, initialDelay=0.01))
+
+
+class TestTLSServerConnection(unittest.TestCase):
+	def setUp(self):
+		certificate = os.path.join(os.path.dirname(__file__), "localhost.pem")
+		self.serverContext = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+		self.serverContext.load_cert_chain(certificate)
+		clientContext = ssl.create_default_context(cafile=certificate)
+		self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.listener.bind(("127.0.0.1", 0))
+		self.listener.listen(2)
+		self.listener.settimeout(5.0)
+		self.host, self.port = self.listener.getsockname()
+		self.connection = ServerConnection(
+			self.host, self.port, sslContext=clientContext, serverHostname="localhost", timeout=5.0
+		)
+		self.serverThread = threading.Thread(target=self.serve, args=(2,))
+		self.serverThread.daemon = True
+		self.serverThread.start()
+
+	def tearDown(self):
+		self.connection.close()
+		self.serverThread.join(5.0)
+		self.listener.close()
+
+	def serve(self, count):
+		# Greet each client, then wait for it to disconnect.
+		for i in range(count):
+			try:
+				remote, address = self.listener.accept()
+			except EnvironmentError:
+				return
+			remote.settimeout(5.0)
+			try:
+				with self.serverContext.wrap_socket(remote, server_side=True) as tlsRemote:
+					tlsRemote.sendall(b"Welcome")
+					while tlsRemote.recv(4096):
+						pass
+			except EnvironmentError:
+				pass
+
+	def testSessionReused(self):
+		self.assertTrue(self.connection.waitConnected(5.0))
+		self.assertFalse(self.connection.sessionReused)
+		buffer = bytearray(4096)
+		self.assertEqual(buffer[:self.connection.recv_into(buffer)], b"Welcome")
+		self.assertTrue(self.connection.reconnect(attempts=3, initialDelay=0.01))
+		self.assertTrue(self.connection.sessionReused)
+		self.assertEqual(buffer[:self.connection.recv_into(buffer)], b"Welcome")
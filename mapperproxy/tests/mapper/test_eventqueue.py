@@ -0,0 +1,93 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+from queue import Empty
+import threading
+import unittest
+
+# Local Modules:
+from mapper.eventqueue import EVENT_LANE, LINE_LANE, USER_LANE, EventQueue
+from mapper.mapper import MUD_DATA, USER_DATA
+
+
+class TestEventQueue(unittest.TestCase):
+	def testOrder(self):
+		queue = EventQueue()
+		items = [
+			(MUD_DATA, ("line", b"Welcome to MUME")),
+			(MUD_DATA, ("name", b"Seagull Inn")),
+			(MUD_DATA, ("line", b"A white-painted bench is here.")),
+			(USER_DATA, b"rinfo"),
+			(MUD_DATA, ("prompt", b">")),
+			(None, None),
+			(USER_DATA, b"stop")
+		]
+		for item in items:
+			queue.put(item)
+		self.assertEqual(queue.qsize(), len(items))
+		# User commands come first, then the data from MUME in the order it was received.
+		self.assertEqual(
+			[queue.get() for item in items],
+			[items[3], items[6], items[0], items[1], items[2], items[4], items[5]]
+		)
+		self.assertTrue(queue.empty())
+		with self.assertRaises(Empty):
+			queue.get_nowait()
+		with self.assertRaises(Empty):
+			queue.get(timeout=0.01)
+		self.assertEqual(queue.queued, [2, 3, 2])
+		self.assertEqual(queue.waitTimes[LINE_LANE].count, 2)
+
+	def testDropUnneededLines(self):
+		queue = EventQueue(isLineNeeded=lambda data: data.startswith(b"You quietly scout "), lineLimit=2)
+		for i in range(5):
+			queue.put((MUD_DATA, ("line", b"Spam %d" % i)))
+		queue.put((MUD_DATA, ("line", b"You quietly scout north.")))
+		queue.put((MUD_DATA, ("prompt", b">")))
+		self.assertEqual(
+			[queue.get_nowait() for i in range(3)],
+			[
+				(MUD_DATA, ("line", b"Spam 4")),
+				(MUD_DATA, ("line", b"You quietly scout north.")),
+				(MUD_DATA, ("prompt", b">"))
+			]
+		)
+		self.assertTrue(queue.empty())
+		self.assertEqual(queue.dropped, [0, 0, 4])
+		self.assertEqual(queue.queued, [0, 1, 6])
+		self.assertEqual(queue.maxDepth, [0, 1, 6])
+		self.assertIn("Dropped", queue.report())
+		queue.reset()
+		self.assertEqual(queue.dropped, [0, 0, 0])
+		self.assertEqual(queue.waitTimes[EVENT_LANE].count, 0)
+		self.assertEqual(queue.queued[USER_LANE], 0)
+
+	def testDropDecidedByGetter(self):
+		# Lines are only tested by the thread which takes them, never by the threads which queue them.
+		threads = []
+
+		def isLineNeeded(data):
+			threads.append(threading.current_thread())
+			return False
+
+		queue = EventQueue(isLineNeeded=isLineNeeded, lineLimit=1)
+		putter = threading.Thread(
+			target=lambda: [queue.put((MUD_DATA, ("line", b"Spam %d" % i))) for i in range(3)]
+		)
+		putter.start()
+		putter.join()
+		self.assertEqual(threads, [])
+		self.assertEqual(queue.get_nowait(), (MUD_DATA, ("line", b"Spam 2")))
+		self.assertEqual(threads, [threading.current_thread()] * 2)
+		with self.assertRaises(Empty):
+			queue.get(timeout=0.01)
+
+	def testBlockingGet(self):
+		queue = EventQueue()
+		timer = threading.Timer(0.01, queue.put, args=((USER_DATA, b"stop"),))
+		timer.start()
+		self.assertEqual(queue.get(timeout=5), (USER_DATA, b"stop"))
+		timer.join()
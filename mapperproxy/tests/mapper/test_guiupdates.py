@@ -0,0 +1,50 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+from unittest.mock import Mock
+
+# Local Modules:
+from mapper.guiupdates import GUIUpdate, GUIUpdateChannel
+
+
+class TestGUIUpdateChannel(unittest.TestCase):
+	def setUp(self):
+		self.waker = Mock()
+		self.channel = GUIUpdateChannel(waker=self.waker)
+
+	def testCoalescing(self):
+		self.assertIsNone(self.channel.take())
+		for room in range(50):
+			self.channel.sync(room)
+			self.channel.refresh()
+		# The GUI is only woken once, however many updates are posted before it takes them.
+		self.waker.assert_called_once_with()
+		self.assertTrue(self.channel.dirty)
+		self.assertEqual(self.channel.take(), GUIUpdate(synced=True, room=49, refresh=True, close=False))
+		self.assertFalse(self.channel.dirty)
+		self.assertIsNone(self.channel.take())
+		self.assertEqual(self.channel.posted, 100)
+		self.assertEqual(self.channel.coalesced, 99)
+		self.channel.refresh()
+		self.assertEqual(self.waker.call_count, 2)
+		self.assertEqual(self.channel.take(), GUIUpdate(synced=False, room=None, refresh=True, close=False))
+		# Syncing to None is kept, unlike not syncing at all.
+		self.channel.sync(None)
+		self.assertEqual(self.channel.take(), GUIUpdate(synced=True, room=None, refresh=False, close=False))
+		self.channel.close()
+		self.assertTrue(self.channel.take().close)
+
+	def testSetWaker(self):
+		channel = GUIUpdateChannel()
+		channel.sync("room")
+		waker = Mock()
+		# Updates posted before the GUI was ready wake it as soon as it sets the waker.
+		channel.setWaker(waker)
+		waker.assert_called_once_with()
+		channel.take()
+		channel.setWaker(self.waker)
+		self.waker.assert_not_called()
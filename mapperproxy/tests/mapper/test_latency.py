@@ -0,0 +1,60 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+from unittest.mock import patch
+
+# Local Modules:
+from mapper.latency import LatencyHistogram, LatencyTracker
+
+
+class TestLatencyHistogram(unittest.TestCase):
+	def testPercentiles(self):
+		histogram = LatencyHistogram()
+		self.assertEqual(histogram.percentile(50), 0)
+		# Record latencies of 1 to 1000 milliseconds.
+		for milliseconds in range(1, 1001):
+			histogram.record(milliseconds / 1000)
+		self.assertEqual(histogram.count, 1000)
+		self.assertEqual(histogram.maximum, 1000000)
+		for percent in (50, 95, 99, 100):
+			expected = percent / 100
+			# Values are recorded to within 1 part in 64.
+			self.assertAlmostEqual(histogram.percentile(percent), expected, delta=expected / 64)
+			self.assertGreaterEqual(histogram.percentile(percent), expected)
+		histogram.reset()
+		self.assertEqual(histogram.count, 0)
+		self.assertEqual(histogram.percentile(99), 0)
+
+	def testSmallValuesAreExact(self):
+		histogram = LatencyHistogram()
+		for microseconds in (0, 1, 5, 127):
+			histogram.record(microseconds / 1000000)
+		self.assertEqual(histogram.percentile(25), 0)
+		self.assertEqual(histogram.percentile(50), 1 / 1000000)
+		self.assertEqual(histogram.percentile(75), 5 / 1000000)
+		self.assertEqual(histogram.percentile(100), 127 / 1000000)
+
+
+class TestLatencyTracker(unittest.TestCase):
+	@patch("mapper.latency.default_timer")
+	def testPromptStages(self, mockTimer):
+		tracker = LatencyTracker()
+		mockTimer.return_value = 1.002
+		tracker.promptQueued(receivedTime=1.0)
+		mockTimer.return_value = 1.005
+		token = tracker.promptDequeued()
+		mockTimer.return_value = 1.015
+		tracker.promptHandled(token)
+		for stage, expected in (("enqueue", 0.002), ("queue", 0.003), ("handler", 0.010), ("total", 0.015)):
+			histogram = tracker.histograms[stage]
+			self.assertEqual(histogram.count, 1, stage)
+			self.assertAlmostEqual(histogram.percentile(50), expected, delta=expected / 64, msg=stage)
+		# A prompt which was not queued by the server isn't tracked.
+		self.assertIsNone(tracker.promptDequeued())
+		self.assertIn("total", tracker.report())
+		tracker.reset()
+		self.assertEqual(sum(histogram.count for histogram in tracker.histograms.values()), 0)
@@ -4,17 +4,20 @@
 
 
 # Built-in Modules:
+import asyncio
 import socket
 from queue import Empty, Queue
 from telnetlib import CHARSET, GA, IAC, DO, NAWS, SB, SE, TTYPE, WILL
+import threading
+import time
 import unittest
 from unittest.mock import call, Mock
 
 # Local Modules:
-from mapper.main import Server
-from mapper.mapper import MUD_DATA
+from mapper.main import ClientGroup, ClientWriter, Proxy, Server, TransportSocket, runAsync
+from mapper.mapper import MUD_DATA, USER_DATA
 from mapper.protocols.mpi import MPI_INIT
-from mapper.protocols.telnet import SB_ACCEPTED, SB_SEND
+from mapper.protocols.telnet import GMCP, MCCP2, SB_ACCEPTED, SB_SEND
 
 
 # The initial output of MUME. Used by the server thread to detect connection success.
@@ -35,7 +38,13 @@ class TestServerThread(unittest.TestCase):
 		mumeSocket = Mock(spec=socket.socket)
 		outputFromMume = Queue()
 		inputToMume = Queue()
-		mumeSocket.recv.side_effect = lambda arg: outputFromMume.get()
+
+		def mumeRecvInto(buffer):
+			data = outputFromMume.get()
+			buffer[:len(data)] = data
+			return len(data)
+
+		mumeSocket.recv_into.side_effect = mumeRecvInto
 		mumeSocket.sendall.side_effect = lambda data: inputToMume.put(data)
 		clientSocket = Mock(spec=socket.socket)
 		outputToUser = Queue()
@@ -57,6 +66,10 @@ class TestServerThread(unittest.TestCase):
 		try:
 			# Expect IAC + WILL + CHARSET, even though it's not in initialConfiguration.
 			initialConfiguration.append(IAC + WILL + CHARSET)
+			# And a request for MUME to compress its output.
+			initialConfiguration.append(IAC + DO + MCCP2)
+			# And a request for MUME to send GMCP messages.
+			initialConfiguration.append(IAC + DO + GMCP)
 			while initialConfiguration:
 				data = inputToMume.get(timeout=1)
 				self.assertIn(data, initialConfiguration, "Unknown initial configuration: {!r}".format(data))
@@ -113,6 +126,44 @@ class TestServerThread(unittest.TestCase):
 		serverThread.join(1)
 		self.assertFalse(serverThread.is_alive())
 
+	def testServerThreadReconnect(self):
+		mumeSocket = Mock()
+		outputFromMume = Queue()
+
+		def mumeRecvInto(buffer):
+			data = outputFromMume.get()
+			if isinstance(data, Exception):
+				raise data
+			buffer[:len(data)] = data
+			return len(data)
+
+		mumeSocket.recv_into.side_effect = mumeRecvInto
+		mumeSocket.reconnect.side_effect = [True, False]
+		clientSocket = Mock(spec=socket.socket)
+		serverThread = Server(
+			client=clientSocket,
+			server=mumeSocket,
+			mapper=Mock(),
+			outputFormat=None,
+			interface="text",
+			promptTerminator=None,
+			reconnect=True
+		)
+		serverThread.daemon = True
+		serverThread.start()
+		outputFromMume.put(INITIAL_OUTPUT)
+		# When the connection is lost, the initial configuration is sent again on the new connection.
+		outputFromMume.put(ConnectionResetError())
+		outputFromMume.put(INITIAL_OUTPUT)
+		# When reconnecting fails, the server thread closes.
+		outputFromMume.put(ConnectionResetError())
+		serverThread.join(1)
+		self.assertFalse(serverThread.is_alive())
+		self.assertEqual(mumeSocket.reconnect.call_count, 2)
+		self.assertEqual(mumeSocket.sendall.call_args_list.count(call(MPI_INIT + b"I\n")), 2)
+		clientSocket.sendall.assert_any_call(b"\r\nLost the connection to MUME. Reconnecting.\r\n")
+		clientSocket.sendall.assert_called_with(b"\r\nError: unable to reconnect to MUME.\r\n")
+
 
 class TestServerThreadThroughput(unittest.TestCase):
 	def setUp(self):
@@ -156,7 +207,7 @@ class TestServerThreadThroughput(unittest.TestCase):
 			threadInput=b"<prompt>\x1b[34mMana:Hot Move:Tired>\x1b[0m</prompt>" + IAC + GA,
 			expectedOutput=b"\x1b[34mMana:Hot Move:Tired>\x1b[0m\r\n",
 			expectedData=[
-				call((MUD_DATA, ("prompt", b"\x1b[34mMana:Hot Move:Tired>\x1b[0m")))
+				call((MUD_DATA, ("prompt", "\x1b[34mMana:Hot Move:Tired>\x1b[0m")))
 			],
 			inputDescription="prompt with mana burning and moves tired"
 		)
@@ -198,10 +249,214 @@ class TestServerThreadThroughput(unittest.TestCase):
 			+ b"An elven lamplighter is resting here.\r\n"
 		)
 		expectedData = [
-			call((MUD_DATA, ("movement", b"down"))),
-			call((MUD_DATA, ("name", b"Seagull Inn"))),
-			call((MUD_DATA, ("description", expectedDesc))),
-			call((MUD_DATA, ("dynamic", expectedDynamicDesc))),
+			call((MUD_DATA, ("movement", "down"))),
+			call((MUD_DATA, ("name", "Seagull Inn"))),
+			call((MUD_DATA, ("description", expectedDesc.decode("us-ascii")))),
+			call((MUD_DATA, ("dynamic", expectedDynamicDesc.decode("us-ascii")))),
 		]
 		inputDescription = "moving into a room"
 		self.runThroughput(threadInput, expectedOutput, expectedData, inputDescription)
+
+
+class TestProxy(unittest.TestCase):
+	def testHandleClientData(self):
+		server = Mock()
+		mapper = Mock()
+		mapper.user_command_path = Mock()
+		proxy = Proxy(client=Mock(), server=server, mapper=mapper, isEmulatingOffline=False)
+		# Text which doesn't begin with a mapper command is sent to MUME unmodified.
+		for data in (b"look\r\n", b"  \r\n", b"say path\r\n", b"pathfinder\r\n", IAC + WILL + NAWS):
+			proxy.handleClientData(data)
+			server.sendall.assert_called_with(data)
+		mapper.queue.put.assert_not_called()
+		server.sendall.reset_mock()
+		# Mapper commands are sent to the mapper, and any negotiations are still sent to MUME.
+		proxy.handleClientData(IAC + WILL + NAWS + b" path 1234\r\n")
+		mapper.queue.put.assert_called_once_with((USER_DATA, b" path 1234\r\n"))
+		server.sendall.assert_called_once_with(IAC + WILL + NAWS)
+
+	def testWriteErrors(self):
+		server = Mock()
+		server.sendall.side_effect = ConnectionError
+		# While reconnection is enabled, data which can't be sent to MUME is dropped.
+		proxy = Proxy(client=Mock(), server=server, mapper=Mock(), isEmulatingOffline=False, reconnect=True)
+		self.assertFalse(proxy.write(b"look\r\n"))
+		self.assertFalse(proxy.finished.isSet())
+		server.sendall.side_effect = None
+		self.assertTrue(proxy.write(b"look\r\n"))
+		server.sendall.side_effect = ConnectionError
+		proxy = Proxy(client=Mock(), server=server, mapper=Mock(), isEmulatingOffline=False)
+		self.assertFalse(proxy.write(b"look\r\n"))
+		self.assertTrue(proxy.finished.isSet())
+
+
+class TestAsyncEngine(unittest.TestCase):
+	def receive(self, connection, length):
+		data = b""
+		while len(data) < length:
+			received = connection.recv(length - len(data))
+			if not received:
+				break
+			data += received
+		return data
+
+	def testAsyncEngine(self):
+		clientConnection, userConnection = socket.socketpair()
+		serverConnection, mumeConnection = socket.socketpair()
+		userConnection.settimeout(1)
+		mumeConnection.settimeout(1)
+		loop = asyncio.new_event_loop()
+		clientSocket = TransportSocket(loop)
+		serverSocket = TransportSocket(loop)
+		mapper = Mock()
+		mapper.queue = Queue()
+		mapper.user_command_path = Mock()
+		handledItems = Queue()
+		mapper.handleQueueItem.side_effect = lambda *args: handledItems.put(args)
+		proxy = Proxy(client=clientSocket, server=serverSocket, mapper=mapper, isEmulatingOffline=False)
+		server = Server(
+			client=clientSocket,
+			server=serverSocket,
+			mapper=mapper,
+			outputFormat="normal",
+			interface="text",
+			promptTerminator=None
+		)
+		coroutine = runAsync(
+			clientConnection, serverConnection, clientSocket, serverSocket, mapper, proxy, server, useSsl=False
+		)
+		loopThread = threading.Thread(target=loop.run_until_complete, args=(coroutine,), daemon=True)
+		loopThread.start()
+		try:
+			# test the initial configuration is sent to MUME, and the initial output is passed to the user.
+			mumeConnection.sendall(INITIAL_OUTPUT + WELCOME_MESSAGE)
+			expectedConfiguration = (
+				b"".join(server.initialConfiguration) + IAC + WILL + CHARSET + IAC + DO + MCCP2 + IAC + DO + GMCP
+			)
+			self.assertEqual(self.receive(mumeConnection, len(expectedConfiguration)), expectedConfiguration)
+			expectedOutput = INITIAL_OUTPUT + WELCOME_MESSAGE
+			self.assertEqual(self.receive(userConnection, len(expectedOutput)), expectedOutput)
+			mumeConnection.sendall(b"<prompt>Mana:Hot></prompt>" + IAC + GA)
+			expectedOutput = b"Mana:Hot>" + IAC + GA
+			self.assertEqual(self.receive(userConnection, len(expectedOutput)), expectedOutput)
+			# test mud events are handled by the mapper on the event loop.
+			self.assertIn((MUD_DATA, ("prompt", "Mana:Hot>")), [handledItems.get(timeout=1) for i in range(4)])
+			# test user commands are passed to the mapper, and everything else to MUME.
+			userConnection.sendall(b"look\r\n")
+			self.assertEqual(self.receive(mumeConnection, len(b"look\r\n")), b"look\r\n")
+			userConnection.sendall(b"path 1234\r\n")
+			self.assertEqual(handledItems.get(timeout=1), (USER_DATA, b"path 1234\r\n"))
+			# test the engine stops when MUME closes the connection.
+			mumeConnection.shutdown(socket.SHUT_RDWR)
+			loopThread.join(1)
+			self.assertFalse(loopThread.is_alive())
+		finally:
+			if not loop.is_running():
+				loop.close()
+			for connection in (clientConnection, userConnection, serverConnection, mumeConnection):
+				connection.close()
+
+
+class TestClientGroup(unittest.TestCase):
+	def createConnection(self, output):
+		connection = Mock(spec=socket.socket)
+
+		def sendmsg(buffers):
+			data = b"".join(buffers)
+			output.put(data)
+			return len(data)
+
+		connection.sendmsg.side_effect = sendmsg
+		return connection
+
+	def testClientGroup(self):
+		primaryOutput = Queue()
+		primaryConnection = self.createConnection(primaryOutput)
+		slowConnection = Mock(spec=socket.socket)
+		unblock = threading.Event()
+		slowConnection.sendmsg.side_effect = lambda buffers: unblock.wait()
+		clients = ClientGroup()
+		clients.add(ClientWriter(primaryConnection, blocking=True), primary=True)
+		slowWriter = ClientWriter(slowConnection, bufferLimit=10)
+		clients.add(slowWriter)
+		self.assertEqual(len(clients), 2)
+		# test a client which falls too far behind is removed, without blocking output to the others.
+		for i in range(5):
+			clients.sendall(b"hello")
+		output = b""
+		while len(output) < len(b"hello" * 5):
+			output += primaryOutput.get(timeout=1)
+		self.assertEqual(output, b"hello" * 5)
+		self.assertTrue(slowWriter.closed)
+		self.assertEqual(len(clients), 1)
+		unblock.set()
+		slowWriter.join(1)
+		self.assertFalse(slowWriter.is_alive())
+		# test an error is raised once the primary client is disconnected.
+		primaryConnection.sendmsg.side_effect = ConnectionResetError
+		clients.sendall(b"data")
+		with self.assertRaises(ConnectionError):
+			for i in range(100):
+				clients.sendall(b"data")
+				time.sleep(0.01)
+		clients.close()
+
+
+class TestClientWriter(unittest.TestCase):
+	def testCoalescing(self):
+		connection = Mock(spec=socket.socket)
+		sent = []
+		unblock = threading.Event()
+
+		def sendmsg(buffers):
+			unblock.wait()
+			sent.append([bytes(buffer) for buffer in buffers])
+			length = sum(len(buffer) for buffer in buffers)
+			# Simulate partial writes, which leave the last 2 bytes unsent.
+			return length - 2 if length > 2 else length
+
+		connection.sendmsg.side_effect = sendmsg
+		writer = ClientWriter(connection)
+		writer.start()
+		writer.write(b"first")
+		time.sleep(0.1)
+		# test fragments which arrive while a write is blocked are combined into the next write.
+		for fragment in (b"second", b"third", b"fourth"):
+			writer.write(fragment)
+		unblock.set()
+		writer.close()
+		writer.join(1)
+		self.assertFalse(writer.is_alive())
+		self.assertEqual(sent, [[b"first"], [b"st"], [b"second", b"third", b"fourth"], [b"th"]])
+
+	def testBlocking(self):
+		connection = Mock(spec=socket.socket)
+		unblock = threading.Event()
+		connection.sendmsg.side_effect = lambda buffers: unblock.wait() and sum(len(buffer) for buffer in buffers)
+		writer = ClientWriter(connection, bufferLimit=10, blocking=True)
+		writer.start()
+		writer.write(b"first")
+		time.sleep(0.1)
+		self.assertTrue(writer.write(b"second"))
+		# test a blocking writer waits for the client to catch up, instead of disconnecting it.
+		result = []
+		sender = threading.Thread(target=lambda: result.append(writer.write(b"third")), daemon=True)
+		sender.start()
+		sender.join(0.1)
+		self.assertTrue(sender.is_alive())
+		unblock.set()
+		sender.join(1)
+		self.assertEqual(result, [True])
+		self.assertFalse(writer.closed)
+		writer.close()
+		writer.join(1)
+		self.assertFalse(writer.is_alive())
+
+	def testWithoutSendmsg(self):
+		connection = Mock(spec=["sendall"])
+		writer = ClientWriter(connection)
+		writer.start()
+		writer.write(b"hello")
+		writer.close()
+		writer.join(1)
+		connection.sendall.assert_called_once_with(b"hello")
@@ -155,3 +155,66 @@ class TestMapper_handleMudEvent(unittest.TestCase):
 		]:
 			self.mapper.handleMudEvent(unknownEvent, "meaningless input")
 			# simply require this to execute without raising an exception
+
+	def test_isLineNeeded(self):
+		self.mapper.timeSynchronized = True
+		self.assertFalse(self.mapper.isLineNeeded(b"Gandalf narrates 'hi'"))
+		self.assertTrue(self.mapper.isLineNeeded(b"You quietly scout northwards..."))
+		self.assertTrue(self.mapper.isLineNeeded(b"\x1b[32mYou cannot go that way...\x1b[0m"))
+		self.assertFalse(self.mapper.isLineNeeded(b"The current time is 5:13pm."))
+		self.mapper.timeSynchronized = False
+		self.assertTrue(self.mapper.isLineNeeded(b"The current time is 5:13pm."))
+		# Any line might be needed by handlers other than the mapper's own.
+		handler = Mock()
+		self.mapper.registerMudEventHandler("line", handler)
+		self.assertTrue(self.mapper.isLineNeeded(b"Gandalf narrates 'hi'"))
+		self.mapper.deregisterMudEventHandler("line", handler)
+
+	def test_handleMudEvent_whileScouting(self):
+		handlers = {event: Mock() for event in ("name", "tell")}
+		for event, handler in handlers.items():
+			self.mapper.registerMudEventHandler(event, handler)
+		self.mapper.scouting = True
+		self.mapper.handleMudEvent("name", b"Seagull Inn")
+		self.mapper.handleMudEvent("tell", b"Gandalf tells you 'hi'")
+		handlers["name"].assert_not_called()
+		handlers["tell"].assert_called_once_with("Gandalf tells you 'hi'")
+		for event, handler in handlers.items():
+			self.mapper.deregisterMudEventHandler(event, handler)
+
+	def test_handleGMCP(self):
+		events = ("name", "description", "movement", "gmcp.room.info", "gmcp.char.vitals")
+		handlers = {event: Mock() for event in events}
+		for event, handler in handlers.items():
+			self.mapper.registerMudEventHandler(event, handler)
+		self.mapper.handleMudEvent(
+			"gmcp",
+			b'Room.Info {"name": "Seagull Inn", "desc": "This is the most famous\\nmeeting-place.", "exits": {}}'
+		)
+		handlers["name"].assert_called_once_with("Seagull Inn")
+		handlers["description"].assert_called_once_with("This is the most famous\nmeeting-place.")
+		handlers["gmcp.room.info"].assert_called_once_with(
+			{"name": "Seagull Inn", "desc": "This is the most famous\nmeeting-place.", "exits": {}}
+		)
+		self.mapper.handleMudEvent("gmcp", b'Event.Moved {"dir": "east"}')
+		handlers["movement"].assert_called_once_with("east")
+		self.mapper.handleMudEvent("gmcp", b'Char.Vitals {"hp": 100}')
+		handlers["gmcp.char.vitals"].assert_called_once_with({"hp": 100})
+		# Invalid JSON is ignored.
+		self.mapper.handleMudEvent("gmcp", b"Char.Vitals {")
+		handlers["gmcp.char.vitals"].assert_called_once()
+		for event, handler in handlers.items():
+			self.mapper.deregisterMudEventHandler(event, handler)
+
+	def test_handleGMCP_duplicateEvents(self):
+		handler = Mock()
+		self.mapper.registerMudEventHandler("movement", handler)
+		# Before MUME sends GMCP movement events, those of the XML handler are used.
+		self.mapper.handleMudEvent("movement", b"north")
+		handler.assert_called_once_with("north")
+		handler.reset_mock()
+		# One move, reported both by GMCP and by XML, produces exactly one movement event.
+		self.mapper.handleMudEvent("gmcp", b'Event.Moved {"dir": "east"}')
+		self.mapper.handleMudEvent("movement", b"east")
+		handler.assert_called_once_with("east")
+		self.mapper.deregisterMudEventHandler("movement", handler)
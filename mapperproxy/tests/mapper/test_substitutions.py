@@ -0,0 +1,114 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import json
+import os.path
+import tempfile
+from telnetlib import IAC, GA, SB, SE
+import unittest
+
+# Local Modules:
+from mapper.protocols import ProtocolHandler
+from mapper.protocols.telnet import GMCP
+from mapper.substitutions import EXACT, REGEX, SUBSTRING, SubstitutionEngine, loadSubstitutions
+from mapper.utils import getDirectoryPath
+
+
+class TestSubstitutionEngine(unittest.TestCase):
+	def setUp(self):
+		self.engine = SubstitutionEngine()
+		self.engine.add(EXACT, "A goat is here, grazing in the hills.", "%0 [3]")
+		self.engine.add(SUBSTRING, "thorny branched shrub", "%0 [Blackberries]")
+		self.engine.add(REGEX, r"^(?P<caster>.+) begins some strange incantations\.\.\.$", r"%1 is casting! \o/")
+		self.engine.add(REGEX, r"^(\w+) \1 ", "%1 twice ")
+		self.engine.add(EXACT, "You flee head over heels.")
+
+	def testSubstitute(self):
+		line = b"Nothing to see here."
+		self.assertIs(self.engine.substitute(line), line)
+		self.assertEqual(
+			self.engine.substitute(b"A goat is here, grazing in the hills."),
+			b"A goat is here, grazing in the hills. [3]"
+		)
+		# Rules ignore colors, which are kept in the result.
+		self.assertEqual(
+			self.engine.substitute(b"\x1b[32mA goat is here, grazing in the hills.\x1b[0m"),
+			b"\x1b[32mA goat is here, grazing in the hills. [3]\x1b[0m"
+		)
+		self.assertEqual(
+			self.engine.substitute(b"A large \x1b[1mthorny\x1b[0m branched shrub is \x1b[33mgrowing\x1b[0m here."),
+			b"A large \x1b[1mthorny branched shrub [Blackberries]\x1b[0m is \x1b[33mgrowing\x1b[0m here."
+		)
+		self.assertEqual(self.engine.substitute(b"A goat is here."), b"A goat is here.")
+		self.assertEqual(
+			self.engine.substitute(b"A large thorny branched shrub is growing here."),
+			b"A large thorny branched shrub [Blackberries] is growing here."
+		)
+		self.assertEqual(
+			self.engine.substitute(b"Gandalf begins some strange incantations..."), b"Gandalf is casting! \\o/"
+		)
+		# Patterns with back references are matched separately.
+		self.assertEqual(
+			self.engine.substitute(b"Bob Bob begins some strange incantations..."), b"Bob twice is casting! \\o/"
+		)
+		self.assertIsNone(self.engine.substitute(b"You flee head over heels."))
+		self.assertEqual((self.engine.substituted, self.engine.gagged), (6, 1))
+		with self.assertRaises(ValueError):
+			self.engine.add("prefix", "You")
+		# Place holders of groups which the pattern does not have are rejected when the rule is added.
+		with self.assertRaises(ValueError):
+			self.engine.add(SUBSTRING, "goat", "%1")
+		with self.assertRaises(ValueError):
+			self.engine.add(REGEX, "(goat)", "%2 %1")
+
+	def testLoadSample(self):
+		errors, engine = loadSubstitutions(os.path.join(getDirectoryPath("data"), "substitutions.json.sample"))
+		self.assertIsNone(errors)
+		self.assertEqual(
+			engine.substitute(b"A slender key almost escapes your notice."),
+			b"A slender key almost escapes your notice. [D, all doors, Balrog treasury, Balrog]"
+		)
+		self.assertIsNone(engine.substitute(b"You seek to escape..."))
+		self.assertEqual(loadSubstitutions("nonexistent.json"), (None, None))
+
+	def testLoadInvalidPlaceHolder(self):
+		with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fileObj:
+			json.dump({"substitutions": [{"substring": "goat", "replacement": "%1"}]}, fileObj)
+		try:
+			errors, engine = loadSubstitutions(fileObj.name)
+		finally:
+			os.remove(fileObj.name)
+		self.assertIn("Place holder %1", errors)
+		self.assertIsNone(engine)
+
+	def testProtocolHandler(self):
+		handler = ProtocolHandler(outputFormat="normal", substitutions=self.engine)
+		self.assertEqual(
+			handler.parse(b"You flee head over heels.\r\n<prompt>HP:Hurt&gt;</prompt>" + IAC + GA),
+			b"HP:Hurt>" + IAC + GA
+		)
+		self.assertEqual(
+			handler.parse(b"\r\nA goat is here, grazing in the hills.\r\nA goat is"),
+			b"\r\nA goat is here, grazing in the hills. [3]\r\nA goat is"
+		)
+		# The start of the line was already sent, so the rest of it is sent unmodified.
+		self.assertEqual(
+			handler.parse(b" here, grazing in the hills.\r\nYou flee head over heels.\r\n"),
+			b" here, grazing in the hills.\r\n"
+		)
+		handler.close()
+
+	def testTextOnly(self):
+		engine = SubstitutionEngine()
+		engine.add(SUBSTRING, "NAME", "name")
+		handler = ProtocolHandler(outputFormat="tintin", substitutions=engine)
+		# Tintin markers and telnet negotiations are not lines of text, so they are never substituted.
+		gmcp = IAC + SB + GMCP + b'Room.Info {"name": "NAME"}' + IAC + SE
+		self.assertEqual(
+			handler.parse(gmcp + b"<name>Seagull Inn</name>\r\nYour NAME is Bob.\r\n"),
+			gmcp + b"NAME:Seagull Inn:NAME\r\nYour name is Bob.\r\n"
+		)
+		handler.close()
@@ -0,0 +1,83 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+from unittest.mock import Mock
+
+# Local Modules:
+from mapper.triggers import EXACT, PREFIX, REGEX, TriggerEngine
+
+
+class TestTriggerEngine(unittest.TestCase):
+	def setUp(self):
+		self.engine = TriggerEngine()
+		self.callbacks = {name: Mock() for name in ("exact", "prefix", "clock", "closed", "backReference")}
+		self.engine.add("exact", "You are already riding.", self.callbacks["exact"], kind=EXACT)
+		self.engine.add("prefix", "You quietly scout ", self.callbacks["prefix"], kind=PREFIX)
+		self.engine.add(
+			"clock",
+			r"^The current time is (?P<hour>\d+)\:(?P<minutes>\d\d)(?P<am_pm>[ap]m)\.$",
+			self.callbacks["clock"]
+		)
+		self.engine.add("closed", r"The (?P<door>\w+) seems? to be closed\.", self.callbacks["closed"], kind=REGEX)
+		self.engine.add("backReference", r"\b(\w+) \1\b", self.callbacks["backReference"])
+
+	def testDispatch(self):
+		self.assertEqual(self.engine.dispatch("Gandalf narrates 'hi'"), 0)
+		self.assertEqual(self.engine.dispatch("You are already riding."), 1)
+		self.callbacks["exact"].assert_called_once_with("You are already riding.", None)
+		self.assertEqual(self.engine.dispatch("You quietly scout north..."), 1)
+		self.callbacks["prefix"].assert_called_once_with("You quietly scout north...", None)
+		# Groups of regex triggers are available to callbacks, even though the names are shared.
+		self.engine.dispatch("The current time is 5:13pm.")
+		match = self.callbacks["clock"].call_args[0][1]
+		self.assertEqual(match.group("hour", "minutes", "am_pm"), ("5", "13", "pm"))
+		self.assertEqual(self.engine.dispatch("The gate seems to be closed."), 1)
+		self.assertEqual(self.callbacks["closed"].call_args[0][1].group("door"), "gate")
+		# Patterns with back references are matched separately.
+		self.assertEqual(self.engine.dispatch("The gate seems to be closed. Bob Bob."), 2)
+		self.callbacks["backReference"].assert_called_once()
+		# Anchored patterns only match at the start of the line.
+		self.engine.dispatch("Now: The current time is 5:13pm.")
+		self.callbacks["clock"].assert_called_once()
+
+	def testOrder(self):
+		calls = Mock()
+		engine = TriggerEngine()
+		engine.add("first", "scout", calls.first)
+		engine.add("second", "You quietly scout ", calls.second, kind=PREFIX)
+		engine.add("third", "You quietly scout north.", calls.third, kind=EXACT)
+		engine.dispatch("You quietly scout north.")
+		self.assertEqual([name for name, args, kwargs in calls.mock_calls], ["first", "second", "third"])
+		self.assertEqual(calls.first.call_args[0][1].group(), "scout")
+
+	def testAddAndRemove(self):
+		self.assertTrue(self.engine.test("You are already riding."))
+		self.engine.remove("exact")
+		self.assertNotIn("exact", self.engine)
+		self.assertFalse(self.engine.test("You are already riding."))
+		self.engine.add("exact", "You are already riding.", self.callbacks["exact"], kind=EXACT)
+		self.assertTrue(self.engine.test("You are already riding."))
+		self.assertEqual(len(self.engine), 5)
+		with self.assertRaises(ValueError):
+			self.engine.add("exact", "Another line.", Mock(), kind=EXACT)
+		with self.assertRaises(ValueError):
+			self.engine.add("unknown", "line", Mock(), kind="unknown")
+		# Testing does not call callbacks, or count hits.
+		self.callbacks["exact"].assert_not_called()
+		self.assertEqual(self.engine["exact"].hits, 0)
+
+	def testStatistics(self):
+		for i in range(3):
+			self.engine.dispatch("You are already riding.")
+		self.engine.dispatch("Nothing to see here.")
+		self.assertEqual(self.engine["exact"].hits, 3)
+		self.assertGreater(self.engine["exact"].cost, 0)
+		self.assertEqual(self.engine.lines, 4)
+		self.assertIn("Matched 4 lines", self.engine.report())
+		self.engine.reset()
+		self.assertEqual(self.engine["exact"].hits, 0)
+		self.assertEqual(self.engine.lines, 0)
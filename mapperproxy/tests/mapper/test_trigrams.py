@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+
+# Local Modules:
+from mapper.trigrams import TrigramIndex
+
+
+class TestTrigramIndex(unittest.TestCase):
+	def setUp(self):
+		self.index = TrigramIndex()
+		self.index.add(1, "The Prancing Pony")
+		self.index.add(2, "A Dark Tunnel")
+		self.index.add(3, "stable", "Gate")
+
+	def testCandidates(self):
+		self.assertEqual(self.index.candidates("pony"), {1})
+		self.assertEqual(self.index.candidates("THE"), {1})
+		self.assertEqual(self.index.candidates("gate"), {3})
+		self.assertEqual(self.index.candidates("tunnel of doom"), set())
+		# Candidates may not contain the text, and must be checked.
+		self.assertEqual(self.index.candidates("the pony"), {1})
+		# Texts without trigrams could be found anywhere.
+		self.assertIsNone(self.index.candidates("a "))
+
+	def testUpdates(self):
+		self.index.add(1, "The Green Dragon")
+		self.assertEqual(self.index.candidates("pony"), set())
+		self.assertEqual(self.index.candidates("dragon"), {1})
+		self.index.remove(3)
+		self.index.remove(4)
+		self.assertEqual(self.index.candidates("gate"), set())
+		self.assertEqual(len(self.index), 2)
+		self.assertEqual(
+			self.index._postings, {trigram: keys for trigram, keys in self.index._postings.items() if keys}
+		)
@@ -0,0 +1,138 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+# Built-in Modules:
+import unittest
+from unittest.mock import patch
+
+# Local Modules:
+from mapper.roomdata.objects import Room
+from mapper.world import World
+
+
+class TestWorld(unittest.TestCase):
+	@patch.object(World, "loadLabels")
+	@patch.object(World, "loadRooms")
+	def setUp(self, mockLoadRooms, mockLoadLabels):
+		self.world = World(interface="text")
+		for vnum, (x, y, z) in enumerate([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, -1), (2, 2, 0), (0, 0, 0)]):
+			room = Room(str(vnum))
+			room.x, room.y, room.z = x, y, z
+			self.world.rooms[room.vnum] = room
+		self.world.rebuildRoomsIndex()
+		rooms = self.world.rooms
+		self.world.currentRoom = rooms["0"]
+		self.world.setExitDestination(rooms["0"], "east", "1")
+		self.world.setExitDestination(rooms["1"], "west", "0")
+		self.world.setExitDestination(rooms["0"], "north", "2")
+		self.world.setExitDestination(rooms["2"], "south", "undefined")
+		self.world.setExitDestination(rooms["3"], "down", "death")
+		self.world.setExitDestination(rooms["1"], "up", "1")
+
+	def neighbors(self, results):
+		return sorted((vnum, dx, dy, dz) for vnum, obj, dx, dy, dz in results)
+
+	def testGetNeighbors(self):
+		start = self.world.rooms["0"]
+		self.assertEqual(
+			self.neighbors(self.world.getNeighborsFromRoom(start)),
+			[("1", 1, 0, 0), ("2", 0, 1, 0), ("3", 0, 0, -1), ("5", 0, 0, 0)]
+		)
+		# Rooms at the start coordinates are skipped.
+		self.assertEqual(
+			self.neighbors(self.world.getNeighborsFromCoordinates((0, 0, 0), radius=(2, 2, 0))),
+			[("1", 1, 0, 0), ("2", 0, 1, 0), ("4", 2, 2, 0)]
+		)
+		# A box larger than the occupied part of the map gives the same results.
+		self.assertEqual(
+			self.neighbors(self.world.getNeighborsFromRoom(start, radius=100)),
+			[("1", 1, 0, 0), ("2", 0, 1, 0), ("3", 0, 0, -1), ("4", 2, 2, 0), ("5", 0, 0, 0)]
+		)
+
+	def testIndexUpdates(self):
+		room = self.world.rooms["4"]
+		self.assertEqual(self.world.getRoomsFromCoordinates((2, 2, 0)), [room])
+		self.world.updateRoom(room, z=1)
+		self.assertEqual(self.world.getRoomsFromCoordinates((2, 2, 0)), [])
+		self.assertEqual(self.world.getRoomsFromCoordinates((2, 2, 1)), [room])
+		self.assertEqual(room.z, 1)
+		self.world.rdelete("4")
+		self.assertEqual(self.world.getRoomsFromCoordinates((2, 2, 1)), [])
+		self.assertEqual(
+			[obj.vnum for obj in self.world.getRoomsFromCoordinates((0, 0, 0))], ["0", "5"]
+		)
+
+	def testIncomingExits(self):
+		rooms = self.world.rooms
+		self.assertEqual(self.world.getIncomingExits("1"), {("0", "east"), ("1", "up")})
+		self.assertTrue(self.world.isBidirectional(rooms["0"].exits["east"]))
+		self.assertFalse(self.world.isBidirectional(rooms["0"].exits["north"]))
+		self.assertFalse(self.world.isBidirectional(rooms["3"].exits["down"]))
+		# The undefined exit back from the second room is linked too.
+		self.world.rlink("add 2 north")
+		self.assertEqual(self.world.getIncomingExits("0"), {("1", "west"), ("2", "south")})
+		self.assertEqual(self.world.getIncomingExits("undefined"), set())
+		self.world.revnum("1 10")
+		self.assertEqual(rooms["0"].exits["east"].to, "10")
+		self.assertEqual(rooms["10"].exits["up"].to, "10")
+		self.assertEqual(self.world.getIncomingExits("10"), {("0", "east"), ("10", "up")})
+		self.assertEqual(self.world.getIncomingExits("0"), {("10", "west"), ("2", "south")})
+		self.assertEqual(self.world.getIncomingExits("1"), set())
+		self.world.rdelete("10")
+		self.assertEqual(rooms["0"].exits["east"].to, "undefined")
+		self.assertEqual(self.world.getIncomingExits("undefined"), {("0", "east")})
+		self.assertEqual(self.world.getIncomingExits("0"), {("2", "south")})
+		self.world.rlink("remove north")
+		self.assertEqual(self.world.getIncomingExits("2"), set())
+		# The index matches one built from scratch.
+		incomingExits = {vnum: set(exits) for vnum, exits in self.world._incomingExits.items()}
+		self.world.rebuildExitsIndex()
+		self.assertEqual(self.world._incomingExits, incomingExits)
+
+	def testRoomsFromName(self):
+		rooms = self.world.rooms
+		for vnum in ("1", "2", "3"):
+			self.world.updateRoom(rooms[vnum], name="A Path", desc="A narrow path.")
+		self.world.updateRoom(rooms["3"], desc="A wide path.")
+		self.assertEqual([obj.vnum for obj in self.world.getRoomsFromName(" a path ")], ["1", "2", "3"])
+		self.assertEqual([obj.vnum for obj in self.world.getRoomsFromName("A Path", "a narrow path.")], ["1", "2"])
+		self.assertEqual(
+			[obj.vnum for obj in self.world.searchRooms(exactMatch=True, name="A Path", desc="A wide path.")], ["3"]
+		)
+		self.assertEqual(self.world.searchRooms(exactMatch=True, name="A Pat"), [])
+		self.assertEqual(len(self.world.searchRooms(name="A Pat")), 3)
+		# Results are in the order of the rooms, whatever the order in which they were indexed.
+		self.world.updateRoom(rooms["2"], name="A Road")
+		self.world.updateRoom(rooms["2"], name="A Path")
+		self.assertEqual([obj.vnum for obj in self.world.getRoomsFromName("A Path")], ["1", "3", "2"])
+		self.assertEqual(
+			[obj.vnum for obj in self.world.searchRooms(exactMatch=True, name="A Path")], ["1", "2", "3"]
+		)
+		self.world.rdelete("3")
+		self.assertEqual(self.world.getRoomsFromName("A Path", "A wide path."), [])
+
+	def testTextSearches(self):
+		rooms = self.world.rooms
+		self.world.updateRoom(rooms["1"], name="The Prancing Pony", note="Barliman")
+		self.world.updateRoom(rooms["2"], name="A Pony Stable")
+		self.world.currentRoom = rooms["2"]
+		self.world.secret("add gate west")
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(name="pony")], ["1", "2"])
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(name="pony", note="barli")], ["1"])
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(door="gate")], ["2"])
+		# Door names are matched in full.
+		self.assertEqual(self.world.searchRooms(door="gat"), [])
+		# The indexes are kept up to date after they are built.
+		self.world.updateRoom(rooms["1"], name="The Green Dragon")
+		self.world.secret("remove west")
+		self.world.currentRoom = rooms["0"]
+		self.world.rnote("Barliman's brother")
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(name="pony")], ["2"])
+		self.assertEqual(self.world.searchRooms(door="gate"), [])
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(note="barliman")], ["0", "1"])
+		self.world.rdelete("1")
+		self.assertEqual([obj.vnum for obj in self.world.searchRooms(note="barliman")], ["0"])
+		# Texts too short to be looked up are matched against every room.
+		self.assertEqual(sorted(obj.vnum for obj in self.world.searchRooms(name="a")), ["2"])